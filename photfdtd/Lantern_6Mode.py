@@ -1,5 +1,6 @@
-import numpy as np
 from photfdtd import Waveguide
+from .rasterize import disks, extrude
+import photfdtd.fdtd.backend as bd
 import math
 
 class Lantern_6Mode(Waveguide):
@@ -105,47 +106,23 @@ class Lantern_6Mode(Waveguide):
     def compute_permittivity(self, grid, length, x_center, y_center, x1, y1, x2, y2, x3, y3, x4, y4, x5, y5, x6, y6,
                              actual_r_LP01, actual_r_LP11a, actual_r_LP11b, actual_r_LP21a, actual_r_LP21b, actual_r_LP02,
                              actual_r_cladding, n_LP01, n_LP11a, n_LP11b, n_LP21a, n_LP21b, n_LP02, n_cladding):
-        # 初始化介电常数矩阵
-        permittivity = np.zeros((self.xlength, self.ylength, self.zlength)) + self.background_index ** 2
-
-        # 计算包层区域
-        for j in range(self.xlength):
-            for k in range(self.ylength):
-                # 计算光子灯笼对象在仿真区域中的位置
-                x_index = int(x_center + j - self.xlength // 2)
-                y_index = int(y_center + k - self.ylength // 2)
-
-                # 包层
-                if (x_index - x_center) ** 2 + (y_index - y_center) ** 2 <= actual_r_cladding ** 2:
-                    permittivity[j, k, :] = n_cladding ** 2
-
-
-        # 计算纤芯区域
-        for j in range(self.xlength):
-            for k in range(self.ylength):
-                # 计算当前网格点相对于纤芯顶点的位置
-                x_index = int(x_center + j - self.xlength // 2)
-                y_index = int(y_center + k - self.ylength // 2)
-
-                # 纤芯
-                if (x_index - x1) ** 2 + (y_index - y1) ** 2 <= actual_r_LP01 ** 2:
-                    permittivity[j, k, :] = n_LP01 ** 2
-                elif (x_index - x2) ** 2 + (y_index - y2) ** 2 <= actual_r_LP11a ** 2:
-                    permittivity[j, k, :] = n_LP11a ** 2
-                elif (x_index - x3) ** 2 + (y_index - y3) ** 2 <= actual_r_LP11b ** 2:
-                    permittivity[j, k, :] = n_LP11b ** 2
-                elif (x_index - x4) ** 2 + (y_index - y4) ** 2 <= actual_r_LP21a ** 2:
-                    permittivity[j, k, :] = n_LP21a ** 2
-                elif (x_index - x5) ** 2 + (y_index - y5) ** 2 <= actual_r_LP21b ** 2:
-                    permittivity[j, k, :] = n_LP21b ** 2
-                elif (x_index - x6) ** 2 + (y_index - y6) ** 2 <= actual_r_LP02 ** 2:
-                    permittivity[j, k, :] = n_LP02 ** 2
-
-        return permittivity
+        # 截面上各网格在仿真区域中的坐标 coordinates of the cells of the cross-section in the simulation region
+        x_index = bd.astype(bd.arange(self.xlength) + x_center - self.xlength // 2, int)
+        y_index = bd.astype(bd.arange(self.ylength) + y_center - self.ylength // 2, int)
+        # 纤芯优先于包层，按纤芯的顺序 the cores take precedence over the cladding, in their order
+        section = disks(x_index, y_index, [(x1, y1, actual_r_LP01, n_LP01 ** 2),
+                                           (x2, y2, actual_r_LP11a, n_LP11a ** 2),
+                                           (x3, y3, actual_r_LP11b, n_LP11b ** 2),
+                                           (x4, y4, actual_r_LP21a, n_LP21a ** 2),
+                                           (x5, y5, actual_r_LP21b, n_LP21b ** 2),
+                                           (x6, y6, actual_r_LP02, n_LP02 ** 2),
+                                           (x_center, y_center, actual_r_cladding, n_cladding ** 2)],
+                        self.background_index ** 2)
+        return extrude(section, self.zlength, "z")
 
     def _compute_priority(self):
         # 初始化优先级矩阵
-        self.priority_matrix = np.zeros((self.xlength, self.ylength, self.zlength))
+        self.priority_matrix = bd.zeros((self.xlength, self.ylength, self.zlength))
         # 根据每个折射率设置对应的优先级
         for idx, ref_index in enumerate(self.refractive_index):
             self.priority_matrix[self.permittivity == ref_index ** 2] = self.priority[idx]
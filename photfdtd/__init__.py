@@ -13,6 +13,7 @@ from .ring import Ring
 from .mmi import Mmi
 from .grid import Grid
 from .solve import Solve
+from .mode_cache import ModeCache
 from .analyse import Analyse
 from .index import Index
 from .mzi import Mzi
@@ -1,4 +1,5 @@
 import photfdtd.fdtd.backend as bd
+from .geometry import AnnularArc
 from .waveguide import Waveguide
 
 
@@ -53,64 +54,11 @@ class Arc(Waveguide):
 
 
     def _compute_permittivity(self):
-        # 这里+2的原因：稍微扩大一点矩阵的大小，可以保证水平和竖直方向最边上的点不被丢出
-        z = x = bd.linspace(1, 2 * self.outer_radius + 2, 2 * self.outer_radius + 2)
-        X, Z = bd.meshgrid(x, z, indexing="ij")  # indexing = 'ij'很重要
-
-        m = (Z - self.outer_radius - 1) ** 2 + (X - self.outer_radius - 1) ** 2 >= (self.outer_radius - self.width) ** 2
-        m1 = (Z - self.outer_radius - 1) ** 2 + (X - self.outer_radius - 1) ** 2 <= self.outer_radius ** 2
-        m = m == m1
-        # 以中心点为圆心创建角度矩阵
-        radient_matrix = bd.arctan2((X - self.outer_radius - 1), (Z - self.outer_radius - 1))
-        # 将负角度变为正角度
-        radient_matrix[radient_matrix < 0] = 2 * bd.pi + radient_matrix[radient_matrix < 0]
-
-        m2 = radient_matrix >= self.phi
-        m3 = radient_matrix <= (self.phi + self.psi) % (2 * bd.pi)
-        if (self.phi + self.psi) // (2 * bd.pi) == 0:
-            m = (m2 == m3) & m
-        else:
-            m = (m2 + m3) & m
-        # for i in range(2 * self.outer_radius + 2):
-        #     for j in range(2 * self.outer_radius + 2):
-        #         if m1[i, j] != m[i, j] or m2[i, j] != m[i, j] or m3[i, j] != m[i, j]:
-        #             m[i, j] = 0
-
-        def remove_zero_rows_columns(matrix):
-            # 删除矩阵所有元素都为0的行和列
-            # 检查每行是否至少有一个非零元素
-            non_zero_rows = bd.any(matrix != 0, axis=1)
-
-            # 检查每列是否至少有一个非零元素
-            non_zero_columns = bd.any(matrix != 0, axis=0)
-
-            # 使用布尔掩码筛选原始矩阵
-            result_matrix = matrix[non_zero_rows][:, non_zero_columns]
-
-            row_indices, col_indices = bd.where(non_zero_rows), bd.where(non_zero_columns)
-
-            return result_matrix, row_indices, col_indices
-
-        m_removed, row_indices, col_indices = remove_zero_rows_columns(m)
-        try:
-            self.z += row_indices[0][0] - self.outer_radius
-            self.x += col_indices[0][0] - self.outer_radius
-        except:
-            self.z += row_indices[0] - self.outer_radius
-            self.x += col_indices[0] - self.outer_radius
-
-        m_removed = bd.astype(m_removed, float)
-        m_removed[m_removed == 1] *= self.refractive_index ** 2
-        m_removed[m_removed == 0] = self.background_index ** 2
-        self.zlength = bd.shape(m_removed)[0]
-        self.xlength = bd.shape(m_removed)[1]
-
-        m_broadcast = bd.empty((self.xlength, 1, self.zlength))
-        m_broadcast[:,0,:] = m_removed[:, :].T
-        self.permittivity = bd.ones((self.xlength, self.ylength, self.zlength))
-        self.permittivity *= m_broadcast
-        if self.grid.background_index != 1:
-            self.permittivity[self.permittivity == 1] = self.grid.background_index
-
-
-
+        # 圆心在(self.x, self.z)，包围盒收缩到圆弧所占的网格 center at (self.x, self.z), the box is shrunk to the cells of the arc
+        self._geometry = AnnularArc(self.x, self.z, self.outer_radius, self.width, self.phi, self.psi, self.y,
+                                    self.ylength, refractive_index=self.refractive_index, priority=self.priority,
+                                    name=self.name)
+        self._geometry.bounds = self._geometry.tighten(axes=(0, 2))
+        (self.x, _, self.z), (x_stop, _, z_stop) = self._geometry.bounds
+        self.xlength = x_stop - self.x
+        self.zlength = z_stop - self.z
@@ -1,10 +1,11 @@
 """ Based on the Python 3D FDTD Simulator written by Floris Laporte"""
 
 from .grid import Grid
-from .sources import PointSource, LineSource, PlaneSource
-from .detectors import LineDetector, BlockDetector, CurrentDetector
+from .sources import PointSource, LineSource, PlaneSource, ModeSource, TFSFSource
+from .detectors import LineDetector, BlockDetector, DFTDetector, CurrentDetector
 from .objects import Object, AbsorbingObject, AnisotropicObject
-from .boundaries import PeriodicBoundary, PML
+from .boundaries import PeriodicBoundary, SymmetryBoundary, PML
+from .decomposition import run_decomposed
 from .backend import backend
 from .backend import set_backend
 from .fourier import FrequencyRoutines
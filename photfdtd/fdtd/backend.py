@@ -4,6 +4,7 @@ The `fdtd` library allows to choose a backend. The ``numpy`` backend is the
 default one, but there are also several additional PyTorch backends:
 
     - ``numpy`` (defaults to float64 arrays)
+    - ``numpy.float32``
     - ``torch`` (defaults to float64 tensors)
     - ``torch.float32``
     - ``torch.float64``
@@ -18,7 +19,11 @@ For example, this is how to choose the `"torch"` backend: ::
 In general, the ``numpy`` backend is preferred for standard CPU calculations
 with `"float64"` precision. In general, ``float64`` precision is always
 preferred over ``float32`` for FDTD simulations, however, ``float32`` might
-give a significant performance boost.
+give a significant performance boost. With a ``float32`` backend the fields,
+the material arrays, the PML and the detector buffers are all single precision,
+halving the memory; the running Fourier transforms of the DFTDetectors keep
+accumulating in ``complex128`` (see examples/float32_accuracy_ex.py for the
+accuracy compared to ``float64``).
 
 The ``cuda`` backends are only available for computers with a GPU.
 
@@ -43,12 +48,13 @@ backend_names = [
     dict(backends="torch.cuda.float64"),
 ]
 
+# dtypes (not scalar types: numpy.dtype("float64") does not hash like numpy.float64)
 numpy_float_dtypes = {
-    getattr(numpy, "float_", numpy.float64),
-    getattr(numpy, "float16", numpy.float64),
-    getattr(numpy, "float32", numpy.float64),
-    getattr(numpy, "float64", numpy.float64),
-    getattr(numpy, "float128", numpy.float64),
+    numpy.dtype(getattr(numpy, "float_", numpy.float64)),
+    numpy.dtype(getattr(numpy, "float16", numpy.float64)),
+    numpy.dtype(getattr(numpy, "float32", numpy.float64)),
+    numpy.dtype(getattr(numpy, "float64", numpy.float64)),
+    numpy.dtype(getattr(numpy, "float128", numpy.float64)),
 }
 
 
@@ -81,7 +87,12 @@ class Backend:
 
 def _replace_float(func):
     """replace the default dtype a function is called with
-    替换函数调用时的默认数据类型"""
+    替换函数调用时的默认数据类型
+
+    Floating point results are converted to the float of the backend, unless
+    the function is called with an explicit dtype.
+    浮点结果转换为后端的浮点类型，除非调用时指定了dtype。
+    """
 
     # 预处理函数参数，确保都是numpy数组 / Pre-process function arguments to ensure they are numpy arrays
     def preprocess_args(*args, **kwargs):
@@ -119,7 +130,7 @@ def _replace_float(func):
         processed_args, processed_kwargs = preprocess_args(*args, **kwargs)
 
         result = func(*processed_args, **processed_kwargs)
-        if hasattr(result, 'dtype') and result.dtype in numpy_float_dtypes:
+        if kwargs.get("dtype") is None and hasattr(result, 'dtype') and result.dtype in numpy_float_dtypes:
             result = numpy.asarray(result, dtype=self.float)
         return result
 
@@ -316,8 +327,8 @@ class NumpyBackend(Backend):
     #
     # could this (and below) perhaps be changed to "to_numpy()"
     # or maybe "check_numpy" ?
-    numpy = _replace_float(numpy.asarray)
-    """ convert the array to numpy array """
+    numpy = staticmethod(numpy.asarray)
+    """ convert the array to numpy array (keeping its dtype, like the torch backends) """
 
     @staticmethod
     def void(data):
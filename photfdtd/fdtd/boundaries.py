@@ -3,6 +3,7 @@
 Available Boundaries:
 
  - PeriodicBoundary
+ - SymmetryBoundary
  - PML
 
 """
@@ -14,11 +15,16 @@ from . import constants as const
 # relative
 from .grid import Grid
 from .backend import backend as bd
+from . import jit
 
 ## Boundary Conditions [base class]
 class Boundary:
     """ an FDTD Boundary [base class] """
 
+    # whether the fourth order differences (see Grid._orders) may reach across the
+    # boundary along its axis
+    _wide_stencil = True
+
     def __init__(self, name: str = None):
         """ Create a boundary
 
@@ -76,14 +82,14 @@ class Boundary:
             return s
         raise ValueError("Invalid grid indexing used for boundary")
 
-    def update_phi_E(self):
+    def update_phi_E(self, dx=None, dy=None, dz=None):
         """ Update convolution [phi_E]
 
         Note:
             this method is called *before* the electric field is updated
         """
 
-    def update_phi_H(self):
+    def update_phi_H(self, dx=None, dy=None, dz=None):
         """ Update convolution [phi_H]
 
         Note:
@@ -104,16 +110,14 @@ class Boundary:
             this method is called *after* the grid fields are updated
         """
     def promote_dtypes_to_complex(self):
-        self.phi_E = bd.complex(self.phi_E)
-        self.phi_H = bd.complex(self.phi_H)
+        """ Promote the internal state of the boundary to complex numbers """
 
-        self.psi_Ex = bd.complex(self.psi_Ex)
-        self.psi_Ey = bd.complex(self.psi_Ey)
-        self.psi_Ez = bd.complex(self.psi_Ez)
-        
-        self.psi_Hx = bd.complex(self.psi_Hx)
-        self.psi_Hy = bd.complex(self.psi_Hy)
-        self.psi_Hz = bd.complex(self.psi_Hz)
+    def _checkpoint_state(self) -> dict:
+        """ the arrays making up the internal state of the boundary, see checkpoint.save_checkpoint """
+        return {}
+
+    def _restore_state(self, state: dict):
+        """ restore the internal state returned by _checkpoint_state """
 
     def __repr__(self):
         return f"PML(name={repr(self.name)})"
@@ -150,6 +154,9 @@ class PeriodicBoundary(Boundary):
         position in the grid.
     """
 
+    # only a single layer is wrapped around
+    _wide_stencil = False
+
     def _register_grid(
         self, grid: Grid, x: ListOrSlice, y: ListOrSlice, z: ListOrSlice
     ):
@@ -182,6 +189,8 @@ class PeriodicBoundary(Boundary):
 
 # Periodic Boundaries in the X-direction
 class _PeriodicBoundaryX(PeriodicBoundary):
+    axis = 0
+
     def update_E(self):
         """ Update electric field such that periodic boundary conditions in the
         X-direction apply """
@@ -195,6 +204,8 @@ class _PeriodicBoundaryX(PeriodicBoundary):
 
 # Periodic Boundaries in the Y-direction
 class _PeriodicBoundaryY(PeriodicBoundary):
+    axis = 1
+
     def update_E(self):
         """ Update electric field such that periodic boundary conditions in the
         Y-direction apply """
@@ -208,6 +219,8 @@ class _PeriodicBoundaryY(PeriodicBoundary):
 
 # Periodic Boundaries in the Z-direction
 class _PeriodicBoundaryZ(PeriodicBoundary):
+    axis = 2
+
     def update_E(self):
         """ Update electric field such that periodic boundary conditions in the
         Z-direction apply """
@@ -219,6 +232,111 @@ class _PeriodicBoundaryZ(PeriodicBoundary):
         self.grid.H[:, :, -1, :] = self.grid.H[:, :, 0, :]
 
 
+## Mirror Symmetry Boundaries
+class SymmetryBoundary(Boundary):
+    """ A mirror symmetry plane on a low face of the grid
+
+    The grid only holds the half of the structure on the high side of the
+    plane, the other half is the mirror image of the fields. The plane goes
+    through the E-points of index 0 along its axis.
+
+    - ``"symmetric"`` (perfect magnetic conductor, PMC): the tangential E
+      components are even and the tangential H components odd about the plane.
+      The mirror image H[-1] = -H[0] enters the curl of the tangential E at
+      index 0.
+    - ``"antisymmetric"`` (perfect electric conductor, PEC): the tangential E
+      components are odd, i.e. zero on the plane.
+
+    Note:
+        Registering a symmetry boundary to the grid will change the symmetry
+        boundary in one of its subclasses: ``_SymmetryBoundaryX``,
+        ``_SymmetryBoundaryY`` or ``_SymmetryBoundaryZ``, depending on the
+        position in the grid.
+    """
+
+    # only the image of the first layer enters the curl
+    _wide_stencil = False
+
+    def __init__(self, symmetry: str = "symmetric", name: str = None):
+        """ Create a symmetry boundary
+
+        Args:
+            symmetry: "symmetric" (or "PMC") or "antisymmetric" (or "PEC")
+            name: name of the boundary
+        """
+        super().__init__(name=name)
+        symmetry = {"pmc": "symmetric", "pec": "antisymmetric"}.get(symmetry.lower(), symmetry.lower())
+        if symmetry not in ("symmetric", "antisymmetric"):
+            raise ValueError(f"Unknown symmetry {symmetry!r}, use 'symmetric' or 'antisymmetric'")
+        self.symmetry = symmetry
+
+    def _register_grid(
+        self, grid: Grid, x: ListOrSlice, y: ListOrSlice, z: ListOrSlice
+    ):
+        super()._register_grid(grid=grid, x=x, y=y, z=z)
+
+        # an axis of length 1 is indexed by 0 as well, it cannot be the normal of the plane
+        axes = [
+            axis for axis, (s, N) in enumerate(zip((self.x, self.y, self.z), grid.shape))
+            if not isinstance(s, slice) and s == 0 and N > 1
+        ]
+        if len(axes) != 1:
+            raise IndexError(
+                "A symmetry boundary should be placed at the low face of the "
+                "grid using the single index 0"
+            )
+        self.__class__ = (_SymmetryBoundaryX, _SymmetryBoundaryY, _SymmetryBoundaryZ)[axes[0]]
+        side = f"_{'xyz'[self.axis]}low_boundary"
+        if hasattr(grid, side):
+            raise AttributeError(f"grid already has an {'xyz'[self.axis]}low boundary!")
+        setattr(grid, side, self)
+        # the tangential components on the plane
+        self._p = (self.axis + 1) % 3
+        self._q = (self.axis + 2) % 3
+
+    def _plane(self, comp: int) -> tuple:
+        loc = [slice(None)] * 3
+        loc[self.axis] = 0
+        return tuple(loc) + (comp,)
+
+    def update_E(self):
+        """ Update the tangential electric field on the symmetry plane """
+        E, H = self.grid.E, self.grid.H
+        p, q = self._p, self._q
+        if self.symmetry == "antisymmetric":
+            E[self._plane(p)] = 0
+            E[self._plane(q)] = 0
+            return
+        # the difference H[0] - H[-1] = 2 H[0] the curl leaves out at index 0,
+        # over the distance between H[-1] and H[0], which is the first cell size
+        d = (self.grid.x_spacings, self.grid.y_spacings, self.grid.z_spacings)[self.axis][0]
+        coef = 2 * const.c * self.grid.time_step / d
+        inv = self.grid._inverse_permittivity_at
+        E[self._plane(p)] -= coef * inv(self._plane(p)) * H[self._plane(q)]
+        E[self._plane(q)] += coef * inv(self._plane(q)) * H[self._plane(p)]
+
+    def __repr__(self):
+        return f"{type(self).__name__}(symmetry={repr(self.symmetry)}, name={repr(self.name)})"
+
+
+class _SymmetryBoundaryX(SymmetryBoundary):
+    """ A mirror symmetry plane at x = 0 """
+
+    axis = 0
+
+
+class _SymmetryBoundaryY(SymmetryBoundary):
+    """ A mirror symmetry plane at y = 0 """
+
+    axis = 1
+
+
+class _SymmetryBoundaryZ(SymmetryBoundary):
+    """ A mirror symmetry plane at z = 0 """
+
+    axis = 2
+
+
 ## Perfectly Matched Layer (PML)
 
 
@@ -229,6 +347,14 @@ class PML(Boundary):
     all fields incident perpendicular to the area are absorbed without
     reflection.
 
+    The PML is a compact CPML: the conductivity only varies along the axis
+    normal to the PML, so only the two field components transverse to that
+    axis need an auxiliary (psi) field. These are stored in ``psi_E`` and
+    ``psi_H`` with shape (*shape, 2), the recurrence coefficients ``bE``,
+    ``cE``, ``bH`` and ``cH`` are 1D profiles along the normal axis. In edges
+    and corners every PML only handles its own axis, so each derivative gets
+    its convolution exactly once.
+
     Note:
         Registering a PML to the grid will monkeypatch the PML to become one of
         its subclasses: ``_PMLXlow``, ``_PMLYlow`` or ``_PMLZlow``,
@@ -236,6 +362,9 @@ class PML(Boundary):
         in the grid.
     """
 
+    # the axis normal to the PML, set by the subclasses
+    axis = None
+
     def __init__(self, a: float = 1e-8, name: str = None):
         """ Perfectly Matched Layer
 
@@ -256,9 +385,6 @@ class PML(Boundary):
 
         sets:
             self.loc: the location of the PML
-            self.locx: the location of the PML (only x coordinates)
-            self.locy: the location of the PML (only y coordinates)
-            self.locz: the location of the PML (only z coordinates)
         """
         raise NotImplementedError
 
@@ -275,7 +401,7 @@ class PML(Boundary):
 
         sets:
             self.sigmaE: the electric conductivity (responsible for the absorption) of
-                the PML
+                the PML along its normal axis
         """
         raise NotImplementedError
 
@@ -284,13 +410,14 @@ class PML(Boundary):
 
         sets:
             self.sigmaH: the magnetic conductivity (responsible for the absorption) of
-                the PML
+                the PML along its normal axis
         """
         raise NotImplementedError
 
     def _sigma(self, vect: Tensorlike):
         """ create a cubicly increasing profile for the conductivity """
-        return 40 * vect ** 3 / (self.thickness + 1) ** 4
+        # divide by a float: a large integer would promote a float32 profile to float64
+        return 40 * vect ** 3 / float(self.thickness + 1) ** 4
 
     def _register_grid(
         self, grid: Grid, x: ListOrSlice, y: ListOrSlice, z: ListOrSlice
@@ -364,6 +491,12 @@ class PML(Boundary):
             return s
         raise ValueError("Invalid grid indexing used for boundary")
 
+    def _along_axis(self, profile: Tensorlike) -> Tensorlike:
+        """ reshape a profile of the PML such that it broadcasts along the normal axis """
+        shape = [1, 1, 1]
+        shape[self.axis] = self.thickness
+        return bd.reshape(profile, tuple(shape))
+
     def _calculate_parameters(self, thickness: int = 10):
         """ Calculate the parameters for the PML
 
@@ -381,16 +514,18 @@ class PML(Boundary):
         self._set_sigmaE()
         self._set_sigmaH()
 
-        # set the other parameters
+        # the field components transverse to the normal axis: curl(F)[p] contains
+        # -d(F[q])/d(axis) and curl(F)[q] contains +d(F[p])/d(axis)
+        self._p = (self.axis + 1) % 3
+        self._q = (self.axis + 2) % 3
+
+        # psi[..., 0] convolves d(F[q])/d(axis), psi[..., 1] convolves d(F[p])/d(axis)
         Nx, Ny, Nz = self.shape  # is defined by _set_shape()
-        self.phi_E = bd.zeros((Nx, Ny, Nz, 3))
-        self.phi_H = bd.zeros((Nx, Ny, Nz, 3))
-        self.psi_Ex = bd.zeros((Nx, Ny, Nz, 3))
-        self.psi_Ey = bd.zeros((Nx, Ny, Nz, 3))
-        self.psi_Ez = bd.zeros((Nx, Ny, Nz, 3))
-        self.psi_Hx = bd.zeros((Nx, Ny, Nz, 3))
-        self.psi_Hy = bd.zeros((Nx, Ny, Nz, 3))
-        self.psi_Hz = bd.zeros((Nx, Ny, Nz, 3))
+        self.psi_E = bd.zeros((Nx, Ny, Nz, 2))
+        self.psi_H = bd.zeros((Nx, Ny, Nz, 2))
+        # the convolutions stored in psi_E and psi_H (all of them, unless the grid is reduced)
+        self._psi_E_comps = (0, 1)
+        self._psi_H_comps = (0, 1)
 
         self.bE = bd.exp(-(self.sigmaE / self.k + self.a) * self.grid.courant_number)
         self.cE = (
@@ -406,22 +541,94 @@ class PML(Boundary):
             / (self.sigmaH * self.k + self.a * self.k ** 2)
         )
 
+    def _spacings(self, field: str) -> Tensorlike:
+        """ spacings of the differences along the normal axis, shaped like the profiles
+
+        Args:
+            field: "E" for the differences of H at the E points of the PML (the
+                distance between the H points around them, (d[i - 1] + d[i]) / 2),
+                "H" for the differences of E at the H points (the cell size d[i]).
+        """
+        d = (self.grid.x_spacings, self.grid.y_spacings, self.grid.z_spacings)[self.axis]
+        start = jit._offset(self.loc[self.axis], len(d))
+        cells = d[start:start + self.thickness]
+        if field == "E":
+            # the first E point of the PML has no difference inside the PML
+            cells = bd.cat([cells[:1], (cells[:-1] + cells[1:]) / 2])
+        return self._along_axis(cells)
+
+    def _shifted(self, s: slice) -> tuple:
+        """ index along the normal axis, relative to the PML """
+        loc = [slice(None)] * 3
+        loc[self.axis] = s
+        return tuple(loc)
+
+    def promote_dtypes_to_complex(self):
+        self.psi_E = bd.complex(self.psi_E)
+        self.psi_H = bd.complex(self.psi_H)
+
+    def _checkpoint_state(self) -> dict:
+        return {
+            "psi_E": self.psi_E,
+            "psi_H": self.psi_H,
+            "psi_E_comps": bd.array(self._psi_E_comps),
+            "psi_H_comps": bd.array(self._psi_H_comps),
+        }
+
+    def _restore_state(self, state: dict):
+        # the grid might keep other convolutions than when the state was saved (see _set_components)
+        self.psi_E = self._resize_psi(bd.array(state["psi_E"]), tuple(int(i) for i in state["psi_E_comps"]),
+                                      self._psi_E_comps)
+        self.psi_H = self._resize_psi(bd.array(state["psi_H"]), tuple(int(i) for i in state["psi_H_comps"]),
+                                      self._psi_H_comps)
+
+    def _set_components(self):
+        """ only keep the convolutions of the field components updated by the grid
+
+        For a reduced 2D grid (see Grid._set_reduction) only one of the two convolutions
+        of psi_E and psi_H belongs to the excited polarization, the other one is dropped.
+        """
+        reduced = self.grid.reduced
+        if reduced is None or self.grid.engine == "jit":
+            comps_E, comps_H = (0, 1), (0, 1)
+        else:
+            _, E_comps, H_comps = reduced
+            comps_E = tuple(i for i, c in enumerate((self._p, self._q)) if c in E_comps)
+            comps_H = tuple(i for i, c in enumerate((self._p, self._q)) if c in H_comps)
+        self.psi_E = self._resize_psi(self.psi_E, self._psi_E_comps, comps_E)
+        self.psi_H = self._resize_psi(self.psi_H, self._psi_H_comps, comps_H)
+        self._psi_E_comps, self._psi_H_comps = comps_E, comps_H
+
+    @staticmethod
+    def _resize_psi(psi, old, new):
+        """ reallocate psi for the convolutions `new`, keeping the values of those in `old` """
+        if old == new:
+            return psi
+        resized = bd.zeros(psi.shape[:3] + (len(new),), dtype=psi.dtype)
+        for i, comp in enumerate(new):
+            if comp in old:
+                resized[..., i] = psi[..., old.index(comp)]
+        return resized
+
     def update_E(self):
         """ Update electric field of the grid
 
         Note:
             this method is called *after* the electric field is updated
         """
-        ### TODO: 要应用非均匀网格，这里是不是也得改
-        ### original:        self.grid.E[self.loc] += (
-        #     self.grid.courant_number
-        #     * self.grid.inverse_permittivity[self.loc]
-        #     * self.phi_E
-        # )
-        self.grid.E[self.loc] += (
-            const.c * self.grid.time_step * self.grid.inverse_permittivity[self.loc]
-            * self.phi_E
-        )
+        if self.grid.engine == "jit":
+            inv, ids = self.grid._jit_materials("permittivity")
+            jit.pml_update_E(self.grid.E, self.grid.H, inv, self.psi_E,
+                             self.bE.ravel(), self.cE.ravel(), self.axis, *self._offsets(),
+                             1 / self._spacings("E").ravel(), const.c * self.grid.time_step, ids)
+            return
+        cdt = const.c * self.grid.time_step
+        for i, comp in enumerate(self._psi_E_comps):
+            loc = self.loc[:3] + ((self._p, self._q)[comp],)
+            if comp == 0:
+                self.grid.E[loc] -= cdt * self.grid._inverse_permittivity_at(loc) * self.psi_E[..., i]
+            else:
+                self.grid.E[loc] += cdt * self.grid._inverse_permittivity_at(loc) * self.psi_E[..., i]
 
     def update_H(self):
         """ Update magnetic field of the grid
@@ -429,235 +636,199 @@ class PML(Boundary):
         Note:
             this method is called *after* the magnetic field is updated
         """
-        self.grid.H[self.loc] -= (
-            const.c * self.grid.time_step * self.grid.inverse_permittivity[self.loc]
-            * self.phi_H
+        if self.grid.engine == "jit":
+            inv, ids = self.grid._jit_materials("permittivity")
+            jit.pml_update_H(self.grid.E, self.grid.H, inv, self.psi_H,
+                             self.bH.ravel(), self.cH.ravel(), self.axis, *self._offsets(),
+                             1 / self._spacings("H").ravel(), const.c * self.grid.time_step, ids)
+            return
+        cdt = const.c * self.grid.time_step
+        for i, comp in enumerate(self._psi_H_comps):
+            loc = self.loc[:3] + ((self._p, self._q)[comp],)
+            if comp == 0:
+                self.grid.H[loc] += cdt * self.grid._inverse_permittivity_at(loc) * self.psi_H[..., i]
+            else:
+                self.grid.H[loc] -= cdt * self.grid._inverse_permittivity_at(loc) * self.psi_H[..., i]
+
+    def _offsets(self):
+        """ index of the first cell of the PML in the grid (used by the jit engine) """
+        return (
+            jit._offset(self.loc[0], self.grid.Nx),
+            jit._offset(self.loc[1], self.grid.Ny),
+            jit._offset(self.loc[2], self.grid.Nz),
         )
 
     def update_phi_E(self, dx=None, dy=None, dz=None):
-        """ Update convolution [phi_E]
+        """ Update convolution [psi_E]
 
         Note:
-            this method is called *before* the electric field is updated
-        """
-        self.psi_Ex *= self.bE
-        self.psi_Ey *= self.bE
-        self.psi_Ez *= self.bE
-
-        c = self.cE
-        Hx = self.grid.H[self.locx]
-        Hy = self.grid.H[self.locy]
-        Hz = self.grid.H[self.locz]
-
-        # TODO：检查应用不同空间步长时方程是否应该这么写
-        # 暂时先让代码保持原来的样子
+            this method is called *before* the electric field is updated.
+            The jit engine updates the convolution together with the field in update_E.
         """
-        original:
-        self.psi_Ex[:, 1:, :, 1] += (Hz[:, 1:, :] - Hz[:, :-1, :]) * c[:, 1:, :, 1]
-        self.psi_Ex[:, :, 1:, 2] += (Hy[:, :, 1:] - Hy[:, :, :-1]) * c[:, :, 1:, 2]
-
-        self.psi_Ey[:, :, 1:, 2] += (Hx[:, :, 1:] - Hx[:, :, :-1]) * c[:, :, 1:, 2]
-        self.psi_Ey[1:, :, :, 0] += (Hz[1:, :, :] - Hz[:-1, :, :]) * c[1:, :, :, 0]
-
-        self.psi_Ez[1:, :, :, 0] += (Hy[1:, :, :] - Hy[:-1, :, :]) * c[1:, :, :, 0]
-        self.psi_Ez[:, 1:, :, 1] += (Hx[:, 1:, :] - Hx[:, :-1, :]) * c[:, 1:, :, 1]
-        """
-        dx = self.grid.grid_spacing_x
-        dy = self.grid.grid_spacing_y
-        dz = self.grid.grid_spacing_z
-        self.psi_Ex[:, 1:, :, 1] += (Hz[:, 1:, :] - Hz[:, :-1, :]) * c[:, 1:, :, 1] * 1 / dy
-        self.psi_Ex[:, :, 1:, 2] += (Hy[:, :, 1:] - Hy[:, :, :-1]) * c[:, :, 1:, 2] * 1 / dz
-
-        self.psi_Ey[:, :, 1:, 2] += (Hx[:, :, 1:] - Hx[:, :, :-1]) * c[:, :, 1:, 2] * 1 / dz
-        self.psi_Ey[1:, :, :, 0] += (Hz[1:, :, :] - Hz[:-1, :, :]) * c[1:, :, :, 0] * 1 / dx
-
-        self.psi_Ez[1:, :, :, 0] += (Hy[1:, :, :] - Hy[:-1, :, :]) * c[1:, :, :, 0] * 1 / dx
-        self.psi_Ez[:, 1:, :, 1] += (Hx[:, 1:, :] - Hx[:, :-1, :]) * c[:, 1:, :, 1] * 1 / dy
-
-        self.phi_E[..., 0] = self.psi_Ex[..., 1] - self.psi_Ex[..., 2]
-        self.phi_E[..., 1] = self.psi_Ey[..., 2] - self.psi_Ey[..., 0]
-        self.phi_E[..., 2] = self.psi_Ez[..., 0] - self.psi_Ez[..., 1]
+        if self.grid.engine == "jit":
+            return
+        self.psi_E *= self.bE[..., None]
+
+        hi, lo = self._shifted(slice(1, None)), self._shifted(slice(None, -1))
+        c = self.cE[hi]
+        d = self._spacings("E")[hi]
+        wide = self.grid._orders[self.axis] == 4
+        for i, comp in enumerate(self._psi_E_comps):
+            # psi[..., 0] convolves F[q], psi[..., 1] convolves F[p]
+            if wide:
+                # the same fourth order differences as the curl, reaching out of the PML
+                start = self._offsets()[self.axis] + 1
+                D = self.grid._difference(self.grid.H[..., (self._q, self._p)[comp]], self.axis, True,
+                                          start, start + self.thickness - 1)
+                self.psi_E[hi + (i,)] += D * c / d
+                continue
+            F = self.grid.H[self.loc[:3] + ((self._q, self._p)[comp],)]
+            self.psi_E[hi + (i,)] += (F[hi] - F[lo]) * c / d
 
     def update_phi_H(self, dx=None, dy=None, dz=None):
-        """ Update convolution [phi_H]
+        """ Update convolution [psi_H]
 
         Note:
-            this method is called *before* the magnetic field is updated
-        """
-        self.psi_Hx *= self.bH
-        self.psi_Hy *= self.bH
-        self.psi_Hz *= self.bH
-
-        c = self.cH
-        Ex = self.grid.E[self.locx]
-        Ey = self.grid.E[self.locy]
-        Ez = self.grid.E[self.locz]
-        # TODO：检查应用不同空间步长时方程是否应该这么写
-        # 暂时先让代码保持原来的样子
+            this method is called *before* the magnetic field is updated.
+            The jit engine updates the convolution together with the field in update_H.
         """
-        original:
-        self.psi_Hx[:, :-1, :, 1] += (Ez[:, 1:, :] - Ez[:, :-1, :]) * c[:, :-1, :, 1]
-        self.psi_Hx[:, :, :-1, 2] += (Ey[:, :, 1:] - Ey[:, :, :-1]) * c[:, :, :-1, 2]
-
-        self.psi_Hy[:, :, :-1, 2] += (Ex[:, :, 1:] - Ex[:, :, :-1]) * c[:, :, :-1, 2]
-        self.psi_Hy[:-1, :, :, 0] += (Ez[1:, :, :] - Ez[:-1, :, :]) * c[:-1, :, :, 0]
-
-        self.psi_Hz[:-1, :, :, 0] += (Ey[1:, :, :] - Ey[:-1, :, :]) * c[:-1, :, :, 0]
-        self.psi_Hz[:, :-1, :, 1] += (Ex[:, 1:, :] - Ex[:, :-1, :]) * c[:, :-1, :, 1]
-        """
-        dx = self.grid.grid_spacing_x
-        dy = self.grid.grid_spacing_y
-        dz = self.grid.grid_spacing_z
-        self.psi_Hx[:, :-1, :, 1] += (Ez[:, 1:, :] - Ez[:, :-1, :]) * c[:, :-1, :, 1] * 1 / dy
-        self.psi_Hx[:, :, :-1, 2] += (Ey[:, :, 1:] - Ey[:, :, :-1]) * c[:, :, :-1, 2] * 1 / dz
-
-        self.psi_Hy[:, :, :-1, 2] += (Ex[:, :, 1:] - Ex[:, :, :-1]) * c[:, :, :-1, 2] * 1 / dz
-        self.psi_Hy[:-1, :, :, 0] += (Ez[1:, :, :] - Ez[:-1, :, :]) * c[:-1, :, :, 0] * 1 / dx
-
-        self.psi_Hz[:-1, :, :, 0] += (Ey[1:, :, :] - Ey[:-1, :, :]) * c[:-1, :, :, 0] * 1 / dx
-        self.psi_Hz[:, :-1, :, 1] += (Ex[:, 1:, :] - Ex[:, :-1, :]) * c[:, :-1, :, 1] * 1 / dy
-
-        self.phi_H[..., 0] = self.psi_Hx[..., 1] - self.psi_Hx[..., 2]
-        self.phi_H[..., 1] = self.psi_Hy[..., 2] - self.psi_Hy[..., 0]
-        self.phi_H[..., 2] = self.psi_Hz[..., 0] - self.psi_Hz[..., 1]
+        if self.grid.engine == "jit":
+            return
+        self.psi_H *= self.bH[..., None]
+
+        hi, lo = self._shifted(slice(1, None)), self._shifted(slice(None, -1))
+        c = self.cH[lo]
+        d = self._spacings("H")[lo]
+        wide = self.grid._orders[self.axis] == 4
+        for i, comp in enumerate(self._psi_H_comps):
+            if wide:
+                start = self._offsets()[self.axis]
+                D = self.grid._difference(self.grid.E[..., (self._q, self._p)[comp]], self.axis, False,
+                                          start, start + self.thickness - 1)
+                self.psi_H[lo + (i,)] += D * c / d
+                continue
+            F = self.grid.E[self.loc[:3] + ((self._q, self._p)[comp],)]
+            self.psi_H[lo + (i,)] += (F[hi] - F[lo]) * c / d
 
 
 class _PMLXlow(PML):
     """ A perfectly matched layer to place where X is low. """
 
+    axis = 0
+
     def _set_locations(self):
         self.loc = (slice(None, self.thickness), slice(None), slice(None), slice(None))
-        self.locx = (slice(None, self.thickness), slice(None), slice(None), 0)
-        self.locy = (slice(None, self.thickness), slice(None), slice(None), 1)
-        self.locz = (slice(None, self.thickness), slice(None), slice(None), 2)
 
     def _set_shape(self):
         self.shape = (self.thickness, self.grid.Ny, self.grid.Nz)
 
     def _set_sigmaE(self):
-        sigma = self._sigma(bd.arange(self.thickness - 0.5, -0.5, -1.0))
-        self.sigmaE = bd.zeros((self.thickness, self.grid.Ny, self.grid.Nz, 3))
-        self.sigmaE[:, :, :, 0] = sigma[:, None, None]
+        self.sigmaE = self._along_axis(self._sigma(bd.arange(self.thickness - 0.5, -0.5, -1.0)))
 
     def _set_sigmaH(self):
-        sigma = self._sigma(bd.arange(self.thickness - 1.0, 0, -1.0))
-        self.sigmaH = bd.zeros((self.thickness, self.grid.Ny, self.grid.Nz, 3))
-        self.sigmaH[:-1, :, :, 0] = sigma[:, None, None]
+        sigma = bd.zeros(self.thickness)
+        sigma[:-1] = self._sigma(bd.arange(self.thickness - 1.0, 0, -1.0))
+        self.sigmaH = self._along_axis(sigma)
 
 
 class _PMLXhigh(PML):
     """ A perfectly matched layer to place where X is high. """
 
+    axis = 0
+
     def _set_locations(self):
         self.loc = (slice(-self.thickness, None), slice(None), slice(None), slice(None))
-        self.locx = (slice(-self.thickness, None), slice(None), slice(None), 0)
-        self.locy = (slice(-self.thickness, None), slice(None), slice(None), 1)
-        self.locz = (slice(-self.thickness, None), slice(None), slice(None), 2)
 
     def _set_shape(self):
         self.shape = (self.thickness, self.grid.Ny, self.grid.Nz)
 
     def _set_sigmaE(self):
-        sigma = self._sigma(bd.arange(0.5, self.thickness + 0.5, 1.0))
-        self.sigmaE = bd.zeros((self.thickness, self.grid.Ny, self.grid.Nz, 3))
-        self.sigmaE[:, :, :, 0] = sigma[:, None, None]
+        self.sigmaE = self._along_axis(self._sigma(bd.arange(0.5, self.thickness + 0.5, 1.0)))
 
     def _set_sigmaH(self):
-        sigma = self._sigma(bd.arange(1.0, self.thickness, 1.0))
-        self.sigmaH = bd.zeros((self.thickness, self.grid.Ny, self.grid.Nz, 3))
-        self.sigmaH[:-1, :, :, 0] = sigma[:, None, None]
+        sigma = bd.zeros(self.thickness)
+        sigma[:-1] = self._sigma(bd.arange(1.0, self.thickness, 1.0))
+        self.sigmaH = self._along_axis(sigma)
 
 
 class _PMLYlow(PML):
     """ A perfectly matched layer to place where Y is low. """
 
+    axis = 1
+
     def _set_locations(self):
-        self.loc = (slice(None), slice(None, self.thickness), slice(None))
-        self.locx = (slice(None), slice(None, self.thickness), slice(None), 0)
-        self.locy = (slice(None), slice(None, self.thickness), slice(None), 1)
-        self.locz = (slice(None), slice(None, self.thickness), slice(None), 2)
+        self.loc = (slice(None), slice(None, self.thickness), slice(None), slice(None))
 
     def _set_shape(self):
         self.shape = (self.grid.Nx, self.thickness, self.grid.Nz)
 
     def _set_sigmaE(self):
-        sigma = self._sigma(bd.arange(self.thickness - 0.5, -0.5, -1.0))
-        self.sigmaE = bd.zeros((self.grid.Nx, self.thickness, self.grid.Nz, 3))
-        self.sigmaE[:, :, :, 1] = sigma[None, :, None]
+        self.sigmaE = self._along_axis(self._sigma(bd.arange(self.thickness - 0.5, -0.5, -1.0)))
 
     def _set_sigmaH(self):
-        sigma = self._sigma(bd.arange(self.thickness - 1.0, 0, -1.0))
-        self.sigmaH = bd.zeros((self.grid.Nx, self.thickness, self.grid.Nz, 3))
-        self.sigmaH[:, :-1, :, 1] = sigma[None, :, None]
+        sigma = bd.zeros(self.thickness)
+        sigma[:-1] = self._sigma(bd.arange(self.thickness - 1.0, 0, -1.0))
+        self.sigmaH = self._along_axis(sigma)
 
 
 class _PMLYhigh(PML):
     """ A perfectly matched layer to place where Y is high. """
 
+    axis = 1
+
     def _set_locations(self):
         self.loc = (slice(None), slice(-self.thickness, None), slice(None), slice(None))
-        self.locx = (slice(None), slice(-self.thickness, None), slice(None), 0)
-        self.locy = (slice(None), slice(-self.thickness, None), slice(None), 1)
-        self.locz = (slice(None), slice(-self.thickness, None), slice(None), 2)
 
     def _set_shape(self):
         self.shape = (self.grid.Nx, self.thickness, self.grid.Nz)
 
     def _set_sigmaE(self):
-        sigma = self._sigma(bd.arange(0.5, self.thickness + 0.5, 1.0))
-        self.sigmaE = bd.zeros((self.grid.Nx, self.thickness, self.grid.Nz, 3))
-        self.sigmaE[:, :, :, 1] = sigma[None, :, None]
+        self.sigmaE = self._along_axis(self._sigma(bd.arange(0.5, self.thickness + 0.5, 1.0)))
 
     def _set_sigmaH(self):
-        sigma = self._sigma(bd.arange(1.0, self.thickness, 1.0))
-        self.sigmaH = bd.zeros((self.grid.Nx, self.thickness, self.grid.Nz, 3))
-        self.sigmaH[:, :-1, :, 1] = sigma[None, :, None]
+        sigma = bd.zeros(self.thickness)
+        sigma[:-1] = self._sigma(bd.arange(1.0, self.thickness, 1.0))
+        self.sigmaH = self._along_axis(sigma)
 
 
 class _PMLZlow(PML):
     """ A perfectly matched layer to place where Z is low. """
 
+    axis = 2
+
     def _set_locations(self):
         self.loc = (slice(None), slice(None), slice(None, self.thickness), slice(None))
-        self.locx = (slice(None), slice(None), slice(None, self.thickness), 0)
-        self.locy = (slice(None), slice(None), slice(None, self.thickness), 1)
-        self.locz = (slice(None), slice(None), slice(None, self.thickness), 2)
 
     def _set_shape(self):
         self.shape = (self.grid.Nx, self.grid.Ny, self.thickness)
 
     def _set_sigmaE(self):
-        sigma = self._sigma(bd.arange(self.thickness - 0.5, -0.5, -1.0))
-        self.sigmaE = bd.zeros((self.grid.Nx, self.grid.Ny, self.thickness, 3))
-        self.sigmaE[:, :, :, 2] = sigma[None, None, :]
+        self.sigmaE = self._along_axis(self._sigma(bd.arange(self.thickness - 0.5, -0.5, -1.0)))
 
     def _set_sigmaH(self):
-        sigma = self._sigma(bd.arange(self.thickness - 1.0, 0, -1.0))
-        self.sigmaH = bd.zeros((self.grid.Nx, self.grid.Ny, self.thickness, 3))
-        self.sigmaH[:, :, :-1, 2] = sigma[None, None, :]
+        sigma = bd.zeros(self.thickness)
+        sigma[:-1] = self._sigma(bd.arange(self.thickness - 1.0, 0, -1.0))
+        self.sigmaH = self._along_axis(sigma)
 
 
 class _PMLZhigh(PML):
     """ A perfectly matched layer to place where Z is high. """
 
+    axis = 2
+
     def _set_locations(self):
         self.loc = (slice(None), slice(None), slice(-self.thickness, None), slice(None))
-        self.locx = (slice(None), slice(None), slice(-self.thickness, None), 0)
-        self.locy = (slice(None), slice(None), slice(-self.thickness, None), 1)
-        self.locz = (slice(None), slice(None), slice(-self.thickness, None), 2)
 
     def _set_shape(self):
         self.shape = (self.grid.Nx, self.grid.Ny, self.thickness)
 
     def _set_sigmaE(self):
-        sigma = self._sigma(bd.arange(0.5, self.thickness + 0.5, 1.0))
-        self.sigmaE = bd.zeros((self.grid.Nx, self.grid.Ny, self.thickness, 3))
-        self.sigmaE[:, :, :, 2] = sigma[None, None, :]
+        self.sigmaE = self._along_axis(self._sigma(bd.arange(0.5, self.thickness + 0.5, 1.0)))
 
     def _set_sigmaH(self):
-        sigma = self._sigma(bd.arange(1.0, self.thickness, 1.0))
-        self.sigmaH = bd.zeros((self.grid.Nx, self.grid.Ny, self.thickness, 3))
-        self.sigmaH[:, :, :-1, 2] = sigma[None, None, :]
+        sigma = bd.zeros(self.thickness)
+        sigma[:-1] = self._sigma(bd.arange(1.0, self.thickness, 1.0))
+        self.sigmaH = self._along_axis(sigma)
 
 
 def DomainBorderPML(grid, border_cells=5):
@@ -0,0 +1,122 @@
+""" Checkpoints of the FDTD Grid.
+
+A checkpoint holds everything needed to continue a run of the grid bit for bit:
+the fields E and H, the time step counter, the internal state of the boundaries
+(e.g. the convolutions of the PML) and of the detectors (the detected values
+which are not yet written to their h5 files, the running Fourier transforms)
+the state of the run itself and the auxiliary grids of the TFSFSources. The
+other sources of the grid only depend on the time step counter.
+
+The state is written into a chunked HDF5 file next to the final checkpoint,
+which is then renamed, such that a run dying while writing never leaves a
+broken checkpoint behind.
+
+Usage::
+
+    grid.run(total_time, checkpoint_interval=1000)
+    # after a crash, set up the same grid again and
+    grid.run(total_time, resume_from=grid.folder + "/checkpoint.h5")
+
+"""
+
+## Imports
+
+# standard library
+import os
+
+# 3rd party
+import h5py
+
+# relative
+from .backend import backend as bd
+from .sources import SoftArbitraryPointSource
+
+# version of the layout of the checkpoint files
+CHECKPOINT_VERSION = 1
+
+
+## Checkpoints
+def _components(grid):
+    """the stateful components of the grid as (group, component)"""
+    for source in grid.sources:
+        if isinstance(source, SoftArbitraryPointSource):
+            raise NotImplementedError("Checkpoints are not supported for a SoftArbitraryPointSource")
+    components = [(f"boundaries/{i}", boundary) for i, boundary in enumerate(grid.boundaries)]
+    components += [(f"sources/{i}", source) for i, source in enumerate(grid.sources)
+                   if hasattr(source, "_checkpoint_state")]
+    for detector in grid.detectors:
+        if not hasattr(detector, "_checkpoint_state"):
+            raise NotImplementedError(f"Checkpoints are not supported for a {type(detector).__name__}")
+        components.append((f"detectors/{detector.name}", detector))
+    return components
+
+
+def save_checkpoint(grid, path: str, run_state: dict):
+    """write the state of a running grid to a checkpoint file
+
+    Args:
+        grid: the grid to save
+        path: the checkpoint file
+        run_state: scalars describing the state of Grid.run
+    """
+    components = _components(grid)
+    # the detector files should hold everything which is not in the checkpoint
+    if grid.writer is not None:
+        grid.writer.flush()
+    tmp = path + ".tmp"
+    try:
+        with h5py.File(tmp, "w") as f:
+            f.attrs["version"] = CHECKPOINT_VERSION
+            f.attrs["shape"] = grid.shape
+            f.attrs["time_steps_passed"] = grid.time_steps_passed
+            for key, value in run_state.items():
+                f.attrs["run_" + key] = value
+            f.create_dataset("E", data=bd.numpy(grid.E), chunks=True)
+            f.create_dataset("H", data=bd.numpy(grid.H), chunks=True)
+            for name, component in components:
+                group = f.create_group(name)
+                group.attrs["type"] = type(component).__name__
+                for key, value in component._checkpoint_state().items():
+                    value = bd.numpy(value) if bd.is_array(value) else value
+                    group.create_dataset(key, data=value, chunks=True if getattr(value, "size", 0) else None)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def load_checkpoint(grid, path: str) -> dict:
+    """restore the state of a grid from a checkpoint file
+
+    The grid should be set up exactly like the grid the checkpoint was saved
+    from, with the same boundaries, detectors and sources.
+
+    Args:
+        grid: the grid to restore
+        path: the checkpoint file
+
+    Returns:
+        the run_state passed to save_checkpoint
+    """
+    components = _components(grid)
+    with h5py.File(path, "r") as f:
+        if f.attrs["version"] != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version {f.attrs['version']}")
+        if tuple(f.attrs["shape"]) != tuple(grid.shape):
+            raise ValueError(
+                f"The checkpoint is of a grid of shape {tuple(f.attrs['shape'])}, not {tuple(grid.shape)}"
+            )
+        names = {name for name, _ in components}
+        saved = {f"{kind}/{key}" for kind in ("boundaries", "detectors", "sources") if kind in f for key in f[kind]}
+        if names != saved:
+            raise ValueError("The boundaries, detectors and sources of the grid differ from those in the checkpoint")
+        grid.time_steps_passed = int(f.attrs["time_steps_passed"])
+        grid.E[...] = bd.array(f["E"][...])
+        grid.H[...] = bd.array(f["H"][...])
+        for name, component in components:
+            group = f[name]
+            if group.attrs["type"] != type(component).__name__:
+                raise ValueError(f"{name} is a {group.attrs['type']} in the checkpoint")
+            component._restore_state({key: group[key][()] for key in group})
+        return {key[4:]: value for key, value in f.attrs.items() if key.startswith("run_")}
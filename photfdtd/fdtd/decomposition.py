@@ -0,0 +1,554 @@
+""" Domain decomposition of the FDTD Grid over several processes.
+
+The grid is split along one (slab) or more (pencil) axes into boxes. Every box
+is simulated by its own worker process, which holds a local FDTD grid of the
+box plus a one-cell halo towards each neighbour. The local grid owns the parts
+of the PML, the sources and the detectors that fall inside the box. After each
+half step the outer planes of the box are exchanged with the neighbours through
+shared memory.
+
+Usage::
+
+    grid.run(total_time, processes=4, split="z")
+
+Note:
+    - only the numpy backend is supported.
+    - periodic boundaries are only allowed along axes which are not split.
+    - detectors are written by every worker into a separate file which is
+      merged into the usual ``{name}_E.h5``/``{name}_H.h5`` after the run.
+    - the run continues from the state of the grid: every worker starts from its
+      part of the fields and of the PML convolutions, which are copied back
+      into the grid after the run.
+    - the decomposition spreads the computation, not the memory: the main
+      process still holds the whole grid, so it should fit into its memory.
+
+"""
+
+## Imports
+
+# standard library
+import os
+import copy
+import traceback
+import multiprocessing
+from multiprocessing import shared_memory
+
+# 3rd party
+import numpy
+import h5py
+from tqdm import tqdm
+
+# relative
+from .backend import backend as bd
+from .backend import NumpyBackend, set_backend
+from .grid import Grid
+from .boundaries import (PML, _PMLXlow, _PMLXhigh, _PMLYlow, _PMLYhigh, _PMLZlow, _PMLZhigh,
+                         _PeriodicBoundaryX, _PeriodicBoundaryY, _PeriodicBoundaryZ, PeriodicBoundary,
+                         SymmetryBoundary)
+from .sources import PointSource, LineSource, PlaneSource, _SourceInjection
+from .detectors import LineDetector, BlockDetector, DFTDetector
+from .writer import H5Writer
+
+_PML_SIDES = {
+    _PMLXlow: (0, "low"), _PMLXhigh: (0, "high"),
+    _PMLYlow: (1, "low"), _PMLYhigh: (1, "high"),
+    _PMLZlow: (2, "low"), _PMLZhigh: (2, "high"),
+}
+_PERIODIC_AXES = {_PeriodicBoundaryX: 0, _PeriodicBoundaryY: 1, _PeriodicBoundaryZ: 2}
+
+
+## Layout
+def _factor_processes(processes: int, lengths):
+    """split a number of processes over the given axis lengths
+
+    Returns:
+        the number of parts of every axis, as evenly spread over the axes
+        (relative to their lengths) as possible.
+    """
+    if len(lengths) == 1:
+        return [processes]
+    best = None
+    for p in range(1, processes + 1):
+        if processes % p:
+            continue
+        rest = _factor_processes(processes // p, lengths[1:])
+        parts = [p] + rest
+        # size of the largest box face exchanged by a worker
+        cost = max(l / n for l, n in zip(lengths, parts))
+        if best is None or cost < best[0]:
+            best = (cost, parts)
+    return best[1]
+
+
+def _layout(grid: Grid, processes: int, split: str):
+    """calculate the box owned by every worker
+
+    Returns:
+        a list with, for every rank, a dict containing the rank coordinates
+        ("coords"), the owned range of every axis ("owned") and the range of
+        the local grid including its halos ("box").
+    """
+    axes = sorted(set("xyz".index(a) for a in split))
+    shape = grid.shape
+    parts = [1, 1, 1]
+    for a, p in zip(axes, _factor_processes(processes, [shape[a] for a in axes])):
+        parts[a] = p
+    for a in range(3):
+        if parts[a] > 1 and shape[a] // parts[a] < 2:
+            raise ValueError(
+                f"Cannot split axis {'xyz'[a]} with {shape[a]} cells over {parts[a]} processes"
+            )
+
+    layout = []
+    for cx in range(parts[0]):
+        for cy in range(parts[1]):
+            for cz in range(parts[2]):
+                coords = (cx, cy, cz)
+                owned, box = [], []
+                for a in range(3):
+                    s = coords[a] * shape[a] // parts[a]
+                    e = (coords[a] + 1) * shape[a] // parts[a]
+                    owned.append((s, e))
+                    box.append((s - int(coords[a] > 0), e + int(coords[a] < parts[a] - 1)))
+                layout.append(dict(coords=coords, owned=owned, box=box))
+    return parts, layout
+
+
+def _rank(parts, coords) -> int:
+    return (coords[0] * parts[1] + coords[1]) * parts[2] + coords[2]
+
+
+def _neighbour(parts, coords, axis, side):
+    """rank of the neighbour of a worker, None at the border of the grid"""
+    c = list(coords)
+    c[axis] += -1 if side == "low" else 1
+    if c[axis] < 0 or c[axis] >= parts[axis]:
+        return None
+    return _rank(parts, c)
+
+
+def _plane_shape(box, axis):
+    shape = [e - s for s, e in box]
+    del shape[axis]
+    return tuple(shape) + (3,)
+
+
+def _plane(axis, index):
+    loc = [slice(None)] * 3
+    loc[axis] = index
+    return tuple(loc)
+
+
+## Localization of the grid components
+def _local_pml_states(grid: Grid, box):
+    """the internal state of the PMLs of the grid restricted to a box, by (axis, side)
+
+    The PML spans the box along the axes other than its normal. Along the normal it
+    is only part of a box at the border of the grid, where it lies completely inside.
+    """
+    states = {}
+    for boundary in grid.boundaries:
+        if isinstance(boundary, PML):
+            axis, side = _PML_SIDES[type(boundary)]
+            loc = tuple(slice(None) if a == axis else slice(*box[a]) for a in range(3))
+            state = boundary._checkpoint_state()
+            state["psi_E"] = numpy.array(state["psi_E"][loc])
+            state["psi_H"] = numpy.array(state["psi_H"][loc])
+            states[(axis, side)] = state
+    return states
+
+
+def _local_boundaries(grid: Grid, parts, coords, owned):
+    """the boundaries of the grid which are needed in a box, as (kind, axis, side, thickness, a)
+
+    For a symmetry boundary the last entry is its symmetry instead of a.
+    """
+    boundaries = []
+    for boundary in grid.boundaries:
+        if isinstance(boundary, PML):
+            axis, side = _PML_SIDES[type(boundary)]
+            if parts[axis] > 1:
+                if side == "low" and coords[axis] != 0:
+                    continue
+                if side == "high" and coords[axis] != parts[axis] - 1:
+                    continue
+                s, e = owned[axis]
+                if boundary.thickness > e - s:
+                    raise ValueError(
+                        f"PML of {boundary.thickness} cells is thicker than the sub-domain "
+                        f"along {'xyz'[axis]} ({e - s} cells), use fewer processes"
+                    )
+            boundaries.append(("pml", axis, side, boundary.thickness, boundary.a))
+        elif isinstance(boundary, PeriodicBoundary):
+            axis = _PERIODIC_AXES[type(boundary)]
+            if parts[axis] > 1:
+                raise NotImplementedError(
+                    f"A periodic boundary along {'xyz'[axis]} cannot be combined with a split of that axis"
+                )
+            boundaries.append(("periodic", axis, None, None, None))
+        elif isinstance(boundary, SymmetryBoundary):
+            # the plane lies on the low face, which only the first box along the axis has
+            if coords[boundary.axis] == 0:
+                boundaries.append(("symmetry", boundary.axis, "low", None, boundary.symmetry))
+        else:
+            raise NotImplementedError(
+                f"{type(boundary).__name__} is not supported by the decomposed runner"
+            )
+    return boundaries
+
+
+def _inside(owned, x, y, z):
+    """mask of the points (x, y, z) owned by a box"""
+    x, y, z = numpy.asarray(x), numpy.asarray(y), numpy.asarray(z)
+    return (
+        (x >= owned[0][0]) & (x < owned[0][1])
+        & (y >= owned[1][0]) & (y < owned[1][1])
+        & (z >= owned[2][0]) & (z < owned[2][1])
+    )
+
+
+def _local_source(source, owned, box):
+    """a copy of a source restricted to a box, None if the source is not in the box"""
+    start = [s for s, _ in box]
+    if isinstance(source, PointSource):
+        if not _inside(owned, source.x, source.y, source.z):
+            return None
+        local = copy.copy(source)
+        local.x, local.y, local.z = source.x - start[0], source.y - start[1], source.z - start[2]
+    elif isinstance(source, LineSource):
+        mask = _inside(owned, source.x, source.y, source.z)
+        if not mask.any():
+            return None
+        local = copy.copy(source)
+        local.x, local.y, local.z = (
+            [int(v) - s for v, m in zip(values, mask) if m]
+            for values, s in zip((source.x, source.y, source.z), start)
+        )
+        local.profile = bd.numpy(source.profile)[mask]
+        local._xs, local._ys, local._zs = (
+            numpy.array(v, dtype=numpy.int64) for v in (local.x, local.y, local.z)
+        )
+    elif isinstance(source, PlaneSource):
+        slices, cut = [], []
+        for s, (o0, o1), b0 in zip((source.x, source.y, source.z), owned, start):
+            lo, hi = max(s.start, o0), min(s.stop, o1)
+            if lo >= hi:
+                return None
+            slices.append(slice(lo - b0, hi - b0))
+            cut.append(slice(lo - s.start, hi - s.start))
+        local = copy.copy(source)
+        local.x, local.y, local.z = slices
+        local.profile = bd.numpy(source.profile)[tuple(cut)]
+    else:
+        raise NotImplementedError(
+            f"{type(source).__name__} is not supported by the decomposed runner"
+        )
+    local.grid = None
+    return local
+
+
+def _local_detector(detector, owned, box, rank):
+    """a copy of a detector restricted to a box
+
+    Returns:
+        (detector, location) with location the index (tuple of slices) of the part in
+        the dataset of the whole detector (without time axis), or None if the
+        detector is not in the box.
+    """
+    start = [s for s, _ in box]
+    if isinstance(detector, DFTDetector):
+        raise NotImplementedError("DFTDetector is not supported by the decomposed runner")
+    if isinstance(detector, LineDetector):
+        mask = _inside(owned, detector.x, detector.y, detector.z)
+        if not mask.any():
+            return None
+        index = numpy.flatnonzero(mask)
+        location = (slice(int(index[0]), int(index[-1]) + 1),)
+        local = copy.copy(detector)
+        local.x, local.y, local.z = (
+            [int(v) - s for v, m in zip(values, mask) if m]
+            for values, s in zip((detector.x, detector.y, detector.z), start)
+        )
+    elif isinstance(detector, BlockDetector):
+        lists, location = [], []
+        for values, (o0, o1), b0 in zip((detector.x, detector.y, detector.z), owned, start):
+            index = [n for n, v in enumerate(values) if o0 <= v < o1]
+            if not index:
+                return None
+            lists.append([values[n] - b0 for n in index])
+            location.append(slice(index[0], index[-1] + 1))
+        local = copy.copy(detector)
+        local.x, local.y, local.z = lists
+        location = tuple(location)
+    else:
+        raise NotImplementedError(
+            f"{type(detector).__name__} is not supported by the decomposed runner"
+        )
+    local.grid = None
+    local.E, local.H = [], []
+    local.name = f"{detector.name}.rank{rank}"
+    return local, location
+
+
+def _build_local_grid(spec) -> Grid:
+    """create the local grid of a worker from its specification"""
+    # a spawned worker starts with the default backend, the halo buffers have the float of the grid
+    set_backend("numpy." + spec["float"])
+    local = Grid(
+        shape=spec["shape"],
+        grid_spacing=spec["grid_spacing"],
+        grid_spacing_x=spec["grid_spacing_x"],
+        grid_spacing_y=spec["grid_spacing_y"],
+        grid_spacing_z=spec["grid_spacing_z"],
+        folder=spec["folder"],
+        x_spacings=spec["x_spacings"],
+        y_spacings=spec["y_spacings"],
+        z_spacings=spec["z_spacings"],
+    )
+    # the time step should be the one of the whole grid, not the one of the box
+    local.courant_number = spec["courant_number"]
+    local.time_step = spec["time_step"]
+    local.animate = False
+    # continue from the state of the grid, see _local_pml_states for the PMLs
+    local.time_steps_passed = spec["time_steps_passed"]
+    local.E, local.H = spec["E"], spec["H"]
+    local.inverse_permittivity = spec["inverse_permittivity"]
+    local.inverse_permeability = spec["inverse_permeability"]
+
+    for kind, axis, side, thickness, a in spec["boundaries"]:
+        loc = [slice(None)] * 3
+        if kind == "pml":
+            loc[axis] = slice(0, thickness) if side == "low" else slice(-thickness, None)
+            local[tuple(loc)] = PML(a=a)
+        elif kind == "symmetry":
+            loc[axis] = 0
+            local[tuple(loc)] = SymmetryBoundary(symmetry=a)
+        else:
+            loc[axis] = 0
+            local[tuple(loc)] = PeriodicBoundary()
+    for source in spec["sources"]:
+        source.grid = local
+        local.sources.append(source)
+    for detector in spec["detectors"]:
+        detector.grid = local
+        local.detectors.append(detector)
+    return local
+
+
+## Worker
+def _worker(rank, spec, buffers, barrier, queue, total_time, engine, progress_bar):
+    """time loop of a single sub-domain"""
+    attached = []
+    try:
+        local = _build_local_grid(spec)
+        local.total_time = total_time
+        local._set_engine(engine)
+        # after _set_engine, which selects the convolutions the PMLs keep
+        pmls = [b for b in local.boundaries if isinstance(b, PML)]
+        for pml in pmls:
+            pml._restore_state(spec["pml_states"][_PML_SIDES[type(pml)]])
+
+        def attach(key):
+            name, shape = buffers[key]
+            shm = shared_memory.SharedMemory(name=name)
+            attached.append(shm)
+            return numpy.ndarray(shape, dtype=local.E.dtype, buffer=shm.buf)
+
+        # outgoing planes: the first/last owned plane, incoming planes: the halos
+        exchange = {"E": ([], []), "H": ([], [])}
+        for axis, side, neighbour in spec["neighbours"]:
+            send = _plane(axis, 1 if side == "low" else -2)
+            recv = _plane(axis, 0 if side == "low" else -1)
+            other = "high" if side == "low" else "low"
+            for field in "EH":
+                exchange[field][0].append((send, attach((rank, axis, side, field))))
+                exchange[field][1].append((recv, attach((neighbour, axis, other, field))))
+
+        def exchange_halos(field, F):
+            outgoing, incoming = exchange[field]
+            for loc, buffer in outgoing:
+                buffer[...] = F[loc]
+            barrier.wait()
+            for loc, buffer in incoming:
+                F[loc] = buffer
+
+        for det in local.detectors:
+            det.__init_h5file__()
+        local._injection = _SourceInjection(local, range(local.time_steps_passed, local.time_steps_passed + total_time))
+
+        time = range(0, total_time, 1)
+        if progress_bar and rank == 0:
+            time = tqdm(time)
+        local.writer = H5Writer()
+        try:
+            for _ in time:
+                local.update_E()
+                exchange_halos("E", local.E)
+                local.update_H()
+                exchange_halos("H", local.H)
+                local.time_steps_passed += 1
+        finally:
+            writer, local.writer = local.writer, None
+            writer.close()
+
+        owned = tuple(slice(s - b, e - b) for (s, e), (b, _) in zip(spec["owned"], spec["box"]))
+        pml_states = {}
+        for pml in pmls:
+            axis, side = _PML_SIDES[type(pml)]
+            loc = tuple(slice(None) if a == axis else owned[a] for a in range(3))
+            state = pml._checkpoint_state()
+            state["psi_E"], state["psi_H"] = state["psi_E"][loc], state["psi_H"][loc]
+            pml_states[(axis, side)] = state
+        queue.put(("done", rank, local.E[owned], local.H[owned], pml_states))
+    except BaseException:
+        barrier.abort()
+        queue.put(("error", rank, traceback.format_exc()))
+    finally:
+        for shm in attached:
+            shm.close()
+
+
+## Runner
+def run_decomposed(grid: Grid, total_time: int, processes: int = 2, split: str = "z",
+                   progress_bar: bool = True, engine: str = "default"):
+    """run an FDTD simulation split over several processes
+
+    Args:
+        grid: the grid to simulate, its fields are updated in place.
+        total_time: the number of time steps to run.
+        processes: the number of worker processes.
+        split: the axes along which the grid is split, e.g. "z" (slabs) or "xz" (pencils).
+            The processes are spread over the given axes according to their lengths.
+        progress_bar: show a progress bar of the first worker.
+        engine: the update engine used by every worker, see Grid.run.
+    """
+    if not isinstance(bd, NumpyBackend):
+        raise RuntimeError("The decomposed runner is only available for the numpy backend.")
+    if not split or any(a not in "xyz" for a in split):
+        raise ValueError(f"Invalid split '{split}', use a combination of 'x', 'y' and 'z'")
+    if grid.spatial_order != 2:
+        # the halos are a single plane wide
+        raise NotImplementedError("The decomposed runner only supports grids with spatial_order=2")
+
+    total_time = int(total_time)
+    grid.total_time = total_time
+    parts, layout = _layout(grid, processes, split)
+    ctx = multiprocessing.get_context()
+    barrier = ctx.Barrier(len(layout))
+    queue = ctx.Queue()
+
+    # one shared plane per worker, axis, side and field for the outgoing halo data
+    shms, buffers = [], {}
+    try:
+        for rank, part in enumerate(layout):
+            part["neighbours"] = []
+            for axis in range(3):
+                for side in ("low", "high"):
+                    neighbour = _neighbour(parts, part["coords"], axis, side)
+                    if neighbour is None:
+                        continue
+                    part["neighbours"].append((axis, side, neighbour))
+                    shape = _plane_shape(part["box"], axis)
+                    for field in "EH":
+                        shm = shared_memory.SharedMemory(
+                            create=True, size=max(int(numpy.prod(shape)) * grid.E.itemsize, 1)
+                        )
+                        shms.append(shm)
+                        buffers[(rank, axis, side, field)] = (shm.name, shape)
+
+        processes_, parts_of_detectors = [], []
+        for rank, part in enumerate(layout):
+            box = tuple(slice(s, e) for s, e in part["box"])
+            detectors = []
+            for detector in grid.detectors:
+                local = _local_detector(detector, part["owned"], part["box"], rank)
+                if local is not None:
+                    detectors.append(local[0])
+                    parts_of_detectors.append((detector, local[0].name, local[1]))
+            spec = dict(
+                shape=tuple(e - s for s, e in part["box"]),
+                owned=part["owned"],
+                box=part["box"],
+                neighbours=part["neighbours"],
+                grid_spacing=grid.grid_spacing,
+                grid_spacing_x=grid.grid_spacing_x,
+                grid_spacing_y=grid.grid_spacing_y,
+                grid_spacing_z=grid.grid_spacing_z,
+                x_spacings=numpy.asarray(grid.x_spacings[box[0]]),
+                y_spacings=numpy.asarray(grid.y_spacings[box[1]]),
+                z_spacings=numpy.asarray(grid.z_spacings[box[2]]),
+                courant_number=grid.courant_number,
+                time_step=grid.time_step,
+                float=numpy.dtype(bd.float).name,
+                folder=grid.folder,
+                time_steps_passed=grid.time_steps_passed,
+                E=numpy.array(grid.E[box]),
+                H=numpy.array(grid.H[box]),
+                pml_states=_local_pml_states(grid, part["box"]),
+                inverse_permittivity=numpy.ascontiguousarray(grid.inverse_permittivity[box]),
+                inverse_permeability=numpy.ascontiguousarray(grid.inverse_permeability[box]),
+                boundaries=_local_boundaries(grid, parts, part["coords"], part["owned"]),
+                sources=[s for s in (_local_source(src, part["owned"], part["box"])
+                                     for src in grid.sources) if s is not None],
+                detectors=detectors,
+            )
+            process = ctx.Process(
+                target=_worker,
+                args=(rank, spec, buffers, barrier, queue, total_time, engine, progress_bar),
+            )
+            process.start()
+            processes_.append(process)
+            del spec
+
+        # collect the fields before joining, large messages block the workers otherwise
+        errors = []
+        for _ in layout:
+            message = queue.get()
+            if message[0] == "error":
+                errors.append(f"worker {message[1]}:\n{message[2]}")
+                continue
+            _, rank, E, H, pml_states = message
+            owned = tuple(slice(s, e) for s, e in layout[rank]["owned"])
+            grid.E[owned] = E
+            grid.H[owned] = H
+            _store_pml_states(grid, owned, pml_states)
+        for process in processes_:
+            process.join()
+        if errors:
+            raise RuntimeError("Decomposed FDTD run failed\n" + "\n".join(errors))
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+    grid.time_steps_passed += total_time
+    _merge_detectors(grid, parts_of_detectors)
+
+
+def _store_pml_states(grid: Grid, owned, states):
+    """write the PML states of a worker (see _worker) into the owned part of the PMLs of the grid"""
+    for boundary in grid.boundaries:
+        if isinstance(boundary, PML) and _PML_SIDES[type(boundary)] in states:
+            axis, _ = _PML_SIDES[type(boundary)]
+            state = states[_PML_SIDES[type(boundary)]]
+            loc = tuple(slice(None) if a == axis else owned[a] for a in range(3))
+            for field in "EH":
+                comps = tuple(int(i) for i in state[f"psi_{field}_comps"])
+                psi = getattr(boundary, f"psi_{field}")
+                psi[loc] = boundary._resize_psi(state[f"psi_{field}"], comps, getattr(boundary, f"_psi_{field}_comps"))
+
+
+def _merge_detectors(grid: Grid, parts_of_detectors):
+    """merge the detector files written by the workers into the files of the whole detectors"""
+    for detector in grid.detectors:
+        detector.__init_h5file__()
+    for detector, name, location in parts_of_detectors:
+        for field in "EH":
+            path = grid.folder + f"//{name}_{field}.h5"
+            with h5py.File(path, "r") as part, \
+                    h5py.File(grid.folder + f"//{detector.name}_{field}.h5", "a") as whole:
+                source, target = part[field], whole[field]
+                # copy in chunks of time steps to keep the memory bounded
+                for t in range(0, source.shape[0], 1000):
+                    target[(slice(t, t + 1000),) + location] = source[t:t + 1000]
+            os.remove(path)
@@ -3,6 +3,8 @@
 Available Detectors:
 
  - LineDetector
+ - BlockDetector
+ - DFTDetector
 
 """
 
@@ -21,24 +23,215 @@ from .backend import backend as bd
 from .constants import X, Y, Z, c
 from .conversions import simE_to_worldE, simH_to_worldH
 import h5py
-from numpy import cross
+from numpy import cross, ix_
+import threading
+
+
+## Detector [base class]
+class _H5Detector:
+    """ A detector which records the fields into a ring buffer and writes it to h5 files [base class]
+
+    Every `flush_interval` time steps the recorded chunk is written to
+    ``{folder}//{name}_E.h5`` and ``{folder}//{name}_H.h5``. During ``Grid.run`` the
+    chunks are handed to the background writer of the grid (see writer.H5Writer),
+    while the detector keeps recording into a second buffer.
+    """
+
+    def _sample_shape(self) -> tuple:
+        """ shape of the field detected in a single time step """
+        raise NotImplementedError
+
+    def _grid_index(self):
+        """ index of the detector in the grid """
+        raise NotImplementedError
+
+    def _init_buffers(self):
+        self.flag_per_thousand_dt = 0
+        self._loc = self._grid_index()
+        self._t0 = self.grid.time_steps_passed
+        # two buffers per field, allocated at the first detection (see _record). The events
+        # are set once the writer is done with a buffer.
+        self._buffers = {"E": [None, None], "H": [None, None]}
+        self._written = {"E": [threading.Event(), threading.Event()],
+                         "H": [threading.Event(), threading.Event()]}
+        for events in self._written.values():
+            for event in events:
+                event.set()
+
+    def __init_h5file__(self):
+        self._init_buffers()
+        for field in ("E", "H"):
+            with h5py.File(self.grid.folder + f"//{self.name}_{field}.h5", "w") as f:
+                # resizable, such that the file can be truncated when the run stops early
+                f.create_dataset(
+                    field, shape=(self.grid.total_time,) + self._sample_shape(),
+                    maxshape=(None,) + self._sample_shape(), dtype="float32"
+                )
+
+    def _record(self, field: str):
+        """ copy the field at the detector into the ring buffer and flush it at the end of a chunk
+
+        Args:
+            field: "E" or "H"
+        """
+        F = getattr(self.grid, field)
+        # time step relative to the start of the run, which is the row in the h5 file
+        t = self.grid.time_steps_passed - self._t0
+        self.flag_per_thousand_dt = t // self.flush_interval + 1
+        start_idx = (self.flag_per_thousand_dt - 1) * self.flush_interval
+        k = self.flag_per_thousand_dt % 2
+        buffers, written = self._buffers[field], self._written[field]
+        if t == start_idx:
+            # the writer might still be busy with the chunk before the previous one
+            written[k].wait()
+        if buffers[k] is None:
+            buffers[k] = bd.zeros((self.flush_interval,) + self._sample_shape(), dtype=F.dtype)
+        buffers[k][t - start_idx] = F[self._loc]
+
+        if (t + 1) % self.flush_interval == 0 or (t + 1) == self.grid.total_time:
+            self._flush(field, k, start_idx, t + 1)
+
+    def _flush(self, field: str, k: int, start_idx: int, end_idx: int):
+        """ write the rows start_idx:end_idx of the h5 file from buffer k """
+        path = self.grid.folder + f"//{self.name}_{field}.h5"
+        convert = simE_to_worldE if field == "E" else simH_to_worldH
+        chunk = self._buffers[field][k][:end_idx - start_idx]
+        message = f"Detector {self.name} saved {field} data from {start_idx} to {end_idx}"
+        writer = getattr(self.grid, "writer", None)
+        if writer is None:
+            with h5py.File(path, "a") as f:
+                f[field][start_idx:end_idx] = bd.numpy(convert(chunk))
+            print(message)
+        else:
+            done = self._written[field][k]
+            done.clear()
+            writer.submit(path, field, start_idx, chunk, convert=convert, done=done, message=message)
+
+    def _checkpoint_state(self) -> dict:
+        """ the detected values which are not yet written to the h5 files, see checkpoint.save_checkpoint
+
+        Note:
+            the chunks handed to the writer of the grid should be written before
+            the state is saved (see writer.H5Writer.flush).
+        """
+        n = self.grid.time_steps_passed - self._t0
+        start_idx = n // self.flush_interval * self.flush_interval
+        k = (start_idx // self.flush_interval + 1) % 2
+        state = {"t0": self._t0}
+        for field in ("E", "H"):
+            buffer = self._buffers[field][k]
+            if buffer is None or n == start_idx:
+                state[field] = bd.zeros((0,) + self._sample_shape())
+            else:
+                state[field] = buffer[:n - start_idx]
+        return state
+
+    def _restore_state(self, state: dict):
+        """ continue recording into the existing h5 files from the state returned by _checkpoint_state """
+        self._init_buffers()
+        self._t0 = int(state["t0"])
+        n = self.grid.time_steps_passed - self._t0
+        start_idx = n // self.flush_interval * self.flush_interval
+        k = (start_idx // self.flush_interval + 1) % 2
+        self.flag_per_thousand_dt = (n - 1) // self.flush_interval + 1 if n > 0 else 0
+        for field in ("E", "H"):
+            rows = bd.array(state[field])
+            if len(rows):
+                self._buffers[field][k] = bd.zeros((self.flush_interval,) + self._sample_shape(), dtype=rows.dtype)
+                self._buffers[field][k][:len(rows)] = rows
+            path = self.grid.folder + f"//{self.name}_{field}.h5"
+            with h5py.File(path, "a") as f:
+                # the run might be resumed with a different total time
+                if f[field].shape[0] != self.grid.total_time:
+                    f[field].resize(self.grid.total_time, axis=0)
+
+    def _finish(self):
+        """ flush the current chunk and truncate the h5 files after a run which stopped early
+
+        Note:
+            this method is called after the writer of the grid has been closed and
+            grid.total_time has been set to the number of time steps run.
+        """
+        n = self.grid.time_steps_passed - self._t0
+        for field in ("E", "H"):
+            if n % self.flush_interval:
+                start_idx = (n - 1) // self.flush_interval * self.flush_interval
+                k = (start_idx // self.flush_interval + 1) % 2
+                self._flush(field, k, start_idx, n)
+            with h5py.File(self.grid.folder + f"//{self.name}_{field}.h5", "a") as f:
+                f[field].resize(n, axis=0)
+
+    def _unflushed(self, field: str):
+        """ the detected values of the current chunk which are not yet written to the h5 file """
+        buffers = getattr(self, "_buffers", None)
+        if buffers is None:
+            return getattr(self, field)
+        buffer = buffers[field][self.flag_per_thousand_dt % 2]
+        if buffer is None:
+            return getattr(self, field)
+        start_idx = (self.flag_per_thousand_dt - 1) * self.flush_interval
+        t = self.grid.time_steps_passed - self._t0
+        n = t - start_idx
+        if n >= self.flush_interval or t >= self.grid.total_time:
+            # the chunk has been flushed
+            return buffer[:0]
+        return buffer[:n]
+
+    def detect_E(self):
+        """ detect the electric field at a certain location in the grid """
+        self._record("E")
+
+    def detect_H(self):
+        """ detect the magnetic field at a certain location in the grid """
+        self._record("H")
+
+    def detector_values(self):
+        """ outputs what detector detects """
+        return {"E": self._unflushed("E"), "H": self._unflushed("H")}
+
+    def real_E(self):
+        return simE_to_worldE(self._unflushed("E"))
+
+    def real_H(self):
+        return simH_to_worldH(self._unflushed("H"))
+
+    def __getstate__(self):
+        # the buffers are not part of the state of the detector (and the events cannot be copied)
+        state = self.__dict__.copy()
+        state.pop("_buffers", None)
+        state.pop("_written", None)
+        return state
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(name={repr(self.name)})"
+
+    def __str__(self):
+        s = "    " + repr(self) + "\n"
+        x = f"[{self.x[0]}, ... , {self.x[-1]}]"
+        y = f"[{self.y[0]}, ... , {self.y[-1]}]"
+        z = f"[{self.z[0]}, ... , {self.z[-1]}]"
+        s += f"        @ x={x}, y={y}, z={z}\n"
+        return s
 
 
 ## Detector
-class LineDetector:
+class LineDetector(_H5Detector):
     """ A detector along a line in the FDTD grid """
 
-    def __init__(self, name=None):
+    def __init__(self, name=None, flush_interval: int = 1000):
         """Create a line detector
 
         Args:
             name: name of the Detector
+            flush_interval: number of time steps kept in memory before they are
+                written to the h5 file
 
         """
         self.grid = None
         self.E = []
         self.H = []
         self.name = name
+        self.flush_interval = flush_interval
 
     def _register_grid(
             self, grid, x: ListOrSlice, y: ListOrSlice, z: ListOrSlice
@@ -69,22 +262,12 @@ class LineDetector:
         self.x, self.y, self.z = self._handle_slices(x, y, z)
         # 这样写的话线监视器必须平行于轴
 
-    def __init_h5file__(self):
-        if self.x[-1] - self.x[0] != 0:
-            l = self.x[-1] - self.x[0] + 1
-        elif self.y[-1] - self.y[0] != 0:
-            l = self.y[-1] - self.y[0] + 1
-        else:
-            l = self.z[-1] - self.z[0] + 1
-        self.flag_per_thousand_dt = 0
-        with h5py.File(self.grid.folder + f"//{self.name}_E.h5", "w") as f:
-            f.create_dataset(
-                "E", shape=(self.grid.total_time, l, 3), dtype="float32"
-            )
-        with h5py.File(self.grid.folder + f"//{self.name}_H.h5", "w") as f:
-            f.create_dataset(
-                "H", shape=(self.grid.total_time, l, 3), dtype="float32"
-            )
+    def _sample_shape(self) -> tuple:
+        return (len(self.x), 3)
+
+    def _grid_index(self):
+        return (self.x, self.y, self.z)
+
     def _handle_slices(
             self, x: ListOrSlice, y: ListOrSlice, z: ListOrSlice
     ) -> Tuple[List, List, List]:
@@ -136,90 +319,6 @@ class LineDetector:
         z = [v.item() for v in bd.array(bd.linspace(z0, z1, m, endpoint=False), bd.int)]
         return x, y, z
 
-    def detect_E(self):
-        """ detect the electric field at a certain location in the grid """
-        # TODO: there is a performance bottleneck here (indexing with lists)
-        E = self.grid.E[self.x, self.y, self.z]
-        self.E.append(E)
-
-        # Newly added
-        if (self.grid.time_steps_passed != 0 and (
-                self.grid.time_steps_passed + 1) % 1000 == 0) or (self.grid.time_steps_passed + 1) == self.grid.total_time:
-            self.flag_per_thousand_dt += 1
-
-            # 计算当前批次的起始和结束索引
-            start_idx = (self.flag_per_thousand_dt - 1) * 1000
-            end_idx = min(self.grid.time_steps_passed, self.flag_per_thousand_dt * 1000)
-
-            with h5py.File(self.grid.folder + f"//{self.name}_E.h5", "a") as f:
-                dset = f["E"]
-                # 存储数据，确保不会超出 E 的实际大小
-                dset[start_idx:end_idx] = bd.numpy(self.real_E())[:end_idx - start_idx]
-            print(f"Detector {self.name} saved E data from {start_idx} to {end_idx}")
-            self.E = []
-
-    # def detect_E_new(self):
-    #     """ detect and save as h5py file at the same time, not saving in RAM """
-    #     E = self.grid.E[self.x, self.y, self.z]
-    #     with h5py.File(self.grid.folder + f"//{self.name}_E.h5", "a") as f:
-    #         dset = f["E"]
-    #         dset.resize(self.grid.time_steps_passed + 1, axis=0)  # 扩展 q 维度
-    #         dset[self.grid.time_steps_passed] = E  # 存储新的时间步数据
-
-    def detect_H(self):
-        """ detect the magnetic field at a certain location in the grid """
-        # TODO: there is a performance bottleneck here (indexing with lists)
-        H = self.grid.H[self.x, self.y, self.z]
-        self.H.append(H)
-
-        # Newly added
-        if (self.grid.time_steps_passed != 0 and (
-                self.grid.time_steps_passed + 1) % 1000 == 0) or (self.grid.time_steps_passed + 1) == self.grid.total_time:
-
-            # 计算当前批次的起始和结束索引
-            start_idx = (self.flag_per_thousand_dt - 1) * 1000
-            end_idx = min(self.grid.time_steps_passed, self.flag_per_thousand_dt * 1000)
-
-            with h5py.File(self.grid.folder + f"//{self.name}_H.h5", "a") as f:
-                dset = f["H"]
-                # 存储数据，确保不会超出 H 的实际大小
-                dset[start_idx:end_idx] = bd.numpy(self.real_H())[:end_idx - start_idx]
-            print(f"Detector {self.name} saved H data from {start_idx} to {end_idx}")
-            self.H = []
-
-    # def detect_H_new(self):
-    #     """ detect and save as h5py file at the same time, not saving in RAM """
-    #     H = self.grid.H[self.x, self.y, self.z]
-    #     with h5py.File(self.grid.folder + f"//{self.name}_H.h5", "a") as f:
-    #         dset = f["H"]
-    #         dset.resize(self.grid.time_steps_passed + 1, axis=0)  # 扩展 q 维度
-    #         dset[self.grid.time_steps_passed] = H  # 存储新的时间步数据
-
-    def __repr__(self):
-        return f"{self.__class__.__name__}(name={repr(self.name)})"
-
-    def __str__(self):
-        s = "    " + repr(self) + "\n"
-        x = f"[{self.x[0]}, ... , {self.x[-1]}]"
-        y = f"[{self.y[0]}, ... , {self.y[-1]}]"
-        z = f"[{self.z[0]}, ... , {self.z[-1]}]"
-        s += f"        @ x={x}, y={y}, z={z}\n"
-        return s
-
-    def detector_values(self):
-        """ outputs what detector detects """
-        return {"E": self.E, "H": self.H}
-
-    @property
-    def real_E(self):
-        # 光源
-        # The source is using simE unit so t
-        return simE_to_worldE(bd.stack(self.E))
-
-    @property
-    def real_H(self):
-        return simH_to_worldH(bd.stack(self.H))
-
     @property
     def poynting(self):
         # 似乎乘以H的共轭或非共轭都一样（因为H不是复数？）
@@ -234,34 +333,24 @@ class LineDetector:
         # * self.grid.grid_spacing_x * self.grid.grid_spacing_y
         return bd.sum(self.poynting, axis=1, keepdims=True)
 
-    def real_E(self):
-        from .conversions import simE_to_worldE
-        if isinstance(self.E, list):
-            self.E = bd.stack(self.E)
-        return simE_to_worldE(self.E)
-
-
-    def real_H(self):
-        from .conversions import simH_to_worldH
-        if isinstance(self.H, list):
-            self.H = bd.stack(self.H)
-        return simH_to_worldH(self.H)
-
 
 # is the "detector" paradigm necessary? Can we just flag a segment of the base mesh to be
 # stored per timestep?
 
 ## BlockDetector
-class BlockDetector:
+
+class BlockDetector(_H5Detector):
     """ A detector along a block in the FDTD grid """
 
     """ Basic copy of LineDetector code, changed detect functions """
 
-    def __init__(self, name=None, axis="y"):
+    def __init__(self, name=None, axis="y", flush_interval: int = 1000):
         """Create a block detector
 
         Args:
             name: name of the Detector
+            flush_interval: number of time steps kept in memory before they are
+                written to the h5 file
 
         """
         self.grid = None
@@ -269,6 +358,7 @@ class BlockDetector:
         self.H = []
         self.axis = axis
         self.name = name
+        self.flush_interval = flush_interval
 
     def _register_grid(
             self, grid, x: ListOrSlice, y: ListOrSlice, z: ListOrSlice
@@ -298,16 +388,9 @@ class BlockDetector:
 
         self.x, self.y, self.z = self._handle_slices(x, y, z)
 
-    def __init_h5file__(self):
-        self.flag_per_thousand_dt = 0
-        with h5py.File(self.grid.folder + f"//{self.name}_E.h5", "w") as f:
-            f.create_dataset(
-                "E", shape=(self.grid.total_time, len(self.x), len(self.y), len(self.z), 3), dtype="float32"
-            )
-        with h5py.File(self.grid.folder + f"//{self.name}_H.h5", "w") as f:
-            f.create_dataset(
-                "H", shape=(self.grid.total_time, len(self.x), len(self.y), len(self.z), 3), dtype="float32"
-            )
+    def _sample_shape(self) -> tuple:
+        return (len(self.x), len(self.y), len(self.z), 3)
+
     def _handle_slices(
             self, x: ListOrSlice, y: ListOrSlice, z: ListOrSlice
     ) -> Tuple[List, List, List]:
@@ -358,91 +441,130 @@ class BlockDetector:
         z = [v.item() for v in bd.arange(z0, z1 + 1)]
         return x, y, z
 
-    def detect_E(self):
-        """ detect the electric field at a certain location in the grid """
-        # TODO: there is a performance bottleneck here (indexing with lists)
-        E = []
-        for i, row in enumerate(self.x):
-            E.append([])
-            for j, col in enumerate(self.y):
-                E[i].append([])
-                for pillar in self.z:
-                    E[i][j].append(self.grid.E[row, col, [pillar]][0])
-        # E = self.grid.E[self.x, self.y, self.z]
-        self.E.append(E)
-
-        # Newly added
-        if (self.grid.time_steps_passed != 0 and (
-                self.grid.time_steps_passed + 1) % 1000 == 0) or (self.grid.time_steps_passed + 1) == self.grid.total_time:
-            self.flag_per_thousand_dt += 1
-
-            # 计算当前批次的起始和结束索引
-            start_idx = (self.flag_per_thousand_dt - 1) * 1000
-            end_idx = min(self.grid.time_steps_passed, self.flag_per_thousand_dt * 1000)
-
-            with h5py.File(self.grid.folder + f"//{self.name}_E.h5", "a") as f:
-                dset = f["E"]
-                # 存储数据，确保不会超出 E 的实际大小
-                dset[start_idx:end_idx] = bd.numpy(self.real_E())[:end_idx - start_idx]
-            print(f"Detector {self.name} saved E data from {start_idx} to {end_idx}")
-            self.E = []
+    def _grid_index(self):
+        """ index of the block in the grid: slices for contiguous ranges (a view), index arrays otherwise """
+        axes = []
+        for values in (self.x, self.y, self.z):
+            if list(values) == list(range(values[0], values[0] + len(values))):
+                axes.append(slice(values[0], values[0] + len(values)))
+            else:
+                axes.append(None)
+        if None not in axes:
+            return tuple(axes)
+        return ix_(self.x, self.y, self.z)
 
-    def detect_H(self):
-        """ detect the magnetic field at a certain location in the grid """
-        # TODO: there is a performance bottleneck here (indexing with lists)
-        H = []
-        for i, row in enumerate(self.x):
-            H.append([])
-            for j, col in enumerate(self.y):
-                H[i].append([])
-                for pillar in self.z:
-                    H[i][j].append(self.grid.H[row, col, [pillar]][0])
-        # H = self.grid.H[self.x, self.y, self.z]
-        self.H.append(H)
-
-        # Newly added
-        if (self.grid.time_steps_passed != 0 and (
-                self.grid.time_steps_passed + 1) % 1000 == 0) or (self.grid.time_steps_passed + 1) == self.grid.total_time:
-
-            # 计算当前批次的起始和结束索引
-            start_idx = (self.flag_per_thousand_dt - 1) * 1000
-            end_idx = min(self.grid.time_steps_passed, self.flag_per_thousand_dt * 1000)
-
-            with h5py.File(self.grid.folder + f"//{self.name}_H.h5", "a") as f:
-                dset = f["H"]
-                # 存储数据，确保不会超出 H 的实际大小
-                dset[start_idx:end_idx] = bd.numpy(self.real_H())[:end_idx - start_idx]
-            print(f"Detector {self.name} saved H data from {start_idx} to {end_idx}")
-            print(f"{self.grid.time_steps_passed} time steps passed")
-            self.H = []
 
-    def __repr__(self):
-        return f"{self.__class__.__name__}(name={repr(self.name)})"
+## DFTDetector
+class DFTDetector(BlockDetector):
+    """ A frequency domain detector along a line or plane in the FDTD grid
 
-    def __str__(self):
-        s = "    " + repr(self) + "\n"
-        x = f"[{self.x[0]}, ... , {self.x[-1]}]"
-        y = f"[{self.y[0]}, ... , {self.y[-1]}]"
-        z = f"[{self.z[0]}, ... , {self.z[-1]}]"
-        s += f"        @ x={x}, y={y}, z={z}\n"
-        return s
+    Instead of the time history, the detector accumulates the running Fourier
+    transform sum_t F(t) exp(-i w_k t dt) of E and H for a set of wavelengths.
+    Its memory and output scale with the number of wavelengths, not with the
+    number of time steps. At the end of a run the spectra are written to
+    ``{folder}//{name}_dft.h5`` (datasets "E", "H" and "wavelengths").
+    """
+
+    def __init__(self, name=None, wavelengths=None, axis="y"):
+        """Create a DFT detector
+
+        Args:
+            name: name of the Detector
+            wavelengths: the wavelengths [m] of the Fourier transform
+            axis: the axis normal to the detector (used by flux)
+
+        """
+        super().__init__(name=name, axis=axis)
+        if wavelengths is None:
+            raise ValueError("A DFTDetector requires the wavelengths to monitor")
+        self.wavelengths = [float(wl) for wl in wavelengths]
+        self.frequencies = [c / wl for wl in self.wavelengths]
+        self.E_dft = None
+        self.H_dft = None
+
+    def __init_h5file__(self):
+        self._loc = self._grid_index()
+        self._t0 = self.grid.time_steps_passed
+        # the spectra keep accumulating over subsequent runs of the same grid
+        if self.E_dft is None:
+            shape = (len(self.wavelengths),) + self._sample_shape()
+            self.E_dft = bd.zeros(shape, dtype=bd.complex)
+            self.H_dft = bd.zeros(shape, dtype=bd.complex)
+        # in the precision of the accumulators, a single precision omega would let the phase drift
+        omega = 2 * bd.pi * bd.array(self.frequencies, dtype=bd.complex) * self.grid.time_step
+        self._omega = bd.reshape(omega, (-1, 1, 1, 1, 1))
+
+    def _checkpoint_state(self) -> dict:
+        """ the running Fourier transforms, see checkpoint.save_checkpoint """
+        return {"t0": self._t0, "E_dft": self.E_dft, "H_dft": self.H_dft}
+
+    def _restore_state(self, state: dict):
+        """ continue the running Fourier transforms returned by _checkpoint_state """
+        self.__init_h5file__()
+        self._t0 = int(state["t0"])
+        self.E_dft = bd.array(state["E_dft"], dtype=bd.complex)
+        self.H_dft = bd.array(state["H_dft"], dtype=bd.complex)
+
+    def _phase(self, t: float):
+        """ exp(-i w_k t dt) for every wavelength """
+        return bd.exp(-1j * self._omega * t)
+
+    def detect_E(self):
+        """ add the electric field to the running Fourier transforms """
+        t = self.grid.time_steps_passed
+        self.E_dft += self._phase(t) * self.grid.E[self._loc]
+
+    def detect_H(self):
+        """ add the magnetic field to the running Fourier transforms """
+        # H lives half a time step after E
+        t = self.grid.time_steps_passed
+        self.H_dft += self._phase(t + 0.5) * self.grid.H[self._loc]
+        if (t - self._t0 + 1) == self.grid.total_time:
+            self._finish()
+
+    def _finish(self):
+        """ write the spectra to the h5 file """
+        with h5py.File(self.grid.folder + f"//{self.name}_dft.h5", "w") as f:
+            f.create_dataset("E", data=bd.numpy(self.real_E()))
+            f.create_dataset("H", data=bd.numpy(self.real_H()))
+            f.create_dataset("wavelengths", data=self.wavelengths)
+        print(f"Detector {self.name} saved the spectra of {len(self.wavelengths)} wavelengths")
 
     def detector_values(self):
         """ outputs what detector detects """
-        return {"E": self.E, "H": self.H}
+        return {"E": self.E_dft, "H": self.H_dft}
 
     def real_E(self):
-        from .conversions import simE_to_worldE
-        if isinstance(self.E, list):
-            self.E = bd.stack(self.E)
-        return simE_to_worldE(self.E)
-
+        return simE_to_worldE(self.E_dft)
 
     def real_H(self):
-        from .conversions import simH_to_worldH
-        if isinstance(self.H, list):
-            self.H = bd.stack(self.H)
-        return simH_to_worldH(self.H)
+        return simH_to_worldH(self.H_dft)
+
+    def flux(self, axis: str = None):
+        """ power through the detector for every wavelength
+
+        Args:
+            axis: the normal of the detector, defaults to the axis of the detector
+
+        Returns:
+            0.5 * Re(E x H*) integrated over the detector, one value per wavelength
+        """
+        axis = X if (axis or self.axis) == "x" else Y if (axis or self.axis) == "y" else Z
+        E, H = bd.numpy(self.real_E()), bd.numpy(self.real_H())
+        S = 0.5 * cross(E, H.conj(), axis=-1).real[..., axis]
+        if getattr(self.grid, "nonuniform", False):
+            # area of every cell of the detector on a nonuniform mesh
+            widths = [
+                bd.numpy(spacings)[list(index)] for spacings, index in zip(
+                    (self.grid.x_spacings, self.grid.y_spacings, self.grid.z_spacings), (self.x, self.y, self.z))
+            ]
+            widths[axis] = widths[axis] * 0 + 1
+            dA = ix_(*widths)
+            S = S * dA[0] * dA[1] * dA[2]
+            return S.reshape(S.shape[0], -1).sum(axis=1)
+        spacing = [self.grid.grid_spacing_x, self.grid.grid_spacing_y, self.grid.grid_spacing_z]
+        del spacing[axis]
+        return S.reshape(S.shape[0], -1).sum(axis=1) * spacing[0] * spacing[1]
 
 
 ## CurrentDetector
@@ -15,6 +15,7 @@ from glob import glob
 from datetime import datetime
 
 # 3rd party
+import numpy
 from tqdm import tqdm
 from numpy import savez, sqrt
 
@@ -23,7 +24,12 @@ from .typing_ import Tuple, Number, Tensorlike
 
 # relative
 from .backend import backend as bd
+from .backend import NumpyBackend
 from . import constants as const
+from . import jit
+from .writer import H5Writer
+from .checkpoint import save_checkpoint, load_checkpoint
+from .sources import _SourceInjection
 from .conversions import *
 
 # plot
@@ -36,6 +42,28 @@ import matplotlib.animation as animation
 
 ## Functions
 
+# the terms of the curl updates as (component, source component, difference axis, sign):
+# E[..., component] += sign * c*dt/d * inverse_permittivity * d(H[..., source component])/d(axis)
+_E_TERMS = ((0, 2, 1, +1), (0, 1, 2, -1), (1, 0, 2, +1), (1, 2, 0, -1), (2, 1, 0, +1), (2, 0, 1, -1))
+# H[..., component] += sign * c*dt/d * inverse_permeability * d(E[..., source component])/d(axis)
+_H_TERMS = ((0, 2, 1, -1), (0, 1, 2, +1), (1, 0, 2, -1), (1, 2, 0, +1), (2, 1, 0, -1), (2, 0, 1, +1))
+
+
+def _id_dtype(count: int):
+    """the smallest integer type of the backend for the IDs 0, ..., count - 1
+
+    torch only indexes with int64 and int32 tensors (uint8 tensors are masks),
+    its uint8 IDs are converted when they are looked up, see Grid._lookup.
+    """
+    if isinstance(bd, NumpyBackend):
+        for dtype in (numpy.uint8, numpy.uint16, numpy.uint32):
+            if count <= numpy.iinfo(dtype).max + 1:
+                return dtype
+        return numpy.int64
+    import torch
+
+    return torch.uint8 if count <= 256 else torch.int32
+
 
 ## FDTD Grid Class
 class Grid:
@@ -59,6 +87,11 @@ class Grid:
             permeability: float = 1.0,
             courant_number: float = None,
             folder: str = None,
+            x_spacings: Tensorlike = None,
+            y_spacings: Tensorlike = None,
+            z_spacings: Tensorlike = None,
+            spatial_order: int = 2,
+            compact: bool = False,
     ):
         """
         Args:
@@ -70,6 +103,21 @@ class Grid:
                 Defaults to the inverse of the square root of the number of
                 dimensions > 1 (optimal value). The timestep of the simulation
                 will be derived from this number using the CFL-condition.
+            x_spacings, y_spacings, z_spacings: optional size of every cell along
+                x, y and z (length Nx, Ny and Nz) for a nonuniform mesh. The
+                spacing of cell i is the distance between the grid points i and
+                i + 1. Defaults to grid_spacing_x, _y and _z everywhere.
+            spatial_order: the order of the spatial differences of the curls, 2
+                (Yee) or 4. The fourth order differences have a much lower phase
+                error at the same grid spacing, such that the grid can be about
+                twice as coarse per axis; they lower the time step by 6/7 and
+                require a uniform mesh (see Grid._orders).
+            compact: store the materials compactly while the grid runs: a
+                material ID per grid point (uint8 or uint16) with a lookup table
+                of the inverse permittivity of every material, a single inverse
+                permeability when it is uniform and an integer priority volume
+                (see compact_materials). The update kernels gather the
+                coefficients through the lookup table.
         """
         # save the grid spacing
         # Currently self.grid_spacing
@@ -93,8 +141,15 @@ class Grid:
         # dimension of the simulation:
         self.D = int(self.Nx > 1) + int(self.Ny > 1) + int(self.Nz > 1)
 
+        if spatial_order not in (2, 4):
+            raise ValueError(f"spatial_order should be 2 or 4, not {spatial_order}")
+        self.spatial_order = spatial_order
+        # the fourth order differences (27 dF - dF_wide) / 24 of a checkerboard are 7/6
+        # times larger than the second order ones, which lowers the stable time step by 6/7
+        stencil = 7 / 6 if spatial_order == 4 else 1.0
+
         # courant number of the simulation (optimal value)
-        max_courant_number = float(self.D) ** (-0.5)
+        max_courant_number = float(self.D) ** (-0.5) / stencil
         if courant_number is None:
             # slight stability factor added
             self.courant_number = 0.99 * max_courant_number
@@ -106,12 +161,30 @@ class Grid:
         else:
             self.courant_number = float(courant_number)
 
+        # size of every cell along x, y and z
+        self.x_spacings = self._handle_spacings(x_spacings, self.grid_spacing_x, self.Nx)
+        self.y_spacings = self._handle_spacings(y_spacings, self.grid_spacing_y, self.Ny)
+        self.z_spacings = self._handle_spacings(z_spacings, self.grid_spacing_z, self.Nz)
+        self.nonuniform = any(
+            float(bd.max(s)) != float(bd.min(s))
+            for s in (self.x_spacings, self.y_spacings, self.z_spacings) if len(s) > 0
+        )
+        if spatial_order == 4 and self.nonuniform:
+            raise ValueError("The fourth order differences (spatial_order=4) require a uniform mesh")
+        self._set_difference_spacings()
+
         # timestep of the simulation original: self.time_step = self.courant_number * self.grid_spacing / const.c
         # self.time_step = 0.99 / (const.c * sqrt(1 / grid_spacing_x ** 2 + 1 / grid_spacing_y ** 2 + 1 /
         # grid_spacing_z ** 2))
+        # on a nonuniform mesh the smallest cell of every axis limits the time step
+        dx_min, dy_min, dz_min = (
+            float(bd.min(s)) if len(s) > 0 else d
+            for s, d in ((self.x_spacings, self.grid_spacing_x), (self.y_spacings, self.grid_spacing_y),
+                         (self.z_spacings, self.grid_spacing_z))
+        )
         self.time_step = 0.99 / (
-                const.c * sqrt(int(self.Nx > 1) / grid_spacing_x ** 2 + int(self.Ny > 1) / grid_spacing_y ** 2 + int(
-            self.Nz > 1) / grid_spacing_z ** 2))
+                stencil * const.c * sqrt(int(self.Nx > 1) / dx_min ** 2 + int(self.Ny > 1) / dy_min ** 2 + int(
+            self.Nz > 1) / dz_min ** 2))
         # self.time_step = self.courant_number * self.grid_spacing / const.c
         # save electric and magnetic field
         self.E = bd.zeros((self.Nx, self.Ny, self.Nz, 3))
@@ -133,7 +206,13 @@ class Grid:
         )
 
         # Priority matrix of the grid, default to be a all-zero matrix, indicates the background of the sim region.
-        self.priority = bd.zeros((self.Nx, self.Ny, self.Nz))
+        # The objects only store 0 and 1 in it (see Object._register_grid), compact grids keep it as uint8
+        self.compact = compact
+        self.priority = bd.zeros((self.Nx, self.Ny, self.Nz), dtype=_id_dtype(1) if compact else None)
+        # the compact materials, see compact_materials
+        self.material_id = None
+        self.materials = None
+        self._uniform_inverse_permeability = None
 
         # save current time index
         self.time_steps_passed = 0
@@ -153,6 +232,128 @@ class Grid:
         # folder path to store the simulation
         self.folder = folder
 
+        # update engine of the simulation, see Grid.run
+        self.engine = "default"
+        # (degenerate axis, E components, H components) of a 2D TE/TM simulation, see Grid._set_reduction
+        self.reduced = None
+        # background writer of the detectors, only present during run
+        self.writer = None
+        # precomputed injection of the sources, only present during run
+        self._injection = None
+
+    @staticmethod
+    def _handle_spacings(spacings, grid_spacing: float, N: int) -> Tensorlike:
+        """the size of every cell along an axis"""
+        if spacings is None:
+            return bd.ones(N) * float(grid_spacing)
+        spacings = bd.array(spacings, dtype=bd.float)
+        if spacings.shape != (N,):
+            raise ValueError(f"expected {N} cell sizes, got an array of shape {tuple(spacings.shape)}")
+        return spacings
+
+    def _set_difference_spacings(self):
+        """set the spacings the differences of the curls are divided by
+
+        The H-type differences (curl of E) at i + 1/2 are divided by the cell size
+        d[i], the E-type differences (curl of H) at i by the distance between the H
+        points around it, (d[i - 1] + d[i]) / 2. Both are broadcastable to the
+        differences along their axis. On a uniform mesh these are just the scalar
+        grid spacings.
+
+        sets:
+            self._dH: spacings of the curl of E along x, y and z
+            self._dE: spacings of the curl of H along x, y and z
+        """
+        if not self.nonuniform:
+            self._dH = self._dE = (self.grid_spacing_x, self.grid_spacing_y, self.grid_spacing_z)
+            return
+        dH, dE = [], []
+        for axis, s in enumerate((self.x_spacings, self.y_spacings, self.z_spacings)):
+            shape = [1, 1, 1]
+            shape[axis] = max(len(s) - 1, 0)
+            dH.append(bd.reshape(s[:-1], tuple(shape)))
+            dE.append(bd.reshape((s[:-1] + s[1:]) / 2, tuple(shape)))
+        self._dH, self._dE = tuple(dH), tuple(dE)
+
+    @property
+    def _orders(self) -> Tuple[int, int, int]:
+        """the order of the differences along x, y and z
+
+        With spatial_order=4 the axes of periodic and symmetry boundaries keep the
+        second order differences, as these boundaries only provide the single layer
+        of wrapped or mirrored values the Yee differences reach across the edge. So
+        do the axes with less than 4 grid points.
+        """
+        if self.spatial_order == 2:
+            return 2, 2, 2
+        orders = [4 if N > 3 else 2 for N in (self.Nx, self.Ny, self.Nz)]
+        for boundary in self.boundaries:
+            if not boundary._wide_stencil:
+                orders[boundary.axis] = 2
+        return tuple(orders)
+
+    def _difference(self, F: Tensorlike, axis: int, high: bool, start: int, stop: int) -> Tensorlike:
+        """the fourth order difference of a field component along an axis
+
+        (27 (F[i + 1] - F[i]) - (F[i + 2] - F[i - 1])) / 24 at the H-type positions
+        i + 1/2 (high=False), or the same shifted down by one, at the E-type
+        positions i (high=True), for start <= i < stop. F vanishes outside the
+        grid: the differences of E and H then stay each other's negative
+        transposes, which keeps the update stable up to the edges of the grid.
+
+        Args:
+            F: a single component of E or H, shaped like the grid
+            axis: the axis of the difference
+            high: True for the differences of H at the E points (curl of H)
+            start, stop: the positions of the differences along the axis
+        """
+        N = F.shape[axis]
+        shape = list(F.shape)
+        shape[axis] = stop - start
+        shift = -1 if high else 0
+
+        def take(k):
+            # F[i + shift + k] for start <= i < stop, zero outside the grid
+            lo, hi = max(start, -k - shift), min(stop, N - k - shift)
+            if lo == start and hi == stop:
+                loc = [slice(None)] * 3
+                loc[axis] = slice(start + k + shift, stop + k + shift)
+                return F[tuple(loc)]
+            values = bd.zeros(tuple(shape), dtype=F.dtype)
+            if hi > lo:
+                dst, src = [slice(None)] * 3, [slice(None)] * 3
+                dst[axis] = slice(lo - start, hi - start)
+                src[axis] = slice(lo + k + shift, hi + k + shift)
+                values[tuple(dst)] = F[tuple(src)]
+            return values
+
+        return (27 * (take(1) - take(0)) - (take(2) - take(-1))) / 24
+
+    def _wide_curl(self, F: Tensorlike, terms: tuple, high: bool) -> Tensorlike:
+        """the sum of sign * d(F[..., source component])/d(axis) of the terms (see _E_TERMS),
+        with the differences of _orders
+
+        Args:
+            F: H (high=True, differences at the E points) or E (high=False)
+            terms: _E_TERMS or _H_TERMS
+            high: True for the differences of H
+        """
+        curl = bd.zeros(F.shape, dtype=F.dtype)
+        orders = self._orders
+        spacings = self._dE if high else self._dH
+        for comp, fcomp, axis, sign in terms:
+            N = F.shape[axis]
+            hi, lo = [slice(None)] * 3, [slice(None)] * 3
+            hi[axis], lo[axis] = slice(1, None), slice(None, -1)
+            loc = tuple(hi if high else lo)
+            if orders[axis] == 4:
+                start = 1 if high else 0
+                D = self._difference(F[..., fcomp], axis, high, start, start + N - 1)
+            else:
+                D = F[tuple(hi) + (fcomp,)] - F[tuple(lo) + (fcomp,)]
+            curl[loc + (comp,)] += sign * D / spacings[axis]
+        return curl
+
     def _handle_distance(self, distance: Number, axis: "x") -> int:
         """transform a distance to an integer number of gridpoints"""
         if axis == "x":
@@ -207,16 +408,20 @@ class Grid:
             The curl of E (H-type field located on the faces of the grid [half-integer grid points])
         ∇ × E[m, n, p]
         """
+        if self.spatial_order == 4:
+            # H -= c*dt * inverse_permeability * curl(E), see _H_TERMS
+            return -self._wide_curl(E, _H_TERMS, high=False)
         curl = bd.zeros(E.shape, dtype=E.dtype)
 
-        curl[:, :-1, :, 0] += (E[:, 1:, :, 2] - E[:, :-1, :, 2]) / self.grid_spacing_y
-        curl[:, :, :-1, 0] -= (E[:, :, 1:, 1] - E[:, :, :-1, 1]) / self.grid_spacing_z
+        dx, dy, dz = self._dH
+        curl[:, :-1, :, 0] += (E[:, 1:, :, 2] - E[:, :-1, :, 2]) / dy
+        curl[:, :, :-1, 0] -= (E[:, :, 1:, 1] - E[:, :, :-1, 1]) / dz
 
-        curl[:, :, :-1, 1] += (E[:, :, 1:, 0] - E[:, :, :-1, 0]) / self.grid_spacing_z
-        curl[:-1, :, :, 1] -= (E[1:, :, :, 2] - E[:-1, :, :, 2]) / self.grid_spacing_x
+        curl[:, :, :-1, 1] += (E[:, :, 1:, 0] - E[:, :, :-1, 0]) / dz
+        curl[:-1, :, :, 1] -= (E[1:, :, :, 2] - E[:-1, :, :, 2]) / dx
 
-        curl[:-1, :, :, 2] += (E[1:, :, :, 1] - E[:-1, :, :, 1]) / self.grid_spacing_x
-        curl[:, :-1, :, 2] -= (E[:, 1:, :, 0] - E[:, :-1, :, 0]) / self.grid_spacing_y
+        curl[:-1, :, :, 2] += (E[1:, :, :, 1] - E[:-1, :, :, 1]) / dx
+        curl[:, :-1, :, 2] -= (E[:, 1:, :, 0] - E[:, :-1, :, 0]) / dy
 
         return curl
 
@@ -255,16 +460,19 @@ class Grid:
             The curl of H (E-type field located on the edges of the grid [integer grid points])
         ∇ × H[m, n, p]
         """
+        if self.spatial_order == 4:
+            return self._wide_curl(H, _E_TERMS, high=True)
         curl = bd.zeros(H.shape, dtype=H.dtype)
 
-        curl[:, 1:, :, 0] += (H[:, 1:, :, 2] - H[:, :-1, :, 2]) / self.grid_spacing_y
-        curl[:, :, 1:, 0] -= (H[:, :, 1:, 1] - H[:, :, :-1, 1]) / self.grid_spacing_z
+        dx, dy, dz = self._dE
+        curl[:, 1:, :, 0] += (H[:, 1:, :, 2] - H[:, :-1, :, 2]) / dy
+        curl[:, :, 1:, 0] -= (H[:, :, 1:, 1] - H[:, :, :-1, 1]) / dz
 
-        curl[:, :, 1:, 1] += (H[:, :, 1:, 0] - H[:, :, :-1, 0]) / self.grid_spacing_z
-        curl[1:, :, :, 1] -= (H[1:, :, :, 2] - H[:-1, :, :, 2]) / self.grid_spacing_x
+        curl[:, :, 1:, 1] += (H[:, :, 1:, 0] - H[:, :, :-1, 0]) / dz
+        curl[1:, :, :, 1] -= (H[1:, :, :, 2] - H[:-1, :, :, 2]) / dx
 
-        curl[1:, :, :, 2] += (H[1:, :, :, 1] - H[:-1, :, :, 1]) / self.grid_spacing_x
-        curl[:, 1:, :, 2] -= (H[:, 1:, :, 0] - H[:, :-1, :, 0]) / self.grid_spacing_y
+        curl[1:, :, :, 2] += (H[1:, :, :, 1] - H[:-1, :, :, 1]) / dx
+        curl[:, 1:, :, 2] -= (H[:, 1:, :, 0] - H[:, :-1, :, 0]) / dy
 
         return curl
 
@@ -341,34 +549,424 @@ class Grid:
         """get the total time passed"""
         return self.time_steps_passed * self.time_step
 
-    def run(self, total_time: Number = None, progress_bar: bool = True, interval: int = 100):
+    def run(self, total_time: Number = None, progress_bar: bool = True, interval: int = 100,
+            engine: str = "default", processes: int = 1, split: str = "z",
+            shutoff: float = None, shutoff_interval: int = 100, shutoff_detectors: list = None,
+            checkpoint_interval: int = None, checkpoint_path: str = None, resume_from: str = None):
         """run an FDTD simulation.
 
         Args:
-            total_time: the total time for the simulation to run.
+            total_time: the total time for the simulation to run. With a shutoff
+                this is the maximum time.
             progress_bar: choose to show a progress bar during simulation
             interval: the interval at which to save frames for animation.
                 If animate is True, the frames will be saved every `interval`
                 time steps.
+            engine: the update engine of the fields.
+                - "default": curls are built as new arrays every time step.
+                - "inplace": E and H are updated in place through preallocated
+                  work buffers, no arrays are allocated during the time loop.
+                - "jit": the field, PML and source updates are compiled with numba
+                  into multi-threaded loops. Requires numba and the numpy backend.
+                With the "default" and "inplace" engines a 2D grid whose sources only
+                excite one polarization (TE or TM) is updated with a reduced kernel,
+                see Grid._set_reduction.
+            processes: the number of processes the grid is split over. With more than
+                one process the simulation is run by the decomposed runner, see
+                decomposition.run_decomposed. Requires the numpy backend.
+            split: the axes along which the grid is split when processes > 1,
+                e.g. "z" (slabs) or "xz" (pencils).
+            shutoff: stop the simulation as soon as the field energy (see
+                field_energy) has decayed below shutoff times its peak value during
+                the run, e.g. 1e-5. The h5 files of the detectors are truncated to
+                the time steps that have been run. None to always run total_time.
+            shutoff_interval: the number of time steps between two checks of the
+                field energy.
+            shutoff_detectors: the detectors (or their names) of which the energy is
+                checked. None for the energy of the whole grid.
+            checkpoint_interval: save a checkpoint every checkpoint_interval time
+                steps (see checkpoint.save_checkpoint). None for no checkpoints.
+            checkpoint_path: the checkpoint file, defaults to
+                ``{folder}/checkpoint.h5``, or ``checkpoint.h5`` in the working
+                directory for a grid without folder.
+            resume_from: a checkpoint file to continue the run from. The grid should
+                be set up like the one the checkpoint was saved from and its folder
+                should hold the h5 files of the detectors. total_time counts from
+                the start of the original run.
 
         """
         if isinstance(total_time, float):
             total_time /= self.time_step
+        if processes > 1:
+            if shutoff is not None:
+                raise NotImplementedError("The shutoff is not supported when running with several processes")
+            if checkpoint_interval is not None or resume_from is not None:
+                raise NotImplementedError("Checkpoints are not supported when running with several processes")
+            if self.animate:
+                raise ValueError("Animation is not supported when running with several processes")
+            from .decomposition import run_decomposed
+
+            return run_decomposed(self, total_time, processes=processes, split=split,
+                                  progress_bar=progress_bar, engine=engine)
+        self._set_engine(engine)
         self.total_time = int(total_time)
-        time = range(0, self.total_time, 1)
-        if progress_bar:
-            time = tqdm(time)
+        if checkpoint_interval is not None and checkpoint_path is None:
+            checkpoint_path = os.path.join(self.folder if self.folder is not None else os.getcwd(), "checkpoint.h5")
         if self.animate:
             if os.path.exists(self.folder + "/frames"):
-                for file_name in os.listdir(self.folder + "/frames"):
-                    os.remove(self.folder + "/frames/" + file_name)
+                if resume_from is None:
+                    for file_name in os.listdir(self.folder + "/frames"):
+                        os.remove(self.folder + "/frames/" + file_name)
             else:
                 os.makedirs(self.folder + "/frames")
             self.folder_frames = self.folder + "/frames"
-        for det in self.detectors:
-            det.__init_h5file__()
-        for _ in time:
-            self.step(interval=interval)
+        if resume_from is not None:
+            run_state = load_checkpoint(self, resume_from)
+            t0, peak = int(run_state["start"]), float(run_state["peak"])
+        else:
+            for det in self.detectors:
+                det.__init_h5file__()
+            t0, peak = self.time_steps_passed, 0.0
+        time = range(self.time_steps_passed - t0, self.total_time, 1)
+        if progress_bar:
+            time = tqdm(time)
+        if shutoff_detectors is not None:
+            shutoff_detectors = [getattr(self, det) if isinstance(det, str) else det for det in shutoff_detectors]
+        stopped = False
+        self._injection = _SourceInjection(self, range(self.time_steps_passed, t0 + self.total_time))
+        # the detectors write their data through a background writer, which is drained at the end
+        self.writer = H5Writer()
+        try:
+            for _ in time:
+                self.step(interval=interval)
+                steps = self.time_steps_passed - t0
+                if checkpoint_interval is not None and steps % checkpoint_interval == 0 and steps < self.total_time:
+                    save_checkpoint(self, checkpoint_path, {"start": t0, "total_time": self.total_time, "peak": peak})
+                if shutoff is not None and steps % shutoff_interval == 0:
+                    energy = self.field_energy(shutoff_detectors)
+                    peak = max(peak, energy)
+                    if peak > 0 and energy < shutoff * peak:
+                        stopped = True
+                        if progress_bar:
+                            time.close()
+                        break
+        except BaseException:
+            self._injection = None
+            writer, self.writer = self.writer, None
+            # an error while flushing the data should not hide the error of the run
+            try:
+                writer.close()
+            except Exception:
+                pass
+            raise
+        self._injection = None
+        writer, self.writer = self.writer, None
+        writer.close()
+        if stopped:
+            self.total_time = self.time_steps_passed - t0
+            print(f"The field energy has decayed to {energy / peak:.2e} of its peak, "
+                  f"the simulation stopped after {self.total_time} time steps")
+            for det in self.detectors:
+                if hasattr(det, "_finish"):
+                    det._finish()
+
+    def field_energy(self, detectors: list = None) -> float:
+        """the electromagnetic energy in the grid or at some detectors
+
+        The energy is summed over the grid points as eps_r |E|^2 + mu_r |H|^2 in
+        the scaled units of the fields, i.e. it is proportional to the physical
+        energy on a uniform grid.
+
+        Args:
+            detectors: the detectors at which the energy is summed. None for the
+                whole grid.
+
+        Returns:
+            the energy
+        """
+        locs = [(slice(None),) * 3] if detectors is None else [det._grid_index() for det in detectors]
+        energy = 0.0
+        for loc in locs:
+            energy += float(bd.sum(bd.abs(self.E[loc]) ** 2 / self._inverse_permittivity_at(loc)))
+            energy += float(bd.sum(bd.abs(self.H[loc]) ** 2 / self._inverse_permeability_at(loc)))
+        return energy
+
+    @property
+    def inverse_permittivity(self) -> Tensorlike:
+        """the inverse relative permittivity of every grid point, shape (Nx, Ny, Nz, 3)
+
+        Reading it from compact materials expands them back into the full array
+        first (see expand_materials), so that it can be changed in place. The
+        next run compacts them again.
+        """
+        if self._inverse_permittivity is None and self.material_id is not None:
+            self.expand_materials()
+        return self._inverse_permittivity
+
+    @inverse_permittivity.setter
+    def inverse_permittivity(self, value: Tensorlike):
+        self._inverse_permittivity = value
+        self.material_id = self.materials = None
+
+    @property
+    def inverse_permeability(self) -> Tensorlike:
+        """the inverse relative permeability of every grid point, shape (Nx, Ny, Nz, 3),
+        see inverse_permittivity"""
+        if self._inverse_permeability is None and self._uniform_inverse_permeability is not None:
+            self.expand_materials()
+        return self._inverse_permeability
+
+    @inverse_permeability.setter
+    def inverse_permeability(self, value: Tensorlike):
+        self._inverse_permeability = value
+        self._uniform_inverse_permeability = None
+
+    def __setstate__(self, state):
+        # grids pickled before the compact materials keep the arrays under their public names
+        for name in ("inverse_permittivity", "inverse_permeability"):
+            if name in state:
+                state["_" + name] = state.pop(name)
+        state.setdefault("compact", False)
+        state.setdefault("material_id", None)
+        state.setdefault("materials", None)
+        state.setdefault("_uniform_inverse_permeability", None)
+        self.__dict__.update(state)
+
+    @property
+    def _compacted(self) -> bool:
+        """whether some of the materials are stored compactly, see compact_materials"""
+        return self.material_id is not None or self._uniform_inverse_permeability is not None
+
+    def compact_materials(self):
+        """store the materials of the grid compactly
+
+        The distinct values of inverse_permittivity become the rows of the lookup
+        table `materials` (shape (M, 3)), every grid point keeps the row of its
+        value in `material_id` (uint8 up to 256 materials, else uint16, see
+        _id_dtype). A uniform inverse_permeability is kept as one value per
+        component and the priority as an integer volume. The update kernels then
+        gather the coefficients through the lookup table. Grid.run calls this for
+        grids created with compact=True.
+        """
+        if self._inverse_permittivity is not None:
+            table, ids = numpy.unique(bd.numpy(self._inverse_permittivity).reshape(-1, 3), axis=0,
+                                      return_inverse=True)
+            self._inverse_permittivity = None
+            self.materials = bd.array(table)
+            self.material_id = bd.array(ids.reshape(self.Nx, self.Ny, self.Nz), dtype=_id_dtype(len(table)))
+        if self._inverse_permeability is not None:
+            inverse = bd.numpy(self._inverse_permeability).reshape(-1, 3)
+            if (inverse == inverse[:1]).all():
+                self._inverse_permeability = None
+                self._uniform_inverse_permeability = tuple(float(value) for value in inverse[0])
+        priority = bd.numpy(self.priority)
+        if priority.dtype.kind == "f":
+            self.priority = bd.array(priority, dtype=_id_dtype(int(priority.max()) + 1))
+
+    def expand_materials(self):
+        """restore the full arrays of the compact materials, see compact_materials"""
+        if self.material_id is not None:
+            self._inverse_permittivity = self._lookup(self.materials, (slice(None),) * 3)
+            self.material_id = self.materials = None
+        if self._uniform_inverse_permeability is not None:
+            self._inverse_permeability = bd.ones((self.Nx, self.Ny, self.Nz, 3)) * bd.array(
+                self._uniform_inverse_permeability)
+            self._uniform_inverse_permeability = None
+
+    def _lookup(self, table: Tensorlike, loc: tuple) -> Tensorlike:
+        """the rows of a lookup table for the material IDs of the grid points loc"""
+        ids = self.material_id[loc]
+        if not isinstance(bd, NumpyBackend):
+            ids = ids.long()
+        return table[ids]
+
+    def _inverse_permittivity_at(self, loc: tuple) -> Tensorlike:
+        """inverse_permittivity[loc] without expanding compact materials
+
+        Args:
+            loc: the index of the grid points, optionally followed by the component
+        """
+        if self.material_id is None:
+            return self.inverse_permittivity[loc]
+        return self._lookup(self.materials, loc[:3])[(Ellipsis,) + tuple(loc[3:])]
+
+    def _inverse_permeability_at(self, loc: tuple) -> Tensorlike:
+        """inverse_permeability[loc] without expanding compact materials, see _inverse_permittivity_at"""
+        if self._uniform_inverse_permeability is None:
+            return self.inverse_permeability[loc]
+        values = bd.ones(self.H[loc[:3]].shape) * bd.array(self._uniform_inverse_permeability)
+        return values[(Ellipsis,) + tuple(loc[3:])]
+
+    def _inverse_materials(self) -> tuple:
+        """the inverse permittivity and permeability as taken by _add_difference: the full
+        arrays, or per component a lookup table of the material IDs or a single value"""
+        permittivity = self._inverse_permittivity
+        if self.material_id is not None:
+            permittivity = tuple(self.materials[:, comp] for comp in range(3))
+        permeability = self._inverse_permeability
+        if self._uniform_inverse_permeability is not None:
+            permeability = self._uniform_inverse_permeability
+        return permittivity, permeability
+
+    def _jit_materials(self, material: str) -> tuple:
+        """the inverse permittivity or permeability as taken by the jit kernels
+
+        Args:
+            material: "permittivity" or "permeability"
+
+        Returns:
+            (inv, ids): the full array and None, or the lookup table and the
+            material IDs. A uniform permeability is a table with a single row
+            that every grid point looks up.
+        """
+        if material == "permittivity" and self.material_id is not None:
+            return self.materials, self.material_id
+        if material == "permeability" and self._uniform_inverse_permeability is not None:
+            ids = numpy.broadcast_to(numpy.zeros(1, dtype=numpy.uint8), (self.Nx, self.Ny, self.Nz))
+            return numpy.array([self._uniform_inverse_permeability]), ids
+        return getattr(self, "inverse_" + material), None
+
+    def _set_engine(self, engine: str = "default"):
+        """select the update engine and prepare its work buffers"""
+        if engine not in ("default", "inplace", "jit"):
+            raise ValueError(
+                f"Unknown engine '{engine}'. Available engines: 'default', 'inplace', 'jit'"
+            )
+        if engine == "jit":
+            if not jit.NUMBA_AVAILABLE:
+                raise RuntimeError("Jit engine is not available. Is numba installed? (pip install photfdtd[jit])")
+            if not isinstance(bd, NumpyBackend):
+                raise RuntimeError("Jit engine is only available for the numpy backend.")
+            if self.spatial_order == 4:
+                raise NotImplementedError("The jit engine only supports grids with spatial_order=2")
+        if self.compact:
+            self.compact_materials()
+        self.engine = engine
+        self._set_reduction()
+        # compact materials are always updated in place (or by the jit kernels), a full
+        # array of the looked up coefficients would cancel the savings
+        if engine in ("inplace", "jit") or self.reduced is not None or self._compacted:
+            self._init_inplace_buffers()
+
+    def _set_reduction(self):
+        """detect a 2D TE/TM simulation and restrict the updates to its field components
+
+        If exactly one axis of the grid has length 1, Maxwell's equations split into two
+        independent sets of field components: the E component along the degenerate axis
+        with the two H components in the plane, and the two E components in the plane
+        with the H component along the degenerate axis. When the sources only excite one
+        of these sets, the other one stays zero and is not updated: the curl update
+        drops to the 4 non-vanishing terms of the excited set (computed in place without
+        temporaries) and the PMLs only keep the convolutions of that set.
+        The jit engine always updates all components.
+
+        sets:
+            self.reduced: (degenerate axis, E components, H components) or None
+        """
+        self.reduced = None
+        flat = [axis for axis, N in enumerate((self.Nx, self.Ny, self.Nz)) if N == 1]
+        if self.engine != "jit" and len(flat) == 1 and self.sources:
+            a = flat[0]
+            sets = set()
+            for src in self.sources:
+                if not hasattr(src, "polarization"):
+                    # e.g. SoftArbitraryPointSource, which drives Ez
+                    sets.add(2 == a)
+                    continue
+                sets.add("xyz".index(src.polarization) == a)
+                if hasattr(src, "_Hpol"):
+                    sets.add(src._Hpol != a)
+            if len(sets) == 1:
+                in_plane = tuple(i for i in range(3) if i != a)
+                if sets.pop():
+                    self.reduced = (a, (a,), in_plane)
+                else:
+                    self.reduced = (a, in_plane, (a,))
+        self._E_terms = _E_TERMS
+        self._H_terms = _H_TERMS
+        if self.reduced is not None:
+            a, E_comps, H_comps = self.reduced
+            self._E_terms = tuple(t for t in _E_TERMS if t[0] in E_comps and t[2] != a)
+            self._H_terms = tuple(t for t in _H_TERMS if t[0] in H_comps and t[2] != a)
+        for boundary in self.boundaries:
+            if hasattr(boundary, "_set_components"):
+                boundary._set_components()
+
+    def _init_inplace_buffers(self):
+        """allocate the work buffer and the per-axis coefficients of the in-place engine
+
+        The factor c*dt/d of every axis is stored as an array broadcastable to the
+        differences along that axis, such that the update needs no temporaries.
+        Along the axes with fourth order differences it includes their 1/24.
+        """
+        cdt = const.c * self.time_step
+        shapes = ((max(self.Nx - 1, 0), 1, 1), (1, max(self.Ny - 1, 0), 1), (1, 1, max(self.Nz - 1, 0)))
+        self._inplace_orders = self._orders
+        # c*dt/d of the E-type (curl of H) and of the H-type (curl of E) differences
+        self._cdt_E = tuple(bd.ones(shape) * (cdt / d if order == 2 else cdt / d / 24)
+                            for shape, d, order in zip(shapes, self._dE, self._inplace_orders))
+        self._cdt_H = tuple(bd.ones(shape) * (cdt / d if order == 2 else cdt / d / 24)
+                            for shape, d, order in zip(shapes, self._dH, self._inplace_orders))
+        # a single scalar-field buffer is enough: every term writes and reads the same view
+        self._work = bd.zeros((self.Nx, self.Ny, self.Nz), dtype=self.E.dtype)
+
+    def _add_difference(self, field, comp, F, fcomp, axis, sign, coef, inverse_material, high):
+        """field[..., comp] += sign * inverse_material * c*dt/d * (difference of F[..., fcomp] along axis)
+
+        Along an axis with fourth order differences (see _difference) the work buffer
+        holds 27 (F[i + 1] - F[i]) - (F[i + 2] - F[i - 1]), coef includes the 1/24.
+
+        Args:
+            high: True if the difference is stored at the upper index (E-type update,
+                e.g. curl[1:]), False if it is stored at the lower index (H-type
+                update, e.g. curl[:-1]).
+        """
+        hi = [slice(None)] * 3
+        lo = [slice(None)] * 3
+        hi[axis] = slice(1, None)
+        lo[axis] = slice(None, -1)
+        hi, lo = tuple(hi), tuple(lo)
+        loc = hi if high else lo
+
+        work = self._work[loc]
+        work[...] = F[hi + (fcomp,)]
+        work -= F[lo + (fcomp,)]
+        if self._inplace_orders[axis] == 4:
+            # the wide differences vanish beyond the edges of the grid
+            N = F.shape[axis]
+            head, tail, wide_hi, wide_lo = ([slice(None)] * 3 for _ in range(4))
+            head[axis], tail[axis] = slice(None, N - 2), slice(1, None)
+            wide_hi[axis], wide_lo[axis] = slice(2, None), slice(None, N - 2)
+            work *= 27
+            work[tuple(head)] -= F[tuple(wide_hi) + (fcomp,)]
+            work[tuple(tail)] += F[tuple(wide_lo) + (fcomp,)]
+        work *= coef
+        if isinstance(inverse_material, tuple):
+            # compact materials: a lookup table of the material IDs or a single value, see _inverse_materials
+            material = inverse_material[comp]
+            work *= self._lookup(material, loc) if bd.is_array(material) else material
+        else:
+            work *= inverse_material[loc + (comp,)]
+        if sign > 0:
+            field[loc + (comp,)] += work
+        else:
+            field[loc + (comp,)] -= work
+
+    def _update_E_inplace(self):
+        """E += c*dt * inverse_permittivity * curl(H) without temporaries"""
+        coefs = self._cdt_E
+        inverse_permittivity = self._inverse_materials()[0]
+        for comp, fcomp, axis, sign in self._E_terms:
+            self._add_difference(self.E, comp, self.H, fcomp, axis, sign, coefs[axis],
+                                 inverse_permittivity, high=True)
+
+    def _update_H_inplace(self):
+        """H -= c*dt * inverse_permeability * curl(E) without temporaries"""
+        coefs = self._cdt_H
+        inverse_permeability = self._inverse_materials()[1]
+        for comp, fcomp, axis, sign in self._H_terms:
+            self._add_difference(self.H, comp, self.E, fcomp, axis, sign, coefs[axis],
+                                 inverse_permeability, high=False)
 
     def step(self, interval=100):
         """do a single FDTD step by first updating the electric field and then
@@ -444,9 +1042,15 @@ class Grid:
         for boundary in self.boundaries:
             boundary.update_phi_E(dx=self.grid_spacing_x, dy=self.grid_spacing_y, dz=self.grid_spacing_z)
 
-        curl = self.curl_H_with_nonuniform_grid(self.H)
-        # Before: self.E += self.courant_number * self.inverse_permittivity * curl
-        self.E += const.c * self.time_step * self.inverse_permittivity * curl
+        if self.engine == "jit":
+            inv, ids = self._jit_materials("permittivity")
+            jit.update_E(self.E, self.H, inv, *(c.ravel() for c in self._cdt_E), ids)
+        elif self.engine == "inplace" or self.reduced is not None or self._compacted:
+            self._update_E_inplace()
+        else:
+            curl = self.curl_H_with_nonuniform_grid(self.H)
+            # Before: self.E += self.courant_number * self.inverse_permittivity * curl
+            self.E += const.c * self.time_step * self.inverse_permittivity * curl
 
         # update objects
         # for obj in self.objects:
@@ -459,8 +1063,11 @@ class Grid:
             boundary.update_E()
 
         # add sources to grid:
-        for src in self.sources:
-            src.update_E()
+        if self._injection is not None:
+            self._injection.update_E()
+        else:
+            for src in self.sources:
+                src.update_E()
 
         # detect electric field
         for det in self.detectors:
@@ -473,10 +1080,16 @@ class Grid:
         for boundary in self.boundaries:
             boundary.update_phi_H(dx=self.grid_spacing_x, dy=self.grid_spacing_y, dz=self.grid_spacing_z)
 
-        curl = self.curl_E_with_nonuniform_grid(self.E)
-        # Before: self.H -= self.courant_number * self.inverse_permeability * curl
-        # self.H -= self.time_step * self.inverse_permeability * curl / sqrt(const.mu0)
-        self.H -= const.c * self.time_step * self.inverse_permeability * curl
+        if self.engine == "jit":
+            inv, ids = self._jit_materials("permeability")
+            jit.update_H(self.E, self.H, inv, *(c.ravel() for c in self._cdt_H), ids)
+        elif self.engine == "inplace" or self.reduced is not None or self._compacted:
+            self._update_H_inplace()
+        else:
+            curl = self.curl_E_with_nonuniform_grid(self.E)
+            # Before: self.H -= self.courant_number * self.inverse_permeability * curl
+            # self.H -= self.time_step * self.inverse_permeability * curl / sqrt(const.mu0)
+            self.H -= const.c * self.time_step * self.inverse_permeability * curl
 
         # # update objects
         # for obj in self.objects:
@@ -487,8 +1100,11 @@ class Grid:
             boundary.update_H()
 
         # add sources to grid:
-        for src in self.sources:
-            src.update_H()
+        if self._injection is not None:
+            self._injection.update_H()
+        else:
+            for src in self.sources:
+                src.update_H()
 
         # detect electric field
         for det in self.detectors:
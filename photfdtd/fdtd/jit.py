@@ -0,0 +1,194 @@
+""" JIT-compiled kernels for the ``jit`` engine of the FDTD Grid.
+
+The ``numpy`` backend evaluates the Yee stencil as a chain of whole-array
+operations, which is memory-bandwidth bound and runs on a single core. The
+kernels in this module compile the same update equations with numba into
+multi-threaded loops over tiles of the grid. They are used by::
+
+    grid.run(total_time, engine="jit")
+
+and only work together with the ``numpy`` backend. Every kernel takes the
+material coefficients either as a full array or, for compact materials (see
+Grid.compact_materials), as a lookup table together with the material IDs.
+
+Numba is an optional dependency (``pip install photfdtd[jit]``):
+``NUMBA_AVAILABLE`` tells whether it could be imported. The kernels are compiled
+the first time they are called in a process; nothing is cached on disk, so
+read-only installs work as well.
+
+"""
+## Imports
+
+try:
+    from numba import njit, prange, types
+    from numba.extending import overload
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# edge length of the (x, y) tiles the grid is split into. Every thread updates whole
+# tiles; the z-axis (the contiguous one) is always traversed completely.
+BLOCK = 16
+
+
+def _offset(s: slice, n: int) -> int:
+    """start index of a slice of an axis with length n"""
+    if s.start is None:
+        return 0
+    if s.start < 0:
+        return n + s.start
+    return s.start
+
+
+def _coefficient(inv, ids, i, j, k, comp):
+    """inv[i, j, k, comp] of a full array (ids is None) or inv[ids[i, j, k], comp]
+    of a lookup table, resolved when the kernels are compiled"""
+
+
+if NUMBA_AVAILABLE:
+
+    @overload(_coefficient, inline="always")
+    def _coefficient_impl(inv, ids, i, j, k, comp):
+        if isinstance(ids, (types.NoneType, types.Omitted)):
+            return lambda inv, ids, i, j, k, comp: inv[i, j, k, comp]
+        return lambda inv, ids, i, j, k, comp: inv[ids[i, j, k], comp]
+
+    @njit(parallel=True)
+    def update_E(E, H, inv, cdt_dx, cdt_dy, cdt_dz, ids=None):
+        """E += c*dt * inverse_permittivity * curl(H)
+
+        Args:
+            E, H: the fields of the grid, shape (Nx, Ny, Nz, 3)
+            inv: the inverse permittivity of the grid, shape (Nx, Ny, Nz, 3), or
+                the lookup table of the materials, shape (M, 3)
+            cdt_dx, cdt_dy, cdt_dz: c*dt/d of every cell edge along x, y and z,
+                with lengths Nx-1, Ny-1 and Nz-1.
+            ids: the material ID of every grid point, shape (Nx, Ny, Nz), when
+                inv is a lookup table
+        """
+        Nx, Ny, Nz = E.shape[0], E.shape[1], E.shape[2]
+        ntx = (Nx + BLOCK - 1) // BLOCK
+        nty = (Ny + BLOCK - 1) // BLOCK
+        for t in prange(ntx * nty):
+            i0 = (t // nty) * BLOCK
+            j0 = (t % nty) * BLOCK
+            for i in range(i0, min(i0 + BLOCK, Nx)):
+                for j in range(j0, min(j0 + BLOCK, Ny)):
+                    for k in range(Nz):
+                        inv0 = _coefficient(inv, ids, i, j, k, 0)
+                        inv1 = _coefficient(inv, ids, i, j, k, 1)
+                        inv2 = _coefficient(inv, ids, i, j, k, 2)
+                        if j > 0:
+                            E[i, j, k, 0] += inv0 * cdt_dy[j - 1] * (H[i, j, k, 2] - H[i, j - 1, k, 2])
+                            E[i, j, k, 2] -= inv2 * cdt_dy[j - 1] * (H[i, j, k, 0] - H[i, j - 1, k, 0])
+                        if k > 0:
+                            E[i, j, k, 0] -= inv0 * cdt_dz[k - 1] * (H[i, j, k, 1] - H[i, j, k - 1, 1])
+                            E[i, j, k, 1] += inv1 * cdt_dz[k - 1] * (H[i, j, k, 0] - H[i, j, k - 1, 0])
+                        if i > 0:
+                            E[i, j, k, 1] -= inv1 * cdt_dx[i - 1] * (H[i, j, k, 2] - H[i - 1, j, k, 2])
+                            E[i, j, k, 2] += inv2 * cdt_dx[i - 1] * (H[i, j, k, 1] - H[i - 1, j, k, 1])
+
+    @njit(parallel=True)
+    def update_H(E, H, inv, cdt_dx, cdt_dy, cdt_dz, ids=None):
+        """H -= c*dt * inverse_permeability * curl(E)
+
+        Args:
+            E, H: the fields of the grid, shape (Nx, Ny, Nz, 3)
+            inv: the inverse permeability of the grid, shape (Nx, Ny, Nz, 3), or
+                the lookup table of the materials, shape (M, 3)
+            cdt_dx, cdt_dy, cdt_dz: c*dt/d of every cell edge along x, y and z,
+                with lengths Nx-1, Ny-1 and Nz-1.
+            ids: the material ID of every grid point, shape (Nx, Ny, Nz), when
+                inv is a lookup table
+        """
+        Nx, Ny, Nz = E.shape[0], E.shape[1], E.shape[2]
+        ntx = (Nx + BLOCK - 1) // BLOCK
+        nty = (Ny + BLOCK - 1) // BLOCK
+        for t in prange(ntx * nty):
+            i0 = (t // nty) * BLOCK
+            j0 = (t % nty) * BLOCK
+            for i in range(i0, min(i0 + BLOCK, Nx)):
+                for j in range(j0, min(j0 + BLOCK, Ny)):
+                    for k in range(Nz):
+                        inv0 = _coefficient(inv, ids, i, j, k, 0)
+                        inv1 = _coefficient(inv, ids, i, j, k, 1)
+                        inv2 = _coefficient(inv, ids, i, j, k, 2)
+                        if j < Ny - 1:
+                            H[i, j, k, 0] -= inv0 * cdt_dy[j] * (E[i, j + 1, k, 2] - E[i, j, k, 2])
+                            H[i, j, k, 2] += inv2 * cdt_dy[j] * (E[i, j + 1, k, 0] - E[i, j, k, 0])
+                        if k < Nz - 1:
+                            H[i, j, k, 0] += inv0 * cdt_dz[k] * (E[i, j, k + 1, 1] - E[i, j, k, 1])
+                            H[i, j, k, 1] -= inv1 * cdt_dz[k] * (E[i, j, k + 1, 0] - E[i, j, k, 0])
+                        if i < Nx - 1:
+                            H[i, j, k, 1] += inv1 * cdt_dx[i] * (E[i + 1, j, k, 2] - E[i, j, k, 2])
+                            H[i, j, k, 2] -= inv2 * cdt_dx[i] * (E[i + 1, j, k, 1] - E[i, j, k, 1])
+
+    @njit(parallel=True)
+    def pml_update_E(E, H, inv, psi, b, c, axis, ox, oy, oz, idd, coef, ids=None):
+        """the fused psi recurrence and field correction of PML.update_phi_E and
+        PML.update_E for a PML slab starting at (ox, oy, oz) with normal axis `axis`
+
+        Args:
+            psi: the auxiliary field of the PML, shape (nx, ny, nz, 2)
+            b, c: the recurrence coefficients along the normal axis
+            idd: 1 / spacing of the differences along the normal axis, per PML cell
+            coef: c*dt
+            ids: see update_E
+        """
+        nx, ny, nz = psi.shape[0], psi.shape[1], psi.shape[2]
+        p = (axis + 1) % 3
+        q = (axis + 2) % 3
+        di, dj, dk = int(axis == 0), int(axis == 1), int(axis == 2)
+        for i in prange(nx):
+            I = ox + i
+            for j in range(ny):
+                J = oy + j
+                for k in range(nz):
+                    K = oz + k
+                    n = i * di + j * dj + k * dk
+                    psi[i, j, k, 0] *= b[n]
+                    psi[i, j, k, 1] *= b[n]
+                    if n > 0:
+                        psi[i, j, k, 0] += (H[I, J, K, q] - H[I - di, J - dj, K - dk, q]) * c[n] * idd[n]
+                        psi[i, j, k, 1] += (H[I, J, K, p] - H[I - di, J - dj, K - dk, p]) * c[n] * idd[n]
+                    E[I, J, K, p] -= coef * _coefficient(inv, ids, I, J, K, p) * psi[i, j, k, 0]
+                    E[I, J, K, q] += coef * _coefficient(inv, ids, I, J, K, q) * psi[i, j, k, 1]
+
+    @njit(parallel=True)
+    def pml_update_H(E, H, inv, psi, b, c, axis, ox, oy, oz, idd, coef, ids=None):
+        """the fused psi recurrence and field correction of PML.update_phi_H and
+        PML.update_H for a PML slab starting at (ox, oy, oz) with normal axis `axis`
+
+        Args:
+            psi: the auxiliary field of the PML, shape (nx, ny, nz, 2)
+            b, c: the recurrence coefficients along the normal axis
+            idd: 1 / spacing of the differences along the normal axis, per PML cell
+            coef: c*dt
+            ids: see update_E
+        """
+        nx, ny, nz = psi.shape[0], psi.shape[1], psi.shape[2]
+        p = (axis + 1) % 3
+        q = (axis + 2) % 3
+        di, dj, dk = int(axis == 0), int(axis == 1), int(axis == 2)
+        last = (nx, ny, nz)[axis] - 1
+        for i in prange(nx):
+            I = ox + i
+            for j in range(ny):
+                J = oy + j
+                for k in range(nz):
+                    K = oz + k
+                    n = i * di + j * dj + k * dk
+                    psi[i, j, k, 0] *= b[n]
+                    psi[i, j, k, 1] *= b[n]
+                    if n < last:
+                        psi[i, j, k, 0] += (E[I + di, J + dj, K + dk, q] - E[I, J, K, q]) * c[n] * idd[n]
+                        psi[i, j, k, 1] += (E[I + di, J + dj, K + dk, p] - E[I, J, K, p]) * c[n] * idd[n]
+                    H[I, J, K, p] += coef * _coefficient(inv, ids, I, J, K, p) * psi[i, j, k, 0]
+                    H[I, J, K, q] -= coef * _coefficient(inv, ids, I, J, K, q) * psi[i, j, k, 1]
+
+    @njit
+    def inject(F, xs, ys, zs, comp, profile, amplitude):
+        """F[xs[n], ys[n], zs[n], comp] += amplitude * profile[n] (source injection)"""
+        for n in range(xs.shape[0]):
+            F[xs[n], ys[n], zs[n], comp] += amplitude * profile[n]
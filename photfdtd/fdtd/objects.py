@@ -105,11 +105,27 @@ class Object:
         # the grid will be overridden.
         # It should be noticed that the "grid.priority" is not same with the "priority", which could be confused,
         # self.priority indicates the object's priority matrix, while self.grid.priority indicating the grid's priority matrix
-        self.grid.inverse_permittivity[self.x, self.y, self.z][
-            self.priority > self.grid.priority[self.x, self.y, self.z]] = \
-            self.inverse_permittivity[self.priority > self.grid.priority[self.x, self.y, self.z]]
+        self._write_region((self.x, self.y, self.z))
+
+    def _write_region(self, loc: tuple):
+        """write the object into a part of its region of the grid, comparing
+        its priority matrix with the one of the grid
+
+        Where the priority of the object is higher, its inverse permittivity
+        overrides the grid's; the priority of the grid then records where the
+        object has been written. The geometry edits of photfdtd.Grid
+        (del_object, move_object, replace_object) replay the objects on the
+        part of the grid they change with it.
+
+        Args:
+            loc: (x, y, z) slices of the grid within the region of the object
+        """
+        local = tuple(slice(s.start - o.start, s.stop - o.start) for s, o in zip(loc, (self.x, self.y, self.z)))
+        priority = self.priority[local] if bd.is_array(self.priority) else self.priority
+        mask = priority > self.grid.priority[loc]
+        self.grid.inverse_permittivity[loc][mask] = self.inverse_permittivity[local][mask]
         # Update the "grid.priority" matrix.
-        self.grid.priority[self.x, self.y, self.z] = self.priority > self.grid.priority[self.x, self.y, self.z]
+        self.grid.priority[loc] = mask
 
     def _handle_slice(self, s: ListOrSlice, max_index: int = None) -> slice:
         if isinstance(s, list):
@@ -4,26 +4,116 @@ Available sources:
 
 - PointSource
 - LineSource
+- PlaneSource
+- ModeSource
+- TFSFSource
 
 """
 ## Imports
 
 # other
-from math import pi, sin
+from math import pi
 
 # typing
 from .typing_ import Tuple, Number, ListOrSlice, List
 from numpy import ndarray
+import numpy
 
 # relatvie
 from .backend import backend as bd
+from . import constants as const
 from .waveforms import *
+from . import jit
 from .detectors import CurrentDetector
 from .conversions import *
 
 
+## Waveform [base class]
+class _Waveform:
+    """ The time dependence of a PointSource, LineSource, PlaneSource or ModeSource [base class]
+
+    The waveform is the factor the profile of the source is multiplied with at a
+    time step. Grid.run precomputes it for all time steps of the run (see
+    _precompute), such that the sources and Grid.source_data only read it.
+    """
+
+    # whether the injection into E is a fixed profile times the waveform (see _injection)
+    _fused = True
+    # time steps the incident magnetic field of a total-field/scattered-field source
+    # is ahead of the waveform, None for the other sources
+    _delay = None
+
+    def _hanning_dt(self) -> float:
+        """ time argument of the Hanning window per time step """
+        return self.pulse_length
+
+    def _compute_waveform(self, steps) -> ndarray:
+        q = numpy.asarray(steps, dtype=numpy.float64)
+        if self.pulse_type == "hanning":
+            dt = self._hanning_dt()
+            t1 = int(2 * pi / (self.frequency * dt / self.cycle))
+            return numpy.where(q < t1, hanning(self.frequency, q * dt, self.cycle), 0.0)
+        if self.pulse_type == "gaussian":
+            return pulse_oscillation(frequency=self.frequency, t=q * self.grid.time_step,
+                                     pulselength=self.pulse_length, offset=self.offset)
+        return numpy.sin(2 * pi * q / self.period + self.phase_shift)
+
+    def _precompute(self, steps: range):
+        """ compute the waveform for the time steps of a run """
+        self._series_start = steps.start
+        q = numpy.arange(steps.start, steps.stop)
+        self._series = self._compute_waveform(q)
+        if self._delay is not None:
+            self._delayed_series = self._compute_waveform(q + self._delay)
+
+    def signal(self, steps) -> ndarray:
+        """ the factor of the profile of the source at some time steps
+
+        Args:
+            steps: the time steps (array of ints)
+
+        Returns:
+            the waveform at these time steps, read from the precomputed series if
+            they are part of it
+        """
+        steps = numpy.asarray(steps)
+        series = getattr(self, "_series", None)
+        if series is not None and steps.size:
+            i = steps - self._series_start
+            if i.min() >= 0 and i.max() < len(series):
+                return series[i]
+        return self._compute_waveform(steps)
+
+    def _delayed_signal(self, q: int) -> float:
+        """ the waveform at the time step q + _delay """
+        series = getattr(self, "_delayed_series", None)
+        if series is not None and 0 <= q - self._series_start < len(series):
+            return series[q - self._series_start]
+        return self._compute_waveform([q + self._delay])[0]
+
+    def _injection_series(self) -> ndarray:
+        """ the precomputed factor of the injected profile (see _injection) """
+        return self._series
+
+    def _injection(self):
+        """ the injection of the source into the electric field
+
+        Returns:
+            (indices into the flattened E, profile at these indices, hard). A hard
+            source sets the field, a soft source adds to it.
+        """
+        raise NotImplementedError
+
+    def _injection_H(self):
+        """ the injection of the source into the magnetic field, like _injection
+        with the waveform itself (not _injection_series) as factor, or None for a
+        source without magnetic field
+        """
+        return None
+
+
 ## PointSource class
-class PointSource:
+class PointSource(_Waveform):
     """A source placed at a single point (grid cell) in the grid"""
 
     # TODO: 为点光源和面光源加上gaussian waveform
@@ -106,29 +196,19 @@ class PointSource:
             raise ValueError("a point source should be placed on a single grid cell.")
         self.x, self.y, self.z = grid._handle_tuple((x, y, z))
         self.period = grid._handle_time(self.period)
+        # str.index(a)方法给出str中a的所在位置
+        self._Epol = 'xyz'.index(self.polarization)
+
+    def _hanning_dt(self) -> float:
+        return self.hanning_dt
+
+    def _injection(self):
+        index = numpy.ravel_multi_index((self.x, self.y, self.z, self._Epol), tuple(self.grid.E.shape))
+        return numpy.array([index]), numpy.array([self.sim_amplitude]), True
 
     def update_E(self):
         """Add the source to the electric field"""
-        q = self.grid.time_steps_passed
-        # if pulse = hanning
-        if self.pulse_type == "hanning":
-            t1 = int(2 * pi / (self.frequency * self.hanning_dt / self.cycle))
-            if q < t1:
-                src = self.sim_amplitude * hanning(
-                    self.frequency, q * self.hanning_dt, self.cycle
-                )
-            else:
-                # src = - self.grid.E[self.x, self.y, self.z, 2]
-                src = 0
-        elif self.pulse_type == "gaussian":
-            src = self.sim_amplitude * pulse_oscillation(frequency=self.frequency, t=q * self.grid.time_step,
-                                    pulselength=self.pulse_length, offset=self.offset)
-
-        # if not pulse
-        else:
-            src = self.sim_amplitude * sin(2 * pi * q / self.period + self.phase_shift)
-        self._Epol = 'xyz'.index(self.polarization)
-        # str.index(a)方法给出str中a的所在位置
+        src = self.sim_amplitude * self.signal([self.grid.time_steps_passed])[0]
         # self.grid.E[self.x, self.y, self.z, self._Epol] += src
         # 变成硬源试试
         self.grid.E[self.x, self.y, self.z, self._Epol] = src
@@ -159,7 +239,7 @@ class PointSource:
 
 
 ## LineSource class
-class LineSource:
+class LineSource(_Waveform):
     """A source along a line in the FDTD grid"""
 
     def __init__(
@@ -236,6 +316,8 @@ class LineSource:
                 )
 
         self.x, self.y, self.z = self._handle_slices(x, y, z)
+        # index arrays for the jit engine
+        self._xs, self._ys, self._zs = (numpy.array(v, dtype=numpy.int64) for v in (self.x, self.y, self.z))
 
         self.period = grid._handle_time(self.period)
 
@@ -253,6 +335,7 @@ class LineSource:
             self.profile = bd.exp(-(vect ** 2) / (2 * (0.5 * vect.max()) ** 2))  # 这是一个高斯分布
         self.profile /= self.profile.max()  # 在计算高斯分布之后，代码将其归一化，确保分布的最大值为1。
         self.profile *= self.sim_amplitude
+        self._Epol = 'xyz'.index(self.polarization)
 
     def _handle_slices(
             self, x: ListOrSlice, y: ListOrSlice, z: ListOrSlice
@@ -330,35 +413,20 @@ class LineSource:
         else:
             return 25e12
 
+    def _injection(self):
+        index = numpy.ravel_multi_index((self._xs, self._ys, self._zs, self._Epol), tuple(self.grid.E.shape))
+        return index, bd.numpy(self.profile), False
+
     def update_E(self):
         """Add the source to the electric field"""
-        q = self.grid.time_steps_passed
-        # if pulse = "hanning"
-        if self.pulse_type == "hanning":
-            t1 = int(2 * pi / (self.frequency * self.pulse_length / self.cycle))
-            if q < t1:
-                vect = self.profile * hanning(
-                    self.frequency, q * self.pulse_length, self.cycle
-                )
-            else:
-                # src = - self.grid.E[self.x, self.y, self.z, 2]
-                vect = self.profile * 0
-        elif self.pulse_type == "gaussian":
-            vect = self.profile * pulse_oscillation(frequency=self.frequency, t=q * self.grid.time_step,
-                                                    pulselength=self.pulse_length, offset=self.offset)
-        # if not pulse_type
-        else:
-            vect = self.profile * sin(2 * pi * q / self.period + self.phase_shift)
-            # 要绘制光源图像只需绘制vect
-        # do not use list indexing here, as this is much slower especially for torch backend
-        # DISABLED: self.grid.E[self.x, self.y, self.z, 2] = vect
-        self._Epol = 'xyz'.index(self.polarization)
+        # 要绘制光源图像只需绘制vect
+        vect = self.profile * self.signal([self.grid.time_steps_passed])[0]
+        if self.grid.engine == "jit":
+            jit.inject(self.grid.E, self._xs, self._ys, self._zs, self._Epol, vect, 1.0)
+            return
         for x, y, z, value in zip(self.x, self.y, self.z, vect):
-            # str.index(a)方法给出str中a的所在位置
             # self.grid.E[x, y, z, 0] += 3.7494e-33 * value
             self.grid.E[x, y, z, self._Epol] += value
-            # self.grid.source_profile[self._Epol] += value
-            # self.grid.E[x, y, z, 2] += value
 
     def update_H(self):
         """Add the source to the magnetic field"""
@@ -380,7 +448,7 @@ class LineSource:
 
 
 ## PlaneSource class
-class PlaneSource:
+class PlaneSource(_Waveform):
     """A source along a plane in the FDTD grid"""
 
     def __init__(
@@ -567,42 +635,28 @@ class PlaneSource:
 
         return x, y, z
 
-    # def update_E(self):
-    #     """Add the source to the electric field"""
-    #     q = self.grid.time_steps_passed
-    #     vect = self.profile * sin(2 * pi * q / self.period + self.phase_shift)
-    #     self.grid.E[self.x, self.y, self.z, self._Epol] = vect
+    def _injection(self):
+        return self._plane_index(self._Epol), bd.numpy(self.profile).ravel(), True
+
+    def _injection_H(self):
+        return self._plane_index(self._Hpol), bd.numpy(self.profile).ravel(), True
+
+    def _plane_index(self, comp: int) -> ndarray:
+        """indices of a component on the plane in the flattened field"""
+        x, y, z = numpy.meshgrid(numpy.arange(self.x.start, self.x.stop), numpy.arange(self.y.start, self.y.stop),
+                                 numpy.arange(self.z.start, self.z.stop), indexing="ij")
+        return numpy.ravel_multi_index((x.ravel(), y.ravel(), z.ravel(), comp), tuple(self.grid.E.shape))
 
     def update_E(self):
         """Add the source to the electric field"""
-        q = self.grid.time_steps_passed
-        # if pulse is "hanning"
-        if self.pulse_type == "hanning":
-            t1 = int(2 * pi / (self.frequency * self.pulse_length / self.cycle))
-            if q < t1:
-                vect = self.profile * hanning(
-                    self.frequency, q * self.pulse_length, self.cycle
-                )
-            else:
-                # src = - self.grid.E[self.x, self.y, self.z, 2]
-                vect = self.profile * 0
-        elif self.pulse_type == "gaussian":
-            vect = self.profile * pulse_oscillation(frequency=self.frequency, t=q * self.grid.time_step,
-                                                    pulselength=self.pulse_length, offset=self.offset)
-        # if not pulse_type
-        else:
-            vect = self.profile * sin(2 * pi * q / self.period + self.phase_shift)
-            # 要绘制光源图像只需绘制vect
-        # do not use list indexing here, as this is much slower especially for torch backend
-        # DISABLED: self.grid.E[self.x, self.y, self.z, 2] = vect
-        self._Epol = 'xyz'.index(self.polarization)
+        # 要绘制光源图像只需绘制vect
+        vect = self.profile * self.signal([self.grid.time_steps_passed])[0]
         # 与点光源和线光源（软源 soft source）不同，这应该是一个硬源 （hard source）
         self.grid.E[self.x, self.y, self.z, self._Epol] = vect
 
     def update_H(self):
         """Add the source to the magnetic field"""
-        q = self.grid.time_steps_passed
-        vect = self.profile * sin(2 * pi * q / self.period + self.phase_shift)
+        vect = self.profile * self.signal([self.grid.time_steps_passed])[0]
         self.grid.H[self.x, self.y, self.z, self._Hpol] = vect
 
     def __repr__(self):
@@ -628,6 +682,644 @@ class PlaneSource:
             return 25e12
 
 
+## ModeSource class
+# key of the components x, y and z in the mode dicts of Solve.calculate_mode, which
+# labels the components of the modes of planes normal to x and y cyclically shifted
+_MODE_KEYS = {"x": "yzx", "y": "zxy", "z": "xyz"}
+
+
+class ModeSource(_Waveform):
+    """A guided mode launched in a single direction from a plane in the FDTD grid
+
+    The source is a total-field/scattered-field boundary: the transverse fields of
+    the mode on the plane act as electric and magnetic current sheets, which cancel
+    each other on the upstream side. Only the mode is launched, without a backward
+    wave and without the radiation of a Gaussian or flat profile.
+    """
+
+    def __init__(
+            self,
+            mode: dict,
+            mode_index: int = 0,
+            direction: str = "+",
+            period: Number = 15,
+            amplitude: float = 1.0,
+            phase_shift: float = 0.0,
+            name: str = None,
+            pulse_type: str = None,
+            cycle: int = 5,
+            pulse_length: float = 39e-15,
+            offset: float = 112e-15,
+            real_EH_unit: bool = True,
+    ):
+        """Create a ModeSource.
+
+        Args:
+            mode: the modes of the cross-section of the source plane, as returned by
+                Solve.calculate_mode (or Solve.read_mode). The axis of the modes is the
+                propagation axis.
+            mode_index: index of the mode to launch
+            direction: "+" or "-", launch the mode towards increasing or decreasing
+                coordinates along the axis
+            period: The period of the source. The period can be specified
+                as integer [timesteps] or as float [seconds]
+            amplitude: The peak transverse electric field of the mode
+            phase_shift: The phase offset of the source.
+            pulse_type: "gaussian"代表高斯脉冲 "hanning"代表汉宁脉冲 "none"或者其他任何输入代表不使用脉冲
+            cycle: cycles for Hanning window pulse.
+            pulse_length: 脉宽(对于高斯脉冲：半高全宽*sqrt(2))单位s
+            offset: 脉冲中心时间 单位s
+            real_EH_unit: use real unit for E and H?
+        """
+        if direction not in ("+", "-"):
+            raise ValueError(f"direction should be '+' or '-', not {direction!r}")
+        self.grid = None
+        self.mode = mode
+        self.mode_index = mode_index
+        self.axis = mode["axis"]
+        self.direction = direction
+        self.effective_index = float(numpy.real(numpy.ravel(mode["effective_index"])[mode_index]))
+        self.period = period
+        self.amplitude = amplitude
+        if real_EH_unit:
+            self.sim_amplitude = worldE_to_simE(amplitude)
+        else:
+            self.sim_amplitude = amplitude
+        self.phase_shift = phase_shift
+        self.name = name
+        if pulse_type != "gaussian" and pulse_type != "hanning":
+            self.pulse_type = None
+        else:
+            self.pulse_type = pulse_type
+        self.cycle = cycle
+        self.frequency = 1.0 / period
+        self.pulse_length = pulse_length
+        self.offset = offset
+
+    def _register_grid(
+            self, grid, x: ListOrSlice, y: ListOrSlice, z: ListOrSlice
+    ):
+        """Register a grid for the source.
+
+        Args:
+            grid: fdtd.Grid, the grid to place the source into.
+            x: The x-location of the source in the grid
+            y: The y-location of the source in the grid
+            z: The z-location of the source in the grid
+
+        Note:
+            The source is placed on a single index along its axis. Along the other
+            axes it spans the cross-section the modes were calculated on, or a
+            part of it of the shape of the mode profiles.
+        """
+        if grid.spatial_order != 2:
+            # the correction currents are derived for the second order differences
+            raise NotImplementedError("A ModeSource only supports grids with spatial_order=2")
+        self.grid = grid
+        self.grid.sources.append(self)
+        if self.name is not None:
+            if not hasattr(grid, self.name):
+                setattr(grid, self.name, self)
+            else:
+                raise ValueError(
+                    f"The grid already has an attribute with name {self.name}"
+                )
+        self.period = grid._handle_time(self.period)
+
+        n = "xyz".index(self.axis)
+        shape = tuple(grid.E.shape[:3])
+        ranges = []
+        for i, key in enumerate((x, y, z)):
+            if isinstance(key, slice):
+                ranges.append(range(*key.indices(shape[i])))
+            elif len(key) == 1:
+                ranges.append(range(key[0], key[0] + 1))
+            else:
+                raise ValueError("a ModeSource should be placed on a plane of the grid")
+        if len(ranges[n]) != 1:
+            raise ValueError(f"a ModeSource along {self.axis} should be placed on a single index along {self.axis}")
+        p = ranges[n][0]
+        if not 1 <= p <= shape[n] - 2:
+            raise ValueError(f"a ModeSource along {self.axis} can not be placed on the first or last cells")
+        self.x, self.y, self.z = (slice(r.start, r.stop) for r in ranges)
+
+        # transverse fields of the mode on the plane, in the components of the grid
+        keys = _MODE_KEYS[self.axis]
+        section = tuple(len(r) for i, r in enumerate(ranges) if i != n)
+        full = tuple(N for i, N in enumerate(shape) if i != n)
+        cut = tuple(slice(r.start, r.stop) for i, r in enumerate(ranges) if i != n)
+        E, H = numpy.zeros((3,) + section, complex), numpy.zeros((3,) + section, complex)
+        for c in range(3):
+            if c == n:
+                continue
+            for field, F in (("E", E), ("H", H)):
+                profile = numpy.asarray(self.mode[field + keys[c]][self.mode_index])
+                if profile.shape == full:
+                    profile = profile[cut]
+                elif profile.shape != section:
+                    raise ValueError(
+                        f"The modes have the shape {profile.shape}, but the source plane is {section} "
+                        f"of a cross-section {full}"
+                    )
+                F[c] = profile
+        # real fields with a transverse electric field of peak 1
+        peak = E.ravel()[numpy.argmax(numpy.abs(E))]
+        E, H = (E / peak).real, (H / peak).real
+        # the mode should carry power along the direction of the source
+        u, v = (n + 1) % 3, (n + 2) % 3
+        sign = 1 if self.direction == "+" else -1
+        if sign * numpy.sum(E[u] * H[v] - E[v] * H[u]) < 0:
+            H = -H
+        # a 2D grid decouples into the field set with E along its flat axis and the
+        # one with H along it: only keep the set of the dominant component
+        pol = int(numpy.argmax([numpy.abs(E[c]).max() for c in range(3)]))
+        for a in range(3):
+            if a == n or shape[a] != 1:
+                continue
+            for c in range(3):
+                if (c == a) != (pol == a):
+                    E[c] = 0.0
+                if (c != a) != (pol == a):
+                    H[c] = 0.0
+        self.polarization = "xyz"[pol]
+        self._Epol = pol
+        self._Hpol = int(numpy.argmax([numpy.abs(H[c]).max() for c in range(3)]))
+        self.profile = self.sim_amplitude * E[pol].reshape(tuple(len(r) for r in ranges))
+
+        # the plane p is the first (last) plane of the total field. The magnetic field
+        # half a cell upstream is in the scattered field region, the curl updates
+        # across the plane are corrected with the incident fields
+        spacings = bd.numpy((grid.x_spacings, grid.y_spacings, grid.z_spacings)[n])
+        h = p - 1 if sign > 0 else p
+        dH = float(spacings[h])
+        dE = float(spacings[p - 1] + spacings[p]) / 2
+        cdt = const.c * grid.time_step
+        # the incident H is half a time step before E and half a cell upstream
+        self._delay = -0.5 + 0.5 * dH * self.effective_index / cdt
+        # E_u += c*dt/dE * inv_eps * H_v, E_v -= ... * H_u, H_u -= c*dt/dH * inv_mu * E_v, H_v += ... * E_u
+        self._ranges = ranges
+        self._E_plane = (p, ((u, sign, H[v]), (v, -sign, H[u])), cdt / dE)
+        self._H_plane = (h, ((u, -sign, E[v]), (v, sign, E[u])), cdt / dH)
+        self._build_sheets()
+
+    def _build_sheets(self):
+        """the current sheets for the materials the grid holds now"""
+        # only read at the sheets, such that compact materials stay compact
+        grid = self.grid
+        self._E_index, self._E_profile = self._sheet(self._ranges, *self._E_plane, grid._inverse_permittivity_at)
+        self._H_index, self._H_profile = self._sheet(self._ranges, *self._H_plane, grid._inverse_permeability_at)
+        # the sheets as backend arrays for update_E and update_H
+        self._E_sheet = (bd.array(self._E_index), bd.array(self._E_profile))
+        self._H_sheet = (bd.array(self._H_index), bd.array(self._H_profile))
+
+    def _precompute(self, steps: range):
+        # objects may have been added, moved or removed since the source was registered
+        self._build_sheets()
+        super()._precompute(steps)
+
+    def _sheet(self, ranges, index, terms, coefficient, inverse_material):
+        """flat indices and profile of a current sheet on a plane, inverse_material
+        looks up the material at grid points (see Grid._inverse_permittivity_at)"""
+        n = "xyz".index(self.axis)
+        ranges = list(ranges)
+        ranges[n] = range(index, index + 1)
+        cells = numpy.meshgrid(*ranges, indexing="ij")
+        shape = tuple(self.grid.E.shape)
+        indices, profiles = [], []
+        for c, sign, field in terms:
+            profile = (self.sim_amplitude * sign * coefficient * field.ravel()
+                       * bd.numpy(inverse_material(tuple(cells) + (c,))).ravel())
+            nonzero = profile != 0
+            indices.append(numpy.ravel_multi_index(tuple(i.ravel()[nonzero] for i in cells) + (c,), shape))
+            profiles.append(profile[nonzero])
+        return numpy.concatenate(indices), numpy.concatenate(profiles)
+
+    def _injection_series(self) -> ndarray:
+        return self._delayed_series
+
+    def _injection(self):
+        return self._E_index, self._E_profile, False
+
+    def _injection_H(self):
+        return self._H_index, self._H_profile, False
+
+    def update_E(self):
+        """Add the source to the electric field"""
+        index, profile = self._E_sheet
+        E = self.grid.E.reshape(-1)
+        E[index] += profile * float(self._delayed_signal(self.grid.time_steps_passed))
+
+    def update_H(self):
+        """Add the source to the magnetic field"""
+        index, profile = self._H_sheet
+        H = self.grid.H.reshape(-1)
+        H[index] += profile * float(self.signal([self.grid.time_steps_passed])[0])
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(mode_index={self.mode_index}, direction={self.direction!r}, "
+            f"period={self.period}, amplitude={self.amplitude}, phase_shift={self.phase_shift}, "
+            f"name={repr(self.name)})"
+        )
+
+    def __str__(self):
+        s = "    " + repr(self) + "\n"
+        x = f"[{self.x.start}, ... , {self.x.stop}]"
+        y = f"[{self.y.start}, ... , {self.y.stop}]"
+        z = f"[{self.z.start}, ... , {self.z.stop}]"
+        s += f"        @ x={x}, y={y}, z={z}\n"
+        return s
+
+    @property
+    def bandwidth(self):
+        if self.pulse_type is not None:
+            return bandwidth(self.pulse_length)
+        else:
+            return 25e12
+
+
+## TFSFSource class
+class TFSFSource(_Waveform):
+    """A plane wave in a box of the FDTD grid (total-field/scattered-field)
+
+    Inside the box the grid holds the total field, outside of it only the field
+    scattered by the objects in the box. The incident plane wave is propagated on
+    an auxiliary 1D grid along the axis, with the spacings, the time step and the
+    permittivity profile of the grid along the edge of the box, and it is added to
+    the curl updates across the faces of the box. Faces on the edges of the grid
+    are left out: a box spanning the grid along an axis (e.g. between periodic
+    boundaries) has no faces normal to it.
+    """
+
+    _fused = False
+    # cells and peak loss (sigma * dt / 2 epsilon) of the absorbing layers at both ends
+    # of the auxiliary grid
+    _absorber = 50
+    _absorber_loss = 0.5
+
+    def __init__(
+            self,
+            period: Number = 15,
+            amplitude: float = 1.0,
+            phase_shift: float = 0.0,
+            name: str = None,
+            polarization: str = "x",
+            axis: str = "z",
+            direction: str = "+",
+            pulse_type: str = None,
+            cycle: int = 5,
+            pulse_length: float = 39e-15,
+            offset: float = 112e-15,
+            real_EH_unit: bool = True,
+    ):
+        """Create a TFSFSource.
+
+        Args:
+            period: The period of the source. The period can be specified
+                as integer [timesteps] or as float [seconds]
+            amplitude: The electric field amplitude of the plane wave
+            phase_shift: The phase offset of the source.
+            polarization: Axis of E-field polarization ('x','y',or 'z')电场偏振方向
+            axis: 传播方向 propagation axis ('x','y',or 'z')
+            direction: "+" or "-", propagation towards increasing or decreasing
+                coordinates along the axis
+            pulse_type: "gaussian"代表高斯脉冲 "hanning"代表汉宁脉冲 "none"或者其他任何输入代表不使用脉冲
+            cycle: cycles for Hanning window pulse.
+            pulse_length: 脉宽(对于高斯脉冲：半高全宽*sqrt(2))单位s
+            offset: 脉冲中心时间，在网格边缘处 单位s pulse center at the edge of the grid
+            real_EH_unit: use real unit for E and H?
+        """
+        if direction not in ("+", "-"):
+            raise ValueError(f"direction should be '+' or '-', not {direction!r}")
+        if polarization == axis:
+            raise ValueError("The polarization of a TFSFSource should be normal to its axis")
+        self.grid = None
+        self.period = period
+        self.amplitude = amplitude
+        if real_EH_unit:
+            self.sim_amplitude = worldE_to_simE(amplitude)
+        else:
+            self.sim_amplitude = amplitude
+        self.phase_shift = phase_shift
+        self.name = name
+        self.polarization = polarization
+        self.axis = axis
+        self.direction = direction
+        if pulse_type != "gaussian" and pulse_type != "hanning":
+            self.pulse_type = None
+        else:
+            self.pulse_type = pulse_type
+        self.cycle = cycle
+        self.frequency = 1.0 / period
+        self.pulse_length = pulse_length
+        self.offset = offset
+
+    def _register_grid(
+            self, grid, x: ListOrSlice, y: ListOrSlice, z: ListOrSlice
+    ):
+        """Register a grid for the source.
+
+        Args:
+            grid: fdtd.Grid, the grid to place the source into.
+            x: The x-location of the box in the grid
+            y: The y-location of the box in the grid
+            z: The z-location of the box in the grid
+        """
+        if grid.spatial_order != 2:
+            # the corrections on the faces assume the second order differences
+            raise NotImplementedError("A TFSFSource only supports grids with spatial_order=2")
+        self.grid = grid
+        self.grid.sources.append(self)
+        if self.name is not None:
+            if not hasattr(grid, self.name):
+                setattr(grid, self.name, self)
+            else:
+                raise ValueError(
+                    f"The grid already has an attribute with name {self.name}"
+                )
+        self.period = grid._handle_time(self.period)
+
+        shape = tuple(grid.E.shape[:3])
+        lo, hi = [], []
+        for i, key in enumerate((x, y, z)):
+            if not isinstance(key, slice):
+                key = slice(key[0], key[-1] + 1)
+            start, stop, _ = key.indices(shape[i])
+            if stop <= start:
+                raise ValueError("Given location for TFSFSource results in slices of length 0!")
+            lo.append(start)
+            hi.append(stop - 1)
+        self.x, self.y, self.z = (slice(l, h + 1) for l, h in zip(lo, hi))
+        n = "xyz".index(self.axis)
+        pol = "xyz".index(self.polarization)
+        h = 3 - n - pol
+        sign = 1 if self.direction == "+" else -1
+        if (sign > 0 and lo[n] == 0) or (sign < 0 and hi[n] == shape[n] - 1):
+            raise ValueError(
+                f"The box of a TFSFSource towards {self.direction}{self.axis} should not start on the edge of the grid"
+            )
+        self._Epol, self._Hpol = pol, h
+        # the magnetic field of the incident wave is H_h = orientation * G, see _update_incident_E
+        orientation = -1 if pol == (n + 1) % 3 else 1
+        self._lo, self._hi, self._orientation = lo, hi, orientation
+
+        # auxiliary grid: the axis of the grid with absorbing layers of A cells at both ends
+        A = self._absorber
+        L = shape[n] + 2 * A
+        self._E1, self._G = bd.zeros(L), bd.zeros(L)
+        # the incident wave enters the auxiliary grid through a one-sided injection at
+        # the edge of the grid, the incident H half a cell upstream and half a step earlier
+        self._k = A if sign > 0 else A + shape[n] - 1
+        self._h = self._k - 1 if sign > 0 else self._k
+        self._build_faces()
+
+    def _build_faces(self):
+        """the coefficients of the auxiliary grid and the corrections on the faces of
+        the box for the materials the grid holds now"""
+        grid, lo, hi, orientation = self.grid, self._lo, self._hi, self._orientation
+        shape = tuple(grid.E.shape[:3])
+        n = "xyz".index(self.axis)
+        pol, h = self._Epol, self._Hpol
+        A = self._absorber
+        pad = lambda a: numpy.concatenate([numpy.full(A, a[0]), a, numpy.full(A, a[-1])])
+        spacings = [numpy.asarray(bd.numpy(s), dtype=float)
+                    for s in (grid.x_spacings, grid.y_spacings, grid.z_spacings)]
+        # only read along the edge and on the faces, such that compact materials stay compact
+        inv_eps, inv_mu = grid._inverse_permittivity_at, grid._inverse_permeability_at
+        line = list(lo)
+        line[n] = slice(None)
+        d = pad(spacings[n])
+        L = len(d)
+        dE = numpy.concatenate([d[:1], (d[:-1] + d[1:]) / 2])
+        loss = lambda pos: self._absorber_loss * (numpy.clip(numpy.maximum(A - pos, pos - (L - 1 - A)), 0, None) / A) ** 3
+        cdt = const.c * self.grid.time_step
+        aE, aH = loss(numpy.arange(L)), loss(numpy.arange(L) + 0.5)
+        inv_eps1 = pad(bd.numpy(inv_eps(tuple(line) + (pol,))))
+        inv_mu1 = pad(bd.numpy(inv_mu(tuple(line) + (h,))))
+        self._caE, self._cbE = bd.array((1 - aE) / (1 + aE)), bd.array(cdt * inv_eps1 / dE / (1 + aE))
+        self._caH, self._cbH = bd.array((1 - aH) / (1 + aH)), bd.array(cdt * inv_mu1 / d / (1 + aH))
+        sign = 1 if self.direction == "+" else -1
+        index = (inv_eps1[self._k] * inv_mu1[self._k]) ** -0.5
+        self._delay = -0.5 + 0.5 * d[self._h] * index / cdt
+        self._inject_E = self.sim_amplitude * index * cdt * inv_eps1[self._k] / dE[self._k]
+        self._inject_H = -sign * self.sim_amplitude * cdt * inv_mu1[self._h] / d[self._h]
+
+        # corrections of the curl updates across the faces of the box
+        self._E_faces, self._H_faces = [], []
+        for a in range(3):
+            b, c = (a + 1) % 3, (a + 2) % 3
+            s = spacings[a]
+            for side in (1, -1):
+                if (side > 0 and lo[a] == 0) or (side < 0 and hi[a] == shape[a] - 1):
+                    continue
+                p = lo[a] if side > 0 else hi[a]
+                ph = p - 1 if side > 0 else p
+                dE_a, dH_a = (s[max(p - 1, 0)] + s[p]) / 2, s[ph]
+                # E_b += side*c*dt/dE*inv_eps*H_c, E_c -= side*c*dt/dE*inv_eps*H_b of the incident wave
+                for comp, other, sgn in ((b, c, side), (c, b, -side)):
+                    if other == h:
+                        self._E_faces.append(self._face(
+                            a, p, comp, sgn * orientation * cdt / dE_a, inv_eps, True, lo, hi, A + ph if a == n else None
+                        ))
+                # H_b -= side*c*dt/dH*inv_mu*E_c, H_c += side*c*dt/dH*inv_mu*E_b of the incident wave
+                for comp, other, sgn in ((b, c, -side), (c, b, side)):
+                    if other == pol:
+                        self._H_faces.append(self._face(
+                            a, ph, comp, sgn * cdt / dH_a, inv_mu, False, lo, hi, A + p if a == n else None
+                        ))
+
+    def _precompute(self, steps: range):
+        # objects may have been added, moved or removed since the source was registered;
+        # the delay depends on the material at the injection, so it is updated first
+        self._build_faces()
+        super()._precompute(steps)
+
+    def _face(self, a, index, comp, coefficient, inverse_material, electric, lo, hi, aux):
+        """flat indices, coefficients and auxiliary grid indices of a component on a face
+
+        The component spans the face up to the half-integer positions (along its
+        own axis for E, along the other axes for H) inside the box. Without a fixed
+        auxiliary index, the incident field is taken at the position along the axis.
+        inverse_material looks up the material at grid points (see
+        Grid._inverse_permittivity_at).
+        """
+        shape = tuple(self.grid.E.shape)
+        ranges = []
+        for d in range(3):
+            if d == a:
+                ranges.append(range(index, index + 1))
+            elif lo[d] == 0 and hi[d] == shape[d] - 1:
+                ranges.append(range(shape[d]))
+            elif (comp == d) == electric:
+                ranges.append(range(lo[d], hi[d]))
+            else:
+                ranges.append(range(lo[d], hi[d] + 1))
+        cells = tuple(i.ravel() for i in numpy.meshgrid(*ranges, indexing="ij"))
+        flat = numpy.ravel_multi_index(cells + (comp,), shape)
+        coefficients = coefficient * bd.numpy(inverse_material(cells + (comp,)))
+        if aux is None:
+            aux = cells["xyz".index(self.axis)] + self._absorber
+        else:
+            aux = numpy.full(len(flat), aux)
+        return bd.array(flat), bd.array(coefficients), bd.array(aux)
+
+    def update_E(self):
+        """Add the incident field to the electric field across the faces of the box"""
+        E = self.grid.E.reshape(-1)
+        for index, coefficient, aux in self._E_faces:
+            E[index] += coefficient * self._G[aux]
+        self._update_incident_E()
+
+    def update_H(self):
+        """Add the incident field to the magnetic field across the faces of the box"""
+        H = self.grid.H.reshape(-1)
+        for index, coefficient, aux in self._H_faces:
+            H[index] += coefficient * self._E1[aux]
+        self._update_incident_H()
+
+    def _update_incident_E(self):
+        """advance the electric field E1 (the polarization) of the auxiliary grid
+
+        With G = H_h / orientation, the 1D Maxwell equations along the axis read
+        dE1/dt = c inv_eps dG/dn and dG/dt = c inv_mu dE1/dn for both polarizations.
+        """
+        E1, G = self._E1, self._G
+        E1[1:] = self._caE[1:] * E1[1:] + self._cbE[1:] * (G[1:] - G[:-1])
+        E1[self._k] += self._inject_E * self._delayed_signal(self.grid.time_steps_passed)
+
+    def _update_incident_H(self):
+        """advance the magnetic field G of the auxiliary grid"""
+        E1, G = self._E1, self._G
+        G[:-1] = self._caH[:-1] * G[:-1] + self._cbH[:-1] * (E1[1:] - E1[:-1])
+        G[self._h] += self._inject_H * self.signal([self.grid.time_steps_passed])[0]
+
+    def _checkpoint_state(self) -> dict:
+        return {"E1": self._E1, "G": self._G}
+
+    def _restore_state(self, state: dict):
+        self._E1 = bd.array(state["E1"])
+        self._G = bd.array(state["G"])
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(period={self.period}, "
+            f"amplitude={self.amplitude}, phase_shift={self.phase_shift}, "
+            f"name={repr(self.name)}, polarization={repr(self.polarization)}, "
+            f"axis={repr(self.axis)}, direction={repr(self.direction)})"
+        )
+
+    def __str__(self):
+        s = "    " + repr(self) + "\n"
+        x = f"[{self.x.start}, ... , {self.x.stop}]"
+        y = f"[{self.y.start}, ... , {self.y.stop}]"
+        z = f"[{self.z.start}, ... , {self.z.stop}]"
+        s += f"        @ x={x}, y={y}, z={z}\n"
+        return s
+
+    @property
+    def bandwidth(self):
+        if self.pulse_type is not None:
+            return bandwidth(self.pulse_length)
+        else:
+            return 25e12
+
+
+## Injection of all sources
+class _SourceInjection:
+    """ The injection of the fields of all sources of a grid during a run
+
+    The waveforms of the PointSources, LineSources, PlaneSources, ModeSources and
+    TFSFSources are precomputed for all time steps of the run. At every time step
+    the soft sources are added to the grid with a single scatter into the
+    flattened E (and H), and the hard sources are set with another one. If sources
+    overlap, or the time step lies outside the run, every source is injected by
+    itself. TFSFSources, whose injection is not a fixed profile, and other
+    sources are always injected by themselves.
+    """
+
+    def __init__(self, grid, steps: range):
+        """Precompute the injection
+
+        Args:
+            grid: the grid of the sources
+            steps: the time steps of the run
+        """
+        self.grid = grid
+        self.start = steps.start
+        waveforms = [src for src in grid.sources if isinstance(src, _Waveform)]
+        for src in waveforms:
+            src._precompute(steps)
+        self.sources = [src for src in waveforms if src._fused]
+        self.sources_H = [src for src in self.sources if src._injection_H() is not None]
+        self.others = [src for src in grid.sources if not (isinstance(src, _Waveform) and src._fused)]
+        self.series, self.hard, self.soft, self.fused = self._fuse(
+            len(steps), [src._injection_series() for src in self.sources], [src._injection() for src in self.sources]
+        )
+        self.series_H, self.hard_H, self.soft_H, self.fused_H = self._fuse(
+            len(steps), [src._series for src in self.sources_H], [src._injection_H() for src in self.sources_H]
+        )
+
+    @staticmethod
+    def _fuse(length: int, series: list, injections: list) -> tuple:
+        """ the waveforms, the hard and the soft scatter of a set of sources
+
+        Returns:
+            (series, hard, soft, fused): series[q] holds the waveforms of all
+            sources at time step start + q, hard and soft are (indices, profiles,
+            source of each index) and fused tells whether no indices overlap
+        """
+        if series:
+            series = numpy.stack(series, axis=1)
+        else:
+            series = numpy.zeros((length, 0))
+        groups = {True: ([], [], []), False: ([], [], [])}
+        for i, (index, profile, hard) in enumerate(injections):
+            group = groups[hard]
+            group[0].append(numpy.asarray(index, dtype=numpy.int64).ravel())
+            group[1].append(numpy.asarray(profile).ravel())
+            group[2].append(numpy.full(group[0][-1].shape, i))
+        hard, soft = (
+            tuple(numpy.concatenate(parts) if parts else numpy.zeros(0, dtype=numpy.int64) for parts in groups[hard])
+            for hard in (True, False)
+        )
+        indices = numpy.concatenate([hard[0], soft[0]])
+        fused = len(numpy.unique(indices)) == len(indices)
+        return (bd.array(series), tuple(bd.array(a) for a in hard), tuple(bd.array(a) for a in soft), fused)
+
+    def update_E(self):
+        """ inject the sources into the electric field """
+        q = self.grid.time_steps_passed - self.start
+        if self.fused and 0 <= q < len(self.series):
+            # a view of E (the field is contiguous)
+            _scatter(self.grid.E.reshape(-1), self.series[q], self.hard, self.soft)
+        else:
+            for src in self.sources:
+                src.update_E()
+        for src in self.others:
+            src.update_E()
+
+    def update_H(self):
+        """ inject the sources into the magnetic field """
+        q = self.grid.time_steps_passed - self.start
+        if self.fused_H and 0 <= q < len(self.series_H):
+            _scatter(self.grid.H.reshape(-1), self.series_H[q], self.hard_H, self.soft_H)
+        else:
+            for src in self.sources_H:
+                src.update_H()
+        for src in self.others:
+            src.update_H()
+
+
+def _scatter(F, waveforms, hard, soft):
+    """ add the soft and set the hard profiles times their waveforms in the flattened field F """
+    index, profile, owner = soft
+    if len(index):
+        F[index] += profile * waveforms[owner]
+    index, profile, owner = hard
+    if len(index):
+        F[index] = profile * waveforms[owner]
+
+
 class SoftArbitraryPointSource:
     r"""
 
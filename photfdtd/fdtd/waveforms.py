@@ -1,12 +1,16 @@
 # reverse literate programming?
 
-from math import sin, cos, sqrt, log, exp
+from math import sqrt, log, exp
 
+import numpy
 from numpy import pi
 
+# The Hanning and the Gaussian pulse accept arrays of times as well, such that the
+# waveform of a source can be computed for all time steps of a run at once.
+
 # For Hanning window pulses
 def hanning(f, t, n):
-    return (1 / 2) * (1 - cos(f * t / n)) * (sin(f * t))
+    return (1 / 2) * (1 - numpy.cos(f * t / n)) * (numpy.sin(f * t))
 
 # 添加于 2023.5.14
 def pulse_oscillation(frequency, t, pulselength, offset):
@@ -22,7 +26,7 @@ def pulse_oscillation(frequency, t, pulselength, offset):
     """
     w_center = frequency * 2 * pi # 中心波长
     delta_t = pulselength / (2 * sqrt(2 * log(2))) # sigma
-    return sin(-w_center * (t - offset)) * exp(-(t - offset) ** 2 / 2 / delta_t ** 2)
+    return numpy.sin(-w_center * (t - offset)) * numpy.exp(-(t - offset) ** 2 / 2 / delta_t ** 2)
 
 """
 
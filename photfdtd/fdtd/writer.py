@@ -0,0 +1,119 @@
+""" Background HDF5 writer for the detectors of the FDTD Grid.
+
+The detectors hand full chunks of detected time steps to an ``H5Writer``, which
+converts and writes them to the h5 files in a background thread. The time loop
+only blocks when the writer falls more than one chunk behind a detector
+(double-buffering) or its queue is full. The h5 files stay open until the writer
+is closed at the end of ``Grid.run``.
+
+"""
+
+## Imports
+
+# standard library
+import os
+import queue
+import threading
+
+# 3rd party
+import h5py
+
+# relative
+from .backend import backend as bd
+
+
+## Writer
+class H5Writer:
+    """ writes chunks of detector data to h5 files in a background thread """
+
+    def __init__(self, max_queue: int = 8):
+        """Create a background writer
+
+        Args:
+            max_queue: the maximum number of chunks waiting to be written. When the
+                queue is full, submitting a chunk blocks until a chunk is written.
+        """
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._files = {}
+        self._error = None
+        self._thread = threading.Thread(target=self._work, name="H5Writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, path: str, dataset: str, start: int, data, convert=None,
+               done: threading.Event = None, message: str = None):
+        """queue a chunk to be written as dataset[start:start + len(data)]
+
+        Args:
+            path: the h5 file to write to
+            dataset: the name of the dataset in the file
+            start: the first row of the dataset to write
+            data: the chunk to write (array on the active backend). The chunk should
+                not be changed until `done` is set.
+            convert: optional function applied to the chunk before writing
+            done: optional event which is set when the chunk is written
+            message: optional message printed when the chunk is written
+        """
+        self._raise()
+        self._queue.put((path, dataset, start, data, convert, done, message))
+
+    def flush(self):
+        """wait until all queued chunks are written, then flush the h5 files to disk"""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+        self._raise()
+
+    def close(self):
+        """write all queued chunks, then flush, fsync and close the h5 files"""
+        self._queue.put(None)
+        self._thread.join()
+        paths = list(self._files)
+        for f in self._files.values():
+            f.flush()
+            f.close()
+        self._files = {}
+        for path in paths:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        self._raise()
+
+    def _raise(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Writing detector data failed") from error
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if isinstance(item, threading.Event):
+                # a flush request, see flush
+                try:
+                    for f in self._files.values():
+                        f.flush()
+                except BaseException as e:
+                    self._error = e
+                finally:
+                    item.set()
+                continue
+            path, dataset, start, data, convert, done, message = item
+            try:
+                if self._error is None:
+                    if convert is not None:
+                        data = convert(data)
+                    data = bd.numpy(data)
+                    if path not in self._files:
+                        self._files[path] = h5py.File(path, "a")
+                    self._files[path][dataset][start:start + len(data)] = data
+                    if message is not None:
+                        print(message)
+            except BaseException as e:
+                self._error = e
+            finally:
+                # never leave a detector waiting for its buffer
+                if done is not None:
+                    done.set()
@@ -1,4 +1,4 @@
-import photfdtd.fdtd.backend as bd
+from .geometry import Cylinder
 from .waveguide import Waveguide
 
 
@@ -41,57 +41,16 @@ class Circle(Waveguide):
 
         # 这里+2的原因：稍微扩大一点矩阵的大小，可以保证水平和竖直方向最边上的点不被丢出
         # TODO: 给其他带圆弧的波导相同的操作？
-        x = y = bd.linspace(1, 2 * self.radius + 2, 2 * self.radius + 2)
-        X, Y = bd.meshgrid(x, y, indexing="ij")  # indexing = 'ij'很重要
-        # m = (X - len(x) / 2) ** 2 + (Y - len(y) / 2) ** 2 <= self.radius[0] ** 2
-        matrix = bd.zeros((len(x), len(y)), dtype=float)
-
-        if self.axis.lower() == 'x':
-            # 波导沿x轴
-            self.xlength = self.length
-            self.ylength = 2 * self.radius + 2
-            self.zlength = 2 * self.radius + 2
-            self.permittivity = bd.zeros((self.xlength, self.ylength, self.zlength))
-
-            mask = (X - self.ylength // 2) ** 2 + (Y - self.ylength // 2) ** 2 <= self.radius ** 2
-            matrix[mask] = 1
-
-            matrix[matrix == 1] = self.refractive_index ** 2
-            matrix[matrix == 0] = self.background_index ** 2
-
-            self.permittivity = matrix
-
-        elif self.axis.lower() == 'y':
-            # 波导沿y轴
-            self.xlength = 2 * self.radius + 2
-            self.ylength = self.length
-            self.zlength = 2 * self.radius + 2
-            self.permittivity = bd.zeros((self.xlength, self.ylength, self.zlength))
-
-            mask = (X - self.xlength // 2) ** 2 + (Y - self.xlength // 2) ** 2 <= self.radius ** 2
-            matrix[mask] = 1
-
-            matrix[matrix == 1] = self.refractive_index ** 2
-            matrix[matrix == 0] = self.background_index ** 2
-
-            self.permittivity[:, 0] = matrix
-
-        elif self.axis.lower() == 'z':
-            # 波导沿z轴
-            self.xlength = 2 * self.radius + 2
-            self.ylength = 2 * self.radius + 2
-            self.zlength = self.length
-            self.permittivity = bd.zeros((self.xlength, self.ylength, self.zlength))
-
-            mask = (X - self.ylength // 2) ** 2 + (Y - self.ylength // 2) ** 2 <= self.radius ** 2
-            matrix[mask] = 1
-
-            matrix[matrix == 1] = self.refractive_index ** 2
-            matrix[matrix == 0] = self.background_index ** 2
-
-            self.permittivity[:, :, 0] = matrix
-
-
+        size = 2 * self.radius + 2
+        axis = self.axis.lower()
+        self.xlength, self.ylength, self.zlength = (self.length if a == axis else size for a in "xyz")
+        # 截面上的圆心位于第size // 2 - 1个网格 the center lies in cell size // 2 - 1 of the cross-section
+        origin = (self.x, self.y, self.z)
+        center = [o + size // 2 - 1 for a, o in zip("xyz", origin) if a != axis]
+        self._geometry = Cylinder(center, self.radius, axis, origin["xyz".index(axis)], self.length,
+                                  bounds=(origin, (self.x + self.xlength, self.y + self.ylength,
+                                                   self.z + self.zlength)),
+                                  refractive_index=self.refractive_index, priority=self.priority, name=self.name)
 
 
 class Fiber(Circle):
@@ -0,0 +1,608 @@
+"""
+解析几何引擎：器件的基本形状（长方体、圆柱、圆环扇区、梯形、S形弯曲）由解析式描述，不再为每个形状分配介电常数矩阵。
+Scene把形状按包围盒登记到分块索引中，然后逐块把整个场景光栅化到网格的inverse_permittivity与priority中，额外内存只与块的大小有关。
+Analytic geometry engine: the primitives of the devices (box, cylinder, annular arc, taper, sine bend) are described by
+closed-form expressions instead of a permittivity array per shape. A Scene buckets the primitives into a tile index by
+their bounding boxes and rasterizes the whole scene into inverse_permittivity and priority of the grid tile by tile, so
+that the extra memory only depends on the tile size.
+
+坐标以均匀网格的网格数为单位，网格(i, j, k)的中心位于(i, j, k)。inside按各器件类原有的离散规则判断网格是否在形状内，
+sdf是连续的有向距离（形状内为负）。
+Coordinates are in cells of the uniform grid, the center of cell (i, j, k) lies at (i, j, k). `inside` follows the
+discretization of the device classes, `sdf` is the continuous signed distance (negative inside).
+
+亚像素平滑（smoothing=True）时由sdf得到网格的填充比例与表面法向，按各向异性平均写入inverse_permittivity的三个分量。
+With sub-pixel smoothing (smoothing=True) the fill fraction and the surface normal of the cells are derived from sdf
+and the three components of inverse_permittivity are filled with the anisotropic average.
+"""
+import math
+
+import numpy as np
+
+import photfdtd.fdtd.backend as bd
+
+
+def _within(coordinate, start, length):
+    """坐标是否落在网格[start, start + length)内 whether the coordinates lie in the cells [start, start + length)"""
+    return (coordinate > start - 0.5) & (coordinate < start + length - 0.5)
+
+
+def _linspace(index, num):
+    """numpy.linspace(0, num, num)在(可为小数的)下标index处的值 the value of numpy.linspace(0, num, num) at index"""
+    if num <= 1:
+        return index * 0.0
+    # linspace的最后一个元素恰好等于num the last element of linspace is exactly num
+    return np.where(index == num - 1, float(num), index * (num / (num - 1)))
+
+
+def _slab(coordinate, start, length):
+    """到网格[start, start + length)所在平板的有向距离 signed distance to the slab of the cells [start, start + length)"""
+    return abs(coordinate - (start + (length - 1) / 2)) - length / 2
+
+
+def _cell_extent(coordinate):
+    """
+    加密网格中各网格中心的均匀网格坐标及网格大小：每个均匀网格被等分为若干个网格
+    The centers of the cells of a refined grid in uniform grid coordinates and their sizes: every uniform cell is
+    split into equal cells.
+    @param coordinate: 各网格所在的均匀网格坐标（有序）the (sorted) uniform grid coordinate of every cell
+    @return: (center, size)
+    """
+    _, first, counts = np.unique(coordinate, return_index=True, return_counts=True)
+    run = np.repeat(np.arange(len(first)), counts)
+    size = 1 / counts[run]
+    return coordinate - 0.5 + (np.arange(len(coordinate)) - first[run] + 0.5) * size, size
+
+
+def _combine(*distances):
+    """几个有向距离的交集（同长方体的距离函数）the intersection of signed distances (as for a box)"""
+    outside = np.sqrt(sum(np.maximum(d, 0) ** 2 for d in distances))
+    inside = np.minimum(np.maximum.reduce(np.broadcast_arrays(*distances)), 0)
+    return outside + inside
+
+
+class Primitive:
+    """
+    解析形状的基类
+    Base class of the analytic primitives.
+    @param refractive_index: 折射率
+    @param priority: 优先级 priority (high index indicates high priority)
+    @param name: 名称，放入网格后成为fdtd.Grid的属性 name, becomes an attribute of the fdtd.Grid
+    @param bounds: 包围盒((x0, y0, z0), (x1, y1, z1))，网格数，左闭右开。默认由形状计算，光栅化时只处理包围盒内的网格
+                   bounding box in cells (half-open), computed from the shape by default. Only the cells in it are
+                   rasterized.
+    """
+
+    def __init__(self, refractive_index: float = None, priority: int = 1, name: str = None, bounds=None):
+        self.refractive_index = refractive_index
+        self.priority = priority
+        self.name = name
+        # 绕y轴的旋转与平移：局部坐标(x, y, z)绕y轴旋转angle再平移shift得到网格坐标
+        # rotation about the y axis and translation: the local (x, y, z) rotated about y by angle and translated by
+        # shift are the grid coordinates
+        self.angle = 0.0
+        self.shift = (0.0, 0.0, 0.0)
+        if bounds is None:
+            bounds = self._local_bounds()
+        self.bounds = tuple(tuple(int(i) for i in b) for b in bounds)
+
+    def _local_bounds(self):
+        """未旋转时的包围盒，可以偏大 bounding box of the unrotated shape, may be larger than necessary"""
+        raise NotImplementedError
+
+    def _inside(self, x, y, z):
+        raise NotImplementedError
+
+    def _sdf(self, x, y, z):
+        raise NotImplementedError
+
+    def _local(self, x, y, z):
+        """网格坐标变换到未旋转、未平移的局部坐标 grid coordinates to the coordinates of the unrotated, unmoved shape"""
+        if not self.angle:
+            if not any(self.shift):
+                return x, y, z
+            return x - self.shift[0], y - self.shift[1], z - self.shift[2]
+        c, s = math.cos(self.angle), math.sin(self.angle)
+        dx, dz = x - self.shift[0], z - self.shift[2]
+        return c * dx + s * dz, y - self.shift[1], -s * dx + c * dz
+
+    def inside(self, x, y, z):
+        """
+        网格是否在形状内
+        Whether the cells are inside the shape.
+        @param x, y, z: 网格坐标，可广播的数组 grid coordinates, broadcastable numpy arrays
+        @return: 布尔数组 boolean numpy array
+        """
+        return self._inside(*self._local(x, y, z))
+
+    def sdf(self, x, y, z):
+        """
+        到形状边界的有向距离（网格数），形状内为负。弯曲与倾斜的边界处为近似值
+        Signed distance to the surface in cells, negative inside. Approximate near curved and slanted boundaries.
+        @param x, y, z: 坐标，可广播的数组 coordinates, broadcastable numpy arrays
+        """
+        return self._sdf(*self._local(x, y, z))
+
+    def fill(self, x, y, z, size, samples=(5, 5, 5)):
+        """
+        网格被形状填充的比例及形状表面的单位法向。靠近表面的网格被等分为子网格，填充比例为中心在形状内的子网格所占的比例，
+        因此位于网格边界上的平面（如长方体的各面）得到恰好为0或1的比例；法向为sdf的梯度方向
+        The fraction of the cells filled by the shape and the unit normal of the surface. The cells near the surface are
+        split into sub-cells and the fraction is the share of sub-cells whose centers are inside, so that planes on cell
+        boundaries (like the faces of a box) give exactly 0 or 1. The normal is the direction of the gradient of sdf.
+        @param x, y, z: 网格中心，可广播的数组 cell centers, broadcastable numpy arrays
+        @param size: 三个轴上的网格大小，可与x, y, z广播 cell sizes along the three axes, broadcastable with x, y, z
+        @param samples: 每个轴上的子网格数 number of sub-cells along each axis
+        @return: (fraction, normal)，形状为(...)与(..., 3) with shapes (...) and (..., 3)
+        """
+        x, y, z, *size = np.broadcast_arrays(x, y, z, *size)
+        distance = self.sdf(x, y, z)
+        fraction = (distance <= 0).astype(float)
+        normal = np.zeros(distance.shape + (3,))
+        # 只有离表面足够近的网格可能被部分填充 only cells close enough to the surface may be partially filled
+        band = abs(distance) < sum(size) / 2
+        if not band.any():
+            return fraction, normal
+        points = [c[band][:, None] for c in (x, y, z)]
+        sizes = [s[band][:, None] for s in size]
+        offsets = np.meshgrid(*((np.arange(q) + 0.5) / q - 0.5 for q in samples), indexing="ij")
+        fraction[band] = np.mean(self.sdf(*(p + s * o.ravel() for p, s, o in zip(points, sizes, offsets))) <= 0,
+                                 axis=1)
+        gradient = []
+        for axis in range(3):
+            plus, minus = list(points), list(points)
+            plus[axis] = points[axis] + sizes[axis] / 2
+            minus[axis] = points[axis] - sizes[axis] / 2
+            gradient.append((self.sdf(*plus) - self.sdf(*minus))[:, 0] / sizes[axis][:, 0])
+        gradient = np.stack(gradient, axis=-1)
+        norm = np.linalg.norm(gradient, axis=-1, keepdims=True)
+        normal[band] = np.divide(gradient, norm, out=np.zeros_like(gradient), where=norm > 0)
+        return fraction, normal
+
+    def near(self, center, distance: float) -> bool:
+        """
+        离center不超过distance的网格中是否可能有形状内的网格。由sdf保守地估计，sdf的误差与离散规则的偏差由2个网格的余量覆盖
+        Whether cells within distance of center may be inside the shape. A conservative estimate from sdf, a margin
+        of 2 cells covers the error of sdf and the discretization.
+        """
+        return float(self.sdf(*(np.array(c, dtype=float) for c in center))) <= distance + 2
+
+    def tighten(self, bounds=None, axes=(0, 1, 2)):
+        """
+        去掉包围盒边上不含形状的网格层
+        Shrink the bounding box to the smallest box that contains all cells inside the shape.
+        @param bounds: 初始包围盒，默认为self.bounds the initial bounding box
+        @param axes: 需要收缩的轴 the axes to shrink
+        @return: ((x0, y0, z0), (x1, y1, z1))
+        """
+        lo, hi = (list(b) for b in (bounds or self.bounds))
+        for axis in axes:
+            for side in (0, 1):
+                while lo[axis] < hi[axis]:
+                    coordinates = [np.arange(lo[a], hi[a], dtype=float) for a in range(3)]
+                    coordinates[axis] = np.array([lo[axis] if side == 0 else hi[axis] - 1], dtype=float)
+                    if self.inside(*np.ix_(*coordinates)).any():
+                        break
+                    if side == 0:
+                        lo[axis] += 1
+                    else:
+                        hi[axis] -= 1
+        return tuple(lo), tuple(hi)
+
+    def rotate_y(self, angle: float, center):
+        """
+        绕平行于y轴、经过center的轴旋转，旋转矩阵与Waveguide.rotate_Y相同，并重新计算包围盒
+        Rotate about the axis parallel to y through center, with the rotation matrix of Waveguide.rotate_Y, and
+        recompute the bounding box.
+        @param angle: 弧度 angle in rad
+        @param center: 旋转轴的(x, z)坐标 (x, z) of the rotation axis
+        """
+        c, s = math.cos(angle), math.sin(angle)
+        tx, tz = self.shift[0] - center[0], self.shift[2] - center[1]
+        self.shift = (c * tx - s * tz + center[0], self.shift[1], s * tx + c * tz + center[1])
+        self.angle += angle
+
+        lo, hi = self._local_bounds()
+        c, s = math.cos(self.angle), math.sin(self.angle)
+        corners = [(x, z) for x in (lo[0] - 0.5, hi[0] - 0.5) for z in (lo[2] - 0.5, hi[2] - 0.5)]
+        xs = [c * x - s * z + self.shift[0] for x, z in corners]
+        zs = [s * x + c * z + self.shift[2] for x, z in corners]
+        y = int(self.shift[1])
+        bounds = ((math.floor(min(xs)), lo[1] + y, math.floor(min(zs))),
+                  (math.ceil(max(xs)) + 1, hi[1] + y, math.ceil(max(zs)) + 1))
+        self.bounds = self.tighten(bounds, axes=(0, 2))
+        return self
+
+    def translate(self, dx: int, dy: int, dz: int):
+        """
+        平移整数个网格，包围盒随之平移
+        Move the shape by whole cells, together with its bounding box.
+        """
+        self.shift = tuple(s + d for s, d in zip(self.shift, (dx, dy, dz)))
+        self.bounds = tuple(tuple(b + d for b, d in zip(bound, (dx, dy, dz))) for bound in self.bounds)
+        return self
+
+    def permittivity(self, background_index: float):
+        """
+        包围盒内的介电常数矩阵，形状内为refractive_index ** 2，形状外为background_index ** 2
+        The permittivity array over the bounding box: refractive_index ** 2 inside, background_index ** 2 outside.
+        """
+        lo, hi = self.bounds
+        inside = self.inside(*np.ix_(*(np.arange(l, h, dtype=float) for l, h in zip(lo, hi))))
+        inside = np.broadcast_to(inside, tuple(h - l for l, h in zip(lo, hi)))
+        return bd.array(np.where(inside, self.refractive_index ** 2, background_index ** 2))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(name={repr(self.name)})"
+
+
+class Box(Primitive):
+    """
+    长方体，占据网格[x, x + xlength) × [y, y + ylength) × [z, z + zlength)
+    A box covering the cells [x, x + xlength) × [y, y + ylength) × [z, z + zlength).
+    """
+
+    def __init__(self, x: int, y: int, z: int, xlength: int, ylength: int, zlength: int, **kwargs):
+        self.origin = (x, y, z)
+        self.size = (xlength, ylength, zlength)
+        super().__init__(**kwargs)
+
+    def _local_bounds(self):
+        return self.origin, tuple(o + s for o, s in zip(self.origin, self.size))
+
+    def _inside(self, x, y, z):
+        (x0, y0, z0), (xl, yl, zl) = self.origin, self.size
+        return _within(x, x0, xl) & _within(y, y0, yl) & _within(z, z0, zl)
+
+    def _sdf(self, x, y, z):
+        return _combine(*(_slab(c, o, s) for c, o, s in zip((x, y, z), self.origin, self.size)))
+
+
+class Cylinder(Primitive):
+    """
+    圆柱：沿axis占据网格[start, start + length)，截面上到轴的距离不超过radius的网格
+    A cylinder along axis: the cells [start, start + length) along the axis whose distance to the axis is at most radius.
+    @param center: 轴在截面上的坐标，按x, y, z中其余两个轴的顺序 the axis on the cross-section, in the order x, y, z
+    @param radius: 半径
+    @param axis: "x", "y" or "z"
+    @param start, length: 沿轴的起点与长度 start and length along the axis
+    """
+
+    def __init__(self, center, radius: float, axis: str = "z", start: int = 0, length: int = 1, **kwargs):
+        self.center = tuple(center)
+        self.radius = radius
+        self.axis = "xyz".index(axis.lower())
+        self.start = start
+        self.length = length
+        super().__init__(**kwargs)
+
+    def _split(self, x, y, z):
+        """沿轴的坐标与截面上的两个坐标 the coordinate along the axis and the two on the cross-section"""
+        coordinates = [x, y, z]
+        along = coordinates.pop(self.axis)
+        return along, coordinates
+
+    def _local_bounds(self):
+        lo, hi = [], []
+        cross = iter(self.center)
+        for axis in range(3):
+            if axis == self.axis:
+                lo.append(self.start)
+                hi.append(self.start + self.length)
+            else:
+                c = next(cross)
+                lo.append(math.ceil(c - self.radius))
+                hi.append(math.floor(c + self.radius) + 1)
+        return tuple(lo), tuple(hi)
+
+    def _inside(self, x, y, z):
+        along, (a, b) = self._split(x, y, z)
+        disk = (a - self.center[0]) ** 2 + (b - self.center[1]) ** 2 <= self.radius ** 2
+        return disk & _within(along, self.start, self.length)
+
+    def _sdf(self, x, y, z):
+        along, (a, b) = self._split(x, y, z)
+        radial = np.sqrt((a - self.center[0]) ** 2 + (b - self.center[1]) ** 2) - self.radius
+        return _combine(radial, _slab(along, self.start, self.length))
+
+
+class AnnularArc(Primitive):
+    """
+    xz平面上的圆环扇区，沿y占据网格[y, y + ylength)
+    An annular sector in the xz plane covering the cells [y, y + ylength) along y.
+    @param x, z: 圆心 center
+    @param outer_radius: 外半径
+    @param width: 环宽，内半径为|outer_radius - width| ring width, the inner radius is |outer_radius - width|
+    @param phi: 起始角，从x轴正方向转向z轴正方向，弧度，[0, 2pi) start angle from +x towards +z in rad, in [0, 2pi)
+    @param psi: 张角，弧度 opening angle in rad
+    """
+
+    def __init__(self, x: float, z: float, outer_radius: float, width: float, phi: float, psi: float,
+                 y: int = 0, ylength: int = 1, **kwargs):
+        self.x, self.z = x, z
+        self.outer_radius = outer_radius
+        self.width = width
+        self.phi = float(phi)
+        self.psi = float(psi)
+        self.y, self.ylength = y, ylength
+        super().__init__(**kwargs)
+
+    def _in_sector(self, angle):
+        end = (self.phi + self.psi) % (2 * math.pi)
+        if (self.phi + self.psi) // (2 * math.pi) == 0:
+            return (angle >= self.phi) == (angle <= end)
+        return (angle >= self.phi) | (angle <= end)
+
+    def _local_bounds(self):
+        # 扇区的极值点在两条边的端点、落在扇区内的坐标轴方向上，或在内半径为0时的圆心处
+        # the extreme points of the sector are the ends of its edges, the axis directions inside the sector and the
+        # center if the inner radius is 0
+        R, inner = self.outer_radius, abs(self.outer_radius - self.width)
+        end = (self.phi + self.psi) % (2 * math.pi)
+        points = [(r * math.cos(a), r * math.sin(a)) for a in (self.phi, end) for r in (inner, R)]
+        points += [(R * math.cos(a), R * math.sin(a)) for a in np.arange(4) * math.pi / 2 if self._in_sector(a)]
+        if inner == 0:
+            points.append((0, 0))
+        lo = [max(math.floor(min(p[i] for p in points)) - 1, -R) for i in (0, 1)]
+        hi = [min(math.ceil(max(p[i] for p in points)) + 2, R + 2) for i in (0, 1)]
+        return ((self.x + lo[0], self.y, self.z + lo[1]),
+                (self.x + hi[0], self.y + self.ylength, self.z + hi[1]))
+
+    def _inside(self, x, y, z):
+        dx, dz = x - self.x, z - self.z
+        distance = dx ** 2 + dz ** 2
+        ring = (distance >= (self.outer_radius - self.width) ** 2) == (distance <= self.outer_radius ** 2)
+        angle = np.arctan2(dz, dx)
+        angle = np.where(angle < 0, 2 * np.pi + angle, angle)
+        return ring & self._in_sector(angle) & _within(y, self.y, self.ylength)
+
+    def _sdf(self, x, y, z):
+        dx, dz = x - self.x, z - self.z
+        distance = np.sqrt(dx ** 2 + dz ** 2)
+        section = np.maximum(distance - self.outer_radius, abs(self.outer_radius - self.width) - distance)
+        if self.psi < 2 * np.pi:
+            # 到扇区中线的角距离 angular distance to the bisector of the sector
+            delta = abs((np.arctan2(dz, dx) - self.phi - self.psi / 2 + np.pi) % (2 * np.pi) - np.pi)
+            section = np.maximum(section, distance * np.sin(np.clip(delta - self.psi / 2, -np.pi / 2, np.pi / 2)))
+        return _combine(section, _slab(y, self.y, self.ylength))
+
+
+class Trapezoid(Primitive):
+    """
+    xz平面上的等腰梯形（Taper），沿y拉伸。沿z占据网格[z, z + zlength)，沿x占据[x, x + xlength)，
+    窄边宽width，位于z的起点（direction为False时位于终点）
+    An isosceles trapezoid (Taper) in the xz plane extruded along y. It covers the cells [z, z + zlength) along z and
+    [x, x + xlength) along x, the narrow side of width width lies at the start of z (at the end if direction is False).
+    """
+
+    def __init__(self, x: int, y: int, z: int, xlength: int, ylength: int, zlength: int, width: float,
+                 direction: bool = True, **kwargs):
+        self.origin = (x, y, z)
+        self.size = (xlength, ylength, zlength)
+        self.width = width
+        self.direction = direction
+        super().__init__(**kwargs)
+
+    def _local_bounds(self):
+        return self.origin, tuple(o + s for o, s in zip(self.origin, self.size))
+
+    def _inside(self, x, y, z):
+        (x0, y0, z0), (xlength, ylength, zlength) = self.origin, self.size
+        a, c = x - x0, z - z0
+        # 与Taper相同，坐标取自numpy.linspace(0, length, length) coordinates of numpy.linspace as in Taper
+        X = _linspace(a, xlength)
+        Z = _linspace(c if self.direction else zlength - 1 - c, zlength)
+        m = (
+                (Z * (self.width / 2 - xlength / 2) / zlength + xlength / 2 - self.width / 2 <= X)
+                & (X <= Z * (-self.width / 2 + xlength / 2) / zlength + xlength / 2 + self.width / 2)
+        )
+        return m & _within(a, 0, xlength) & _within(y, y0, ylength) & _within(c, 0, zlength)
+
+    def _sdf(self, x, y, z):
+        (x0, y0, z0), (xlength, ylength, zlength) = self.origin, self.size
+        # 到窄边的距离 distance from the narrow side
+        along = z - z0 if self.direction else z0 + zlength - 1 - z
+        slope = (xlength - self.width) / 2 / max(zlength - 1, 1)
+        half_width = self.width / 2 + slope * along
+        side = (abs(x - (x0 + (xlength - 1) / 2)) - half_width) / math.sqrt(1 + slope ** 2)
+        # 斜边与z方向的端面不正交，只取较大者 the slanted sides are not orthogonal to the ends, take the larger one
+        return _combine(np.maximum(side, _slab(z, z0, zlength)), _slab(y, y0, ylength))
+
+
+class SineBend(Primitive):
+    """
+    xz平面上的S形弯曲波导（Sbend），沿y拉伸。沿z占据网格[z, z + zlength)，x方向跨度xlength，波导宽width；
+    direction=1时从左下到右上，-1时从左上到右下
+    A sine bend (Sbend) in the xz plane extruded along y. It covers the cells [z, z + zlength) along z with an offset
+    of xlength along x and a width of width, from lower left to upper right for direction=1 and from upper left to
+    lower right for direction=-1.
+    """
+
+    def __init__(self, x: int, y: int, z: int, xlength: int, ylength: int, zlength: int, width: float,
+                 direction: int = 1, **kwargs):
+        self.origin = (x, y, z)
+        self.size = (xlength, ylength, zlength)
+        self.width = width
+        self.direction = direction
+        super().__init__(**kwargs)
+
+    def _local_bounds(self):
+        return self.origin, tuple(o + s for o, s in zip(self.origin, self.size))
+
+    def _below(self, a, c):
+        """Sbend中的m1：在上边界以下 m1 of Sbend: below the upper edge"""
+        xlength, zlength = self.size[0], self.size[2]
+        X, Z = _linspace(a, xlength), _linspace(c, zlength)
+        return (
+                X
+                <= self.direction * 0.5 * (xlength - self.width) * np.sin((Z / zlength - 0.5) * np.pi)
+                + int(self.width / 2 + 0.5)
+                + xlength / 2
+        )
+
+    def _inside(self, x, y, z):
+        (x0, y0, z0), (xlength, ylength, zlength) = self.origin, self.size
+        a, c = x - x0, z - z0
+        # 下边界由上边界中心对称得到 the lower edge is the upper one mirrored through the center
+        m = self._below(a, c) == self._below(xlength - 1 - a, zlength - 1 - c)
+        return m & _within(a, 0, xlength) & _within(y, y0, ylength) & _within(c, 0, zlength)
+
+    def _sdf(self, x, y, z):
+        (x0, y0, z0), (xlength, ylength, zlength) = self.origin, self.size
+        phase = ((z - z0) / zlength - 0.5) * np.pi
+        amplitude = self.direction * 0.5 * (xlength - self.width)
+        center = x0 + xlength / 2 + amplitude * np.sin(phase)
+        slope = amplitude * np.cos(phase) * np.pi / zlength
+        side = (abs(x - center) - self.width / 2) / np.sqrt(1 + slope ** 2)
+        return _combine(np.maximum(side, _slab(z, z0, zlength)), _slab(y, y0, ylength))
+
+
+class Scene:
+    """
+    按添加顺序排列的一组形状，以及它们包围盒的分块索引（每个块记录与之相交的形状）
+    An ordered collection of primitives with a tile index of their bounding boxes (every tile lists the primitives
+    overlapping it).
+    @param primitives: 形状 the primitives
+    @param tile: 块的边长（网格数），光栅化时每次只处理一个块 edge length of the tiles in cells, the rasterization works
+                 on one tile at a time
+    """
+
+    def __init__(self, primitives=(), tile: int = 64):
+        self.primitives = list(primitives)
+        self.tile = tile
+
+    def add(self, primitive: Primitive):
+        self.primitives.append(primitive)
+
+    def __len__(self):
+        return len(self.primitives)
+
+    def __iter__(self):
+        return iter(self.primitives)
+
+    def index(self, cells, part=None):
+        """
+        把形状登记到它们的包围盒所覆盖的块中
+        Bucket the primitives by the tiles their bounding boxes overlap.
+        @param cells: 每个轴上各网格所在的均匀网格坐标 the uniform grid coordinate of every cell along each axis
+        @param part: 只考虑网格的这一部分（各轴的切片），None为整个网格 only this part of the grid (slices along each
+                     axis), None for the whole grid
+        @return: ({块: [形状序号, ...]}, [各形状在网格中的包围盒]) the tile buckets and the boxes of the primitives in cells
+        """
+        boxes, buckets = [], {}
+        for n, primitive in enumerate(self.primitives):
+            lo, hi = primitive.bounds
+            box = tuple((int(np.searchsorted(c, l)), int(np.searchsorted(c, h))) for c, l, h in zip(cells, lo, hi))
+            if part is not None:
+                box = tuple((max(start, p.start), min(stop, p.stop)) for (start, stop), p in zip(box, part))
+            boxes.append(box)
+            if any(start >= stop for start, stop in box):
+                continue
+            tiles = [range(start // self.tile, (stop - 1) // self.tile + 1) for start, stop in box]
+            for i in tiles[0]:
+                for j in tiles[1]:
+                    for k in tiles[2]:
+                        buckets.setdefault((i, j, k), []).append(n)
+        return buckets, boxes
+
+    def rasterize(self, grid, cells=None, smoothing: bool = False):
+        """
+        把场景写入fdtd.Grid：形状依次登记到grid.objects中，并按添加顺序比较优先级写入inverse_permittivity与priority。
+        结果与把每个形状的介电常数矩阵依次作为fdtd.Object放入网格相同
+        Put the scene into a fdtd.Grid: the primitives are registered in grid.objects and written into
+        inverse_permittivity and priority in order of addition, comparing priorities. The result is the same as
+        registering the permittivity array of every primitive as a fdtd.Object one after another.
+        @param grid: fdtd.Grid
+        @param cells: 每个轴上各网格所在的均匀网格坐标（加密网格），None为均匀网格
+                      the uniform grid coordinate of every cell along each axis (refined grids), None for a uniform grid
+        @param smoothing: 亚像素平滑：部分填充的网格按填充比例f与表面法向n取各向异性平均
+                          1/ε_k = n_k² <1/ε> + (1 - n_k²) / <ε>，<>为形状与网格中原有介电常数按f的平均。
+                          f与n在各分量的Yee网格位置（沿该分量方向偏移半个网格）上求得。
+                          f > 0且优先级高于网格处写入，其中f >= 0.5处网格的优先级变为1
+                          sub-pixel smoothing: partially filled cells take the anisotropic average
+                          1/ε_k = n_k² <1/ε> + (1 - n_k²) / <ε> with the fill fraction f and the surface normal n, where
+                          <> averages the shape and the permittivity already in the cell with f. f and n are taken at
+                          the Yee position of every component (half a cell along its own direction). The cells with f > 0
+                          and a priority above the one of the grid are written, the priority of the grid becomes 1 where
+                          f >= 0.5
+        """
+        for primitive in self.primitives:
+            if primitive.name is not None:
+                if hasattr(grid, primitive.name):
+                    raise ValueError(f"The grid already has an attribute with name {primitive.name}")
+                setattr(grid, primitive.name, primitive)
+            grid.objects.append(primitive)
+        self.paint(grid, cells, smoothing)
+
+    def paint(self, grid, cells=None, smoothing: bool = False, part=None):
+        """
+        按添加顺序把形状写入网格，但不登记到grid.objects中。rasterize登记形状后调用它，Grid.del_object等只重新写入一部分网格
+        Write the primitives into the grid in order of addition without registering them in grid.objects. rasterize
+        calls it after the registration, Grid.del_object and friends rewrite only a part of the grid with it.
+        @param grid, cells, smoothing: 见rasterize see rasterize
+        @param part: 只写入网格的这一部分（各轴的切片），None为整个包围盒 only write this part of the grid (slices along
+                     each axis), None for the whole bounding boxes
+        """
+        if cells is None:
+            cells = tuple(np.arange(n) for n in (grid.Nx, grid.Ny, grid.Nz))
+        cells = tuple(np.asarray(c, dtype=float) for c in cells)
+        if smoothing:
+            centers, sizes = zip(*(_cell_extent(c) for c in cells))
+
+        buckets, boxes = self.index(cells, part)
+        inverse = {n: bd.ones((1,)) / bd.array([self.primitives[n].refractive_index ** 2])
+                   for n in {n for members in buckets.values() for n in members}}
+        for tile, members in buckets.items():
+            for n in members:
+                # 形状的包围盒与块的交集 the box of the primitive within the tile
+                region = tuple(slice(max(start, t * self.tile), min(stop, (t + 1) * self.tile))
+                               for (start, stop), t in zip(boxes[n], tile))
+                shape = tuple(s.stop - s.start for s in region)
+                primitive = self.primitives[n]
+                coordinates = [c[s] for c, s in zip(cells, region)]
+                lo, hi = [c[0] for c in coordinates], [c[-1] for c in coordinates]
+                if not primitive.near([(l + h) / 2 for l, h in zip(lo, hi)],
+                                      math.sqrt(sum((h - l) ** 2 for l, h in zip(lo, hi))) / 2):
+                    # 形状不在这一块中：没有网格被写入，网格的优先级变为0 the shape misses the tile: nothing is written
+                    # and the priority of the grid becomes 0
+                    grid.priority[region] = 0
+                    continue
+                if smoothing:
+                    self._smooth(grid, region, primitive, [c[s] for c, s in zip(centers, region)],
+                                 [c[s] for c, s in zip(sizes, region)])
+                    continue
+                inside = primitive.inside(*np.ix_(*coordinates))
+                # 同fdtd.Object：优先级高于网格处写入，并把网格的优先级更新为是否写入
+                # as fdtd.Object: write where the priority exceeds the one of the grid, then the priority of the grid
+                # becomes whether the cell has been written
+                mask = bd.array(np.broadcast_to(inside, shape) * float(primitive.priority)) > grid.priority[region]
+                grid.inverse_permittivity[region][mask] = inverse[n]
+                grid.priority[region] = mask
+
+    @staticmethod
+    def _smooth(grid, region, primitive, centers, sizes):
+        """平滑地把一个形状写入网格的一个区域，见rasterize  write a primitive into a region with smoothing, see rasterize"""
+        counts = (grid.Nx, grid.Ny, grid.Nz)
+        # 只有一个网格的轴（二维仿真）上不必细分 no need to split the cells along an axis with a single cell (2D)
+        samples = [1 if n == 1 else 5 for n in counts]
+        fraction, normal = [], []
+        for axis in range(3):
+            # E的各分量位于沿该分量方向偏移半个网格处 every component of E lies half a cell along its own direction
+            points = list(centers)
+            if counts[axis] > 1:
+                points[axis] = centers[axis] + sizes[axis] / 2
+            f, n = primitive.fill(*np.ix_(*points), size=np.ix_(*sizes), samples=samples)
+            fraction.append(f)
+            normal.append(n[..., axis])
+        fraction, normal = np.stack(fraction, axis=-1), np.stack(normal, axis=-1)
+        mask = bd.array((fraction > 0) * float(primitive.priority)) > grid.priority[region][..., None]
+        written = bd.numpy(mask).astype(bool)
+        f = bd.array(fraction[written])
+        n2 = bd.array(normal[written] ** 2)
+        inverse = grid.inverse_permittivity[region][mask]
+        permittivity = primitive.refractive_index ** 2
+        mean = f * permittivity + (1 - f) / inverse
+        mean_inverse = f / permittivity + (1 - f) * inverse
+        grid.inverse_permittivity[region][mask] = n2 * mean_inverse + (1 - n2) / mean
+        grid.priority[region] = (grid.priority[region] < float(primitive.priority)) * bd.array(
+            fraction.mean(axis=-1) >= 0.5)
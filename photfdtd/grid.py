@@ -12,6 +12,7 @@ from dataclasses import dataclass
 from typing import Optional
 import h5py
 import pickle
+from .geometry import Primitive, Scene
 
 
 @dataclass
@@ -34,7 +35,10 @@ class Grid:
             courant_number=None,
             foldername=" ",
             folder=None,
-            set_PML: bool = True
+            set_PML: bool = True,
+            spatial_order: int = 2,
+            subpixel_smoothing: bool = False,
+            compact: bool = False
     ) -> None:
         """
         Args:
@@ -52,6 +56,23 @@ class Grid:
             foldername: 保存结果的文件夹名称
             folder: 保存结果的文件夹路径, None为当前目录下的foldername
             set_PML: 是否设置PML边界条件, 默认True
+            subregions (list, optional): list of Subregion, 需要加密网格的区域 regions with a refined mesh, see add_subregion
+            spatial_order (int, optional): 空间差分的阶数，2或4。4阶差分在粗网格下色散误差更小，时间步长缩小为6/7，仅支持均匀网格
+                the order of the spatial differences, 2 or 4. The fourth order has a smaller dispersion error on
+                coarse meshes, reduces the time step by 6/7 and requires a uniform mesh
+            subpixel_smoothing (bool, optional): 亚像素平滑。解析形状的器件（Waveguide, Arc, Ring, Circle, Fiber, Hexagonal_PC,
+                Sbend, Taper等）边界处的网格按填充比例与表面法向取各向异性平均的介电常数，而不是阶梯状的边界，
+                弯曲边界在较粗的网格下即可收敛。默认False
+                sub-pixel smoothing. At the boundaries of the analytic devices (Waveguide, Arc, Ring, Circle, Fiber,
+                Hexagonal_PC, Sbend, Taper, ...) the cells take the anisotropic average of the permittivity weighted
+                with the fill fraction and the surface normal instead of a staircase, so curved boundaries converge on
+                coarser meshes. Defaults to False
+            compact (bool, optional): 紧凑地存储材料。仿真运行时每个网格只保存一个材料编号（uint8或uint16）和一个各材料的
+                逆介电常数查找表，均匀的磁导率只保存一个值，优先级矩阵为整数，大网格的静态内存约为原来的1/6到1/10。默认False
+                store the materials compactly. While the simulation runs every cell keeps a material ID (uint8 or uint16)
+                into a lookup table of the inverse permittivity of every material, a uniform permeability is a single
+                value and the priority is an integer volume, which cuts the static memory of large grids by 6 to 10
+                times. Defaults to False
         Note:
             The units of E and H field in this package have been scaled:
             E(r, t) = √ϵ0 x E_real(r, t)
@@ -79,16 +100,24 @@ class Grid:
             self.folder = os.path.join(current_dir, foldername)
         os.makedirs(self.folder, exist_ok=True)
 
+        # 每个网格在x, y, z方向上的大小 size of every cell along x, y and z
         self.x_coordinates = bd.full(grid_xlength, grid_spacing_x)
         self.y_coordinates = bd.full(grid_ylength, grid_spacing_y)
         self.z_coordinates = bd.full(grid_zlength, grid_spacing_z)
+        # 均匀网格的格点在加密后网格中的索引，None表示没有加密
+        # index of the points of the uniform grid in the refined grid, None if the grid is not refined
+        self._cell_index = None
 
+        shape = (grid_xlength, grid_ylength, grid_zlength)
+        spacings = {}
         if subregions is not None:
-            grid_xlength, grid_ylength, grid_zlength = self.add_subregion(subregions=subregions,
-                                                                          grid_spacing_x=grid_spacing_x,
-                                                                          grid_spacing_y=grid_spacing_y,
-                                                                          grid_spacing_z=grid_spacing_z)
-        grid = fdtd.Grid(shape=(grid_xlength, grid_ylength, grid_zlength),
+            shape = self.add_subregion(subregions=subregions,
+                                       grid_spacing_x=grid_spacing_x,
+                                       grid_spacing_y=grid_spacing_y,
+                                       grid_spacing_z=grid_spacing_z)
+            spacings = dict(x_spacings=self.x_coordinates, y_spacings=self.y_coordinates,
+                            z_spacings=self.z_coordinates)
+        grid = fdtd.Grid(shape=shape,
                          grid_spacing=grid_spacing,
                          grid_spacing_x=grid_spacing_x,
                          grid_spacing_y=grid_spacing_y,
@@ -96,7 +125,10 @@ class Grid:
                          permittivity=permittivity,
                          permeability=permeability,
                          courant_number=courant_number,
-                         folder=self.folder
+                         folder=self.folder,
+                         spatial_order=spatial_order,
+                         compact=compact,
+                         **spacings
                          )
 
         self._grid_xlength = grid_xlength
@@ -108,6 +140,11 @@ class Grid:
         self.background_index = bd.sqrt(bd.array(permittivity) * bd.array(permeability))
 
         self.flag_PML_not_set = True if set_PML else False
+        self.subpixel_smoothing = subpixel_smoothing
+        # 网格的背景介电常数，修改器件时用于重新计算 the background permittivity, used to recompute edited regions
+        self._background_permittivity = permittivity
+        # 已添加的器件及其在grid.objects中的各部分 the added objects and their entries in grid.objects
+        self._added_objects = []
 
     def _handle_unit(self, lengths, grid_spacing=None) -> list:
         """处理单位，将SI单位转换为网格间距单位
@@ -181,37 +218,96 @@ class Grid:
                       grid_spacing_x=None,
                       grid_spacing_y=None,
                       grid_spacing_z=None):
-        """王硕在做"""
-        return
-        # subregions中每个方向仅允许有一个subregion
+        """加密网格（非均匀网格）：Subregion范围内的每个网格沿Subregion.direction被等分为round(grid_spacing / cell_size)个网格，
+        均匀网格的格点都被保留。器件、光源、监视器和PML仍然按均匀网格设置（单位为m或均匀网格的网格数），放入仿真区域时再映射到加密后的网格上。
+        Refine the mesh (nonuniform grid): inside a Subregion every cell of the uniform grid is split along
+        Subregion.direction into round(grid_spacing / cell_size) equal cells, so that all points of the uniform grid are kept.
+        Objects, sources, detectors and PMLs are still placed on the uniform grid (in m or in cells of the uniform grid)
+        and mapped onto the refined grid when they are put into the simulation region.
+        Args:
+            subregions (list): list of Subregion(direction, cell_size, region_start, region_end), 单位为m SI unit(m).
+                重叠的区域取较小的网格 Overlapping regions use the smaller cells.
+            direction: 已弃用，使用Subregion.direction Deprecated, Subregion.direction is used
+            grid_spacing_x (float): 均匀网格x方向的网格大小 grid spacing of the uniform grid in x direction
+            grid_spacing_y (float): 均匀网格y方向的网格大小 grid spacing of the uniform grid in y direction
+            grid_spacing_z (float): 均匀网格z方向的网格大小 grid spacing of the uniform grid in z direction
+        Returns:
+            tuple: 加密后x, y, z方向的网格数 numbers of cells of the refined grid along x, y and z
+        """
+        grid_spacings = {"x": grid_spacing_x, "y": grid_spacing_y, "z": grid_spacing_z}
+        lengths = {"x": len(self.x_coordinates), "y": len(self.y_coordinates), "z": len(self.z_coordinates)}
+        # 每个均匀网格被分成的网格数 number of cells every cell of the uniform grid is split into
+        pieces = {axis: np.ones(lengths[axis], dtype=int) for axis in "xyz"}
         for subregion in subregions:
-            cell_size = subregion.cell_size
-            region_start = subregion.region_start
-            region_end = subregion.region_end
-            if direction == "x":
-                self.start_coordinates = round(region_start / grid_spacing_x)
-                self.end_coordinates = round(region_end / grid_spacing_x)
-                subregion_x_coordinates = bd.full(int((region_end - region_start) / cell_size), cell_size)
-                self.x_coordinates = bd.concatenate([self.x_coordinates[:self.start_coordinates],
-                                                     subregion_x_coordinates,
-                                                     self.x_coordinates[end_coordinates:]])
-            if direction == "y":
-                start_coordinates = round(region_start / grid_spacing_y)
-                end_coordinates = round(region_end / grid_spacing_y)
-                subregion_y_coordinates = bd.full(int((region_end - region_start) / cell_size), cell_size)
-                self.y_coordinates = bd.concatenate([self.y_coordinates[:start_coordinates],
-                                                     subregion_y_coordinates,
-                                                     self.y_coordinates[end_coordinates:]])
-            if direction == "z":
-                start_coordinates = round(region_start / grid_spacing_z)
-                end_coordinates = round(region_end / grid_spacing_z)
-                subregion_z_coordinates = bd.full(int((region_end - region_start) / cell_size), cell_size)
-                self.z_coordinates = bd.concatenate([self.z_coordinates[:start_coordinates],
-                                                     subregion_z_coordinates,
-                                                     self.z_coordinates[end_coordinates:]])
+            axis = subregion.direction.lower()
+            if lengths[axis] == 1:
+                # 二维仿真中不加密长度为1的方向 a 2D simulation stays 2D
+                continue
+            d = grid_spacings[axis]
+            start = max(int(round(subregion.region_start / d)), 0)
+            end = min(int(round(subregion.region_end / d)), lengths[axis])
+            n = max(int(round(d / subregion.cell_size)), 1)
+            pieces[axis][start:end] = np.maximum(pieces[axis][start:end], n)
+
+        self._cell_index = tuple(np.concatenate([[0], np.cumsum(pieces[axis])]) for axis in "xyz")
+        self.x_coordinates = np.repeat(grid_spacing_x / pieces["x"], pieces["x"])
+        self.y_coordinates = np.repeat(grid_spacing_y / pieces["y"], pieces["y"])
+        self.z_coordinates = np.repeat(grid_spacing_z / pieces["z"], pieces["z"])
         self.subregion_added = True
         return len(self.x_coordinates), len(self.y_coordinates), len(self.z_coordinates)
 
+    def _to_cells(self, key):
+        """把均匀网格上的索引（整数或切片）映射到加密后的网格上
+        Map indices (integers or slices) of the uniform grid onto the refined grid.
+        Args:
+            key: tuple of indices along x, (y, (z))
+        Returns:
+            tuple: indices of the refined grid
+        """
+        if self._cell_index is None:
+            return key
+
+        def _map(i, axis):
+            if i is None:
+                return None
+            index = self._cell_index[axis]
+            if i < 0:
+                # keep negative indices negative, e.g. for the high PML
+                return int(index[len(index) - 1 + i]) - int(index[-1])
+            return int(index[min(i, len(index) - 1)])
+
+        cells = []
+        for axis, k in enumerate(key):
+            if isinstance(k, slice):
+                cells.append(slice(_map(k.start, axis), _map(k.stop, axis), k.step))
+            else:
+                cells.append(_map(k, axis))
+        return tuple(cells)
+
+    def _resample_to_cells(self, array, x: int, y: int, z: int):
+        """把放在均匀网格(x, y, z)处的器件数组（如介电常数）重采样到加密后的网格上，每个加密网格取其所在均匀网格的值
+        Resample an array of an object (e.g. its permittivity) at (x, y, z) of the uniform grid onto the refined grid:
+        every refined cell takes the value of the uniform cell it lies in.
+        """
+        if self._cell_index is None or not hasattr(array, "shape") or len(array.shape) < 3:
+            return array
+        for axis, start in enumerate((x, y, z)):
+            index = self._cell_index[axis]
+            stop = start + array.shape[axis]
+            # number of refined cells in every uniform cell of the object
+            pieces = np.diff(index[start:stop + 1])
+            take = np.repeat(np.arange(array.shape[axis]), pieces)
+            array = array[(slice(None),) * axis + (take,)]
+        return array
+
+    def _cell_coordinates(self):
+        """加密网格上各网格所在的均匀网格坐标，均匀网格返回None
+        The coordinate of the uniform cell every cell of the refined grid lies in, None for a uniform grid.
+        """
+        if self._cell_index is None:
+            return None
+        return tuple(np.repeat(np.arange(len(index) - 1), np.diff(index)) for index in self._cell_index)
+
     # def handle_subregion(self, array, subregions: list = None):
     #     import scipy.ndimage
     #     def _zoom(array, axis, start, end, new_len):
@@ -238,38 +334,165 @@ class Grid:
         Args:
             object: photfdtd.Waveguide object, the waveguide to be added to the grid
             """
+        # 连续的解析形状放进同一个场景，一次分块光栅化；其余器件仍以介电常数矩阵作为fdtd.Object放入网格
+        # consecutive analytic shapes are collected into one scene and rasterized in a single tiled pass, the other
+        # objects are still registered as fdtd.Object with their permittivity array
+        start = len(self._grid.objects)
+        scene = Scene()
         for internal_object in object._internal_objects:
 
             if internal_object == 0:
                 continue
             else:
                 self._check_parameters(object_to_check=internal_object)
-                self._grid[
-                internal_object.x: internal_object.x + internal_object.xlength,
-                internal_object.y: internal_object.y + internal_object.ylength,
-                internal_object.z: internal_object.z + internal_object.zlength,
-                ] = fdtd.Object(permittivity=internal_object.permittivity, name=internal_object.name,
-                                background_index=internal_object.background_index,
-                                priority_matrix=internal_object.priority_matrix)
+                geometry = getattr(internal_object, "_geometry", None)
+                if geometry is not None:
+                    scene.add(geometry)
+                    continue
+                scene.rasterize(self._grid, cells=self._cell_coordinates(), smoothing=self.subpixel_smoothing)
+                scene = Scene()
+                location = (internal_object.x, internal_object.y, internal_object.z)
+                self._grid[self._to_cells((
+                    slice(internal_object.x, internal_object.x + internal_object.xlength),
+                    slice(internal_object.y, internal_object.y + internal_object.ylength),
+                    slice(internal_object.z, internal_object.z + internal_object.zlength),
+                ))] = fdtd.Object(permittivity=self._resample_to_cells(internal_object.permittivity, *location),
+                                  name=internal_object.name,
+                                  background_index=internal_object.background_index,
+                                  priority_matrix=self._resample_to_cells(internal_object.priority_matrix,
+                                                                          *location))
+        scene.rasterize(self._grid, cells=self._cell_coordinates(), smoothing=self.subpixel_smoothing)
+        self._added_objects.append((object, self._grid.objects[start:]))
 
     def del_object(self, object: photfdtd.Waveguide):
-        # TODO: unfinished, no use
-        for internal_object in object._internal_objects:
+        """从网格中移除一个器件。只重新计算器件所在的网格：其中的介电常数与优先级由与之重叠的其余器件按添加顺序重新写入
+        Remove a waveguide from the grid. Only the cells of the waveguide are recomputed: the remaining objects
+        overlapping them are written into them again in order of addition, so the result is the same as building
+        the grid without the waveguide.
+        Args:
+            object: photfdtd.Waveguide object, a waveguide added with add_object
+        """
+        _, boxes = self._take_object(object)
+        self._repaint(boxes)
+
+    def move_object(self, object: photfdtd.Waveguide, x: int or float = 0, y: int or float = 0,
+                    z: int or float = 0):
+        """平移网格中的一个器件，器件保持原来的添加顺序。只重新计算器件移动前后所在的网格
+        Move a waveguide of the grid, keeping its place in the order of addition. Only the cells of the waveguide
+        before and after the move are recomputed.
+        Args:
+            object: photfdtd.Waveguide object, a waveguide added with add_object
+            x, y, z: 沿各轴的平移量 the displacement along each axis, SI unit(m) if float or grid_spacing unit if int
+        """
+        index, boxes = self._take_object(object)
+        object.move(x, y, z)
+        self._put_object(object, index, boxes)
+
+    def replace_object(self, object: photfdtd.Waveguide, new_object: photfdtd.Waveguide):
+        """用另一个器件（例如参数修改后重新创建的器件）取代网格中的一个器件，新器件取代它在添加顺序中的位置。
+        只重新计算两个器件所在的网格
+        Replace a waveguide of the grid by another one, e.g. the same device created again with changed parameters.
+        The new waveguide takes the place of the old one in the order of addition. Only the cells of the two
+        waveguides are recomputed.
+        Args:
+            object: photfdtd.Waveguide object, a waveguide added with add_object
+            new_object: photfdtd.Waveguide object, the waveguide to put in its place
+        """
+        index, boxes = self._take_object(object)
+        self._put_object(new_object, index, boxes)
 
-            if internal_object == 0:
+    def _take_object(self, object):
+        """把一个器件的各部分从fdtd.Grid中注销（不修改介电常数）
+        Unregister the parts of a waveguide from the fdtd.Grid, without touching the permittivity.
+        Returns:
+            (index, boxes): 第一个部分在grid.objects中的位置，各部分在网格中的范围
+                            the position of the first part in grid.objects and the cells of every part
+        """
+        for n, (added, entries) in enumerate(self._added_objects):
+            if added is object:
+                break
+        else:
+            raise ValueError("%s has not been added to the grid" % object.name)
+        del self._added_objects[n]
+        index = len(self._grid.objects)
+        boxes = []
+        for entry in entries:
+            index = min(index, self._grid.objects.index(entry))
+            self._grid.objects.remove(entry)
+            if entry.name is not None and getattr(self._grid, entry.name, None) is entry:
+                delattr(self._grid, entry.name)
+            boxes.append(self._cells_of(entry))
+        return index, boxes
+
+    def _put_object(self, object, index, boxes):
+        """重新添加一个器件并把它的各部分放到grid.objects中的index处，然后重新计算boxes与器件所在的网格
+        Add a waveguide again, move its parts to position index of grid.objects and recompute the cells of boxes and
+        of the waveguide.
+        """
+        self.add_object(object)
+        entries = self._added_objects[-1][1]
+        del self._grid.objects[len(self._grid.objects) - len(entries):]
+        self._grid.objects[index:index] = entries
+        self._repaint(boxes + [self._cells_of(entry) for entry in entries])
+
+    def _cells_of(self, entry):
+        """grid.objects中的一项（解析形状或fdtd.Object）在网格中的范围 the cells of an entry of grid.objects"""
+        if isinstance(entry, Primitive):
+            cells = self._cell_coordinates() or tuple(np.arange(n) for n in (self._grid.Nx, self._grid.Ny,
+                                                                              self._grid.Nz))
+            lo, hi = entry.bounds
+            return tuple(slice(int(np.searchsorted(c, l)), int(np.searchsorted(c, h))) for c, l, h in zip(cells, lo, hi))
+        return entry.x, entry.y, entry.z
+
+    def _repaint(self, boxes):
+        """
+        重新计算网格的几个范围：恢复背景，再把与之重叠的器件按添加顺序写入，耗时只与范围的大小及其中的器件有关
+        Recompute parts of the grid: restore the background and write the objects overlapping them again in order of
+        addition. The time spent only depends on the size of the parts and the objects in them.
+        Args:
+            boxes: 各范围在网格中的切片(x, y, z) the (x, y, z) slices of the parts
+        """
+        # 合并重叠的范围 merge overlapping parts
+        merged = []
+        for box in boxes:
+            box = tuple(box)
+            if any(s.start >= s.stop for s in box):
                 continue
-            else:
-
-                self._check_parameters(object_to_check=internal_object)
-                self._grid[
-                internal_object.x: internal_object.x + internal_object.xlength,
-                internal_object.y: internal_object.y + internal_object.ylength,
-                internal_object.z: internal_object.z + internal_object.zlength,
-                ] = fdtd.Object(permittivity=self.background_index ** 2, name="deleted",
-                                background_index=internal_object.background_index,
-                                priority_matrix=internal_object.priority_matrix)
-                self._grid.objects.pop(internal_object)
-        return
+            while True:
+                for other in merged:
+                    if all(s.start < o.stop and o.start < s.stop for s, o in zip(box, other)):
+                        merged.remove(other)
+                        box = tuple(slice(min(s.start, o.start), max(s.stop, o.stop)) for s, o in zip(box, other))
+                        break
+                else:
+                    break
+            merged.append(box)
+
+        grid = self._grid
+        cells = self._cell_coordinates()
+        for box in merged:
+            background = self._background_permittivity
+            if bd.is_array(background) and background.ndim >= 3:
+                background = background[box]
+                if background.ndim == 3:
+                    background = background[..., None]
+            grid.inverse_permittivity[box] = 1 / bd.array(background, dtype=bd.float)
+            grid.priority[box] = 0
+            scene = Scene()
+            for entry in grid.objects:
+                if isinstance(entry, Primitive):
+                    scene.add(entry)
+                    continue
+                # 解析形状与fdtd.Object交替时保持添加顺序 keep the order where shapes and fdtd.Objects alternate
+                if len(scene):
+                    scene.paint(grid, cells, smoothing=self.subpixel_smoothing, part=box)
+                    scene = Scene()
+                if isinstance(entry, fdtd.Object):
+                    loc = tuple(slice(max(s.start, b.start), min(s.stop, b.stop))
+                                for s, b in zip((entry.x, entry.y, entry.z), box))
+                    if all(s.start < s.stop for s in loc):
+                        entry._write_region(loc)
+            scene.paint(grid, cells, smoothing=self.subpixel_smoothing, part=box)
 
     def set_PML(self,
                 pml_width=None,
@@ -294,17 +517,65 @@ class Grid:
                                         grid_spacing=self._grid.grid_spacing_y)[0]
         pml_width_z = self._handle_unit([pml_width_z],
                                         grid_spacing=self._grid.grid_spacing_z)[0]
+        # 设置了对称边界的低端不加PML no PML on a low face with a symmetry boundary
         if self._grid_xlength != 1 and pml_width_x is not None and pml_width_x > 0:
-            self._grid[0:pml_width_x, :, :] = fdtd.PML(name="pml_xlow")
-            self._grid[-pml_width_x:, :, :] = fdtd.PML(name="pml_xhigh")
+            if not hasattr(self._grid, "symmetry_xlow"):
+                self._grid[self._to_cells((slice(0, pml_width_x), slice(None), slice(None)))] = fdtd.PML(name="pml_xlow")
+            self._grid[self._to_cells((slice(-pml_width_x, None), slice(None), slice(None)))] = fdtd.PML(name="pml_xhigh")
         if self._grid_ylength != 1 and pml_width_y is not None and pml_width_y > 0:
-            self._grid[:, 0:pml_width_y, :] = fdtd.PML(name="pml_ylow")
-            self._grid[:, -pml_width_y:, :] = fdtd.PML(name="pml_yhigh")
+            if not hasattr(self._grid, "symmetry_ylow"):
+                self._grid[self._to_cells((slice(None), slice(0, pml_width_y), slice(None)))] = fdtd.PML(name="pml_ylow")
+            self._grid[self._to_cells((slice(None), slice(-pml_width_y, None), slice(None)))] = fdtd.PML(name="pml_yhigh")
         if self._grid_zlength != 1 and pml_width_z is not None and pml_width_z > 0:
-            self._grid[:, :, 0:pml_width_z] = fdtd.PML(name="pml_zlow")
-            self._grid[:, :, -pml_width_z:] = fdtd.PML(name="pml_zhigh")
+            if not hasattr(self._grid, "symmetry_zlow"):
+                self._grid[self._to_cells((slice(None), slice(None), slice(0, pml_width_z)))] = fdtd.PML(name="pml_zlow")
+            self._grid[self._to_cells((slice(None), slice(None), slice(-pml_width_z, None)))] = fdtd.PML(name="pml_zhigh")
         self.flag_PML_not_set = False
 
+    def set_symmetry(self,
+                     x: str = None,
+                     y: str = None,
+                     z: str = None) -> None:
+        """
+        在网格的低端（索引0处）设置镜像对称边界，只仿真结构的一半（或四分之一），网格数和运行时间相应减少。
+        结构、光源和监视器只放在对称面的高端一侧，对称面穿过索引0处的电场格点。
+        Set mirror symmetry boundaries on the low faces (index 0) of the grid. Only the half (or quarter) of a
+        symmetric structure on the high side of the plane is simulated, which cuts the number of cells and the run
+        time proportionally. The plane goes through the E-points of index 0, the PML of that face is removed.
+        @param x: x=0处的对称性: "symmetric"（PMC，切向电场为偶函数）或"antisymmetric"（PEC，切向电场为零），
+            None为不设置
+            Symmetry of the plane x=0: "symmetric" (PMC, even tangential E) or "antisymmetric" (PEC, zero tangential
+            E). None for no symmetry plane.
+        @param y: y=0处的对称性 symmetry of the plane y=0
+        @param z: z=0处的对称性 symmetry of the plane z=0
+        @return: None
+        Note:
+            光源的场必须满足对应的对称性。监视器得到的通量等只是被仿真部分的结果，例如一个对称面时总通量为其两倍。
+            The field of the sources must have the same parity. Fluxes etc. of the detectors only cover the simulated
+            part, e.g. the total flux is twice as large for one symmetry plane.
+        Example:
+            # 以x=0为中心的波导，y偏振基模的Ey关于x=0是偶函数，x偏振基模的切向分量是奇函数
+            # waveguide centered at x=0: Ey of the y-polarized fundamental mode is even about x=0, the
+            # tangential components of the x-polarized one are odd
+            grid.set_symmetry(x="symmetric")  # y偏振 y-polarized
+            grid.set_symmetry(x="antisymmetric")  # x偏振 x-polarized
+        """
+        for axis, symmetry in enumerate((x, y, z)):
+            if symmetry is None:
+                continue
+            name = "xyz"[axis]
+            if (self._grid_xlength, self._grid_ylength, self._grid_zlength)[axis] == 1:
+                raise ValueError("Cannot set a symmetry boundary along %s, the grid has only one cell along it" % name)
+            # 去掉已有的低端PML remove the low PML if it has been set already
+            pml = getattr(self._grid, "pml_%slow" % name, None)
+            if pml is not None:
+                self._grid.boundaries.remove(pml)
+                delattr(self._grid, pml.name)
+                delattr(self._grid, "_%slow_boundary" % name)
+            key = [slice(None)] * 3
+            key[axis] = 0
+            self._grid[tuple(key)] = fdtd.SymmetryBoundary(symmetry=symmetry, name="symmetry_%slow" % name)
+
     def set_source(
             self,
             source_type: str = "pointsource",
@@ -332,12 +603,16 @@ class Grid:
             x_end: int or float = None,
             y_end: int or float = None,
             z_end: int or float = None,
-            axis: str = "y"
+            axis: str = "y",
+            mode: dict = None,
+            mode_index: int = 0,
+            direction: str = "+"
     ):
         """
         Set a source in the grid.
         Args:
-            source_type (str): 光源种类：点或线或面。Source type: "pointsource", "linesource", "planesource".
+            source_type (str): 光源种类：点、线、面、模式或全场/散射场光源。
+                Source type: "pointsource", "linesource", "planesource", "modesource", "tfsf".
             wavelength (float): 波长(m)。Wavelength in meters.
             period (float): 周期。Period of the source.
             amplitude (float): 振幅。Amplitude of the source.
@@ -366,6 +641,18 @@ class Grid:
             ylength (int or float): 面光源y方向长度。Cross length in y direction for plane source.
             zlength (int or float): 面光源z方向长度。Cross length in z direction for plane source.
             axis (str): 面光源的传播方向。Propagation axis for plane source. Options: "x", "y", "z".
+            mode (dict): 模式光源的模式，即Solve.calculate_mode（或Solve.read_mode）返回的字典，截面为整个仿真区域的截面，
+                其轴为传播方向，光源放在x、y或z中沿该轴的位置处。
+                Modes of the mode source, the dict returned by Solve.calculate_mode (or Solve.read_mode) on the whole
+                cross-section of the grid. Its axis is the propagation axis, the source is placed at x, y or z along it.
+            mode_index (int): 模式光源注入的模式序号。Index of the mode injected by the mode source.
+            direction (str): 模式光源的传播方向，"+"或"-"，另一侧没有光。
+                Direction of the mode source, "+" or "-" along the axis; no light goes the other way.
+                全场/散射场光源（"tfsf"）的平面波同样沿axis的direction方向传播，盒子由x、y、z与xlength、ylength、zlength
+                （长度为0时盒子占满该方向）或x_start、x_end等给出。
+                The plane wave of a total-field/scattered-field source ("tfsf") travels along direction of axis as well,
+                its box is given by x, y, z and xlength, ylength, zlength (a length of 0 spans the whole grid) or by
+                x_start, x_end etc.
         Note:
             Knowable bug: spectrum may not be correctly generated when pulselength is too short.
             已知bug：当脉冲长度过短时，频谱可能无法正确生成。
@@ -405,9 +692,10 @@ class Grid:
             # y = y + ylength // 2
             # z = z + zlength // 2
             self._check_parameters(x, x, y, y, z, z)
-            self._grid[x, y, z] = fdtd.PointSource(period=period, amplitude=amplitude, phase_shift=phase_shift,
-                                                   name=name, cycle=cycle, hanning_dt=hanning_dt, pulse_type=pulse_type,
-                                                   pulse_length=pulse_length, offset=offset, polarization=polarization)
+            self._grid[self._to_cells((x, y, z))] = fdtd.PointSource(
+                period=period, amplitude=amplitude, phase_shift=phase_shift, name=name, cycle=cycle,
+                hanning_dt=hanning_dt, pulse_type=pulse_type, pulse_length=pulse_length, offset=offset,
+                polarization=polarization)
 
         elif source_type == "linesource":  # 创建一个线光源
 
@@ -426,25 +714,13 @@ class Grid:
 
             self._check_parameters(x_start, x_end, y_start, y_end, z_start, z_end, name=name)
             if self._grid_zlength == 1:
-                self._grid[x_start: x_end, y_start: y_end] = fdtd.LineSource(period=period, amplitude=amplitude,
-                                                                             phase_shift=phase_shift, name=name,
-                                                                             pulse_type=pulse_type, cycle=cycle,
-                                                                             pulse_length=pulse_length,
-                                                                             offset=offset,
-                                                                             waveform=waveform,
-                                                                             polarization=polarization)
+                location = self._to_cells((slice(x_start, x_end), slice(y_start, y_end)))
             else:
-                self._grid[x_start: x_end, y_start: y_end, z_start: z_end] = fdtd.LineSource(period=period,
-                                                                                             amplitude=amplitude,
-                                                                                             phase_shift=phase_shift,
-                                                                                             name=name,
-                                                                                             pulse_type=pulse_type,
-                                                                                             cycle=cycle,
-                                                                                             pulse_length=pulse_length,
-                                                                                             offset=offset,
-                                                                                             waveform=waveform,
-                                                                                             polarization=polarization)
-
+                location = self._to_cells((slice(x_start, x_end), slice(y_start, y_end), slice(z_start, z_end)))
+            self._grid[location] = fdtd.LineSource(period=period, amplitude=amplitude, phase_shift=phase_shift,
+                                                   name=name, pulse_type=pulse_type, cycle=cycle,
+                                                   pulse_length=pulse_length, offset=offset, waveform=waveform,
+                                                   polarization=polarization)
 
         elif source_type == "planesource":
             x = x - xlength // 2
@@ -454,23 +730,58 @@ class Grid:
 
             if axis == "x":
                 self._check_parameters(x, x, y, y + ylength, z, z + zlength, name=name)
-                self._grid[x: x, y: y + ylength, z: z + zlength] = \
+                self._grid[self._to_cells((slice(x, x), slice(y, y + ylength), slice(z, z + zlength)))] = \
                     fdtd.PlaneSource(period=period, amplitude=amplitude, phase_shift=phase_shift, name=name,
                                      waveform=waveform, polarization=polarization, pulse_type=pulse_type,
                                      pulse_length=pulse_length, offset=offset, axis=axis)
             elif axis == "y":
                 self._check_parameters(x, x + xlength, y, y, z, z + zlength, name=name)
-                self._grid[x: x + xlength, y: y, z: z + zlength] = \
+                self._grid[self._to_cells((slice(x, x + xlength), slice(y, y), slice(z, z + zlength)))] = \
                     fdtd.PlaneSource(period=period, amplitude=amplitude, phase_shift=phase_shift, name=name,
                                      waveform=waveform, polarization=polarization, pulse_type=pulse_type,
                                      pulse_length=pulse_length, offset=offset, axis=axis)
             elif axis == "z":
                 self._check_parameters(x, x + xlength, y, y + ylength, z, z, name=name)
-                self._grid[x: x + xlength, y: y + ylength, z: z] = \
+                self._grid[self._to_cells((slice(x, x + xlength), slice(y, y + ylength), slice(z, z)))] = \
                     fdtd.PlaneSource(period=period, amplitude=amplitude, phase_shift=phase_shift, name=name,
                                      waveform=waveform, polarization=polarization, pulse_type=pulse_type,
                                      pulse_length=pulse_length, offset=offset, axis=axis)
 
+        elif source_type == "modesource":
+            # 模式光源：注入截面上的模式，只向direction方向传播
+            # mode source: injects the mode of the cross-section, which only travels along direction
+            if mode is None:
+                raise ValueError("please set the mode of the mode source, e.g. the dict returned by "
+                                 "Solve.calculate_mode")
+            n = "xyz".index(mode["axis"])
+            key = [slice(None)] * 3
+            key[n] = (x, y, z)[n]
+            self._grid[self._to_cells(tuple(key))] = fdtd.ModeSource(
+                mode=mode, mode_index=mode_index, direction=direction, period=period, amplitude=amplitude,
+                phase_shift=phase_shift, name=name, pulse_type=pulse_type, cycle=cycle, pulse_length=pulse_length,
+                offset=offset)
+
+        elif source_type == "tfsf":
+            # 全场/散射场光源：盒子内为总场（入射平面波加散射场），盒子外只有散射场；长度为0的方向盒子占满整个仿真区域
+            # total-field/scattered-field source: the box holds the total field, outside of it only the scattered
+            # field remains; along an axis of length 0 the box spans the whole grid
+            box = []
+            for length, center, start, end, size in ((xlength, x, x_start, x_end, self._grid_xlength),
+                                                     (ylength, y, y_start, y_end, self._grid_ylength),
+                                                     (zlength, z, z_start, z_end, self._grid_zlength)):
+                if start is not None and end is not None:
+                    box.append(slice(start, end))
+                elif length:
+                    box.append(slice(center - length // 2, center - length // 2 + length))
+                else:
+                    box.append(slice(0, size))
+            self._check_parameters(box[0].start, box[0].stop, box[1].start, box[1].stop, box[2].start,
+                                   box[2].stop, name=name)
+            self._grid[self._to_cells(tuple(box))] = fdtd.TFSFSource(
+                period=period, amplitude=amplitude, phase_shift=phase_shift, name=name, polarization=polarization,
+                axis=axis, direction=direction, pulse_type=pulse_type, cycle=cycle, pulse_length=pulse_length,
+                offset=offset)
+
         else:
             raise ValueError("Invalid source type.")
 
@@ -525,12 +836,12 @@ class Grid:
             source_profile = found_source.profile
             size = len(found_source.profile)
             source_field = bd.zeros((time, size, 3))
-        elif isinstance(found_source, fdtd.PointSource):
-            print("This is a Pointsource")
+        elif isinstance(found_source, (fdtd.PointSource, fdtd.TFSFSource)):
+            print(f"This is a {type(found_source).__name__}")
             source_profile = found_source.sim_amplitude
             size = 1
             source_field = bd.zeros((time, size, 3))
-        elif isinstance(found_source, fdtd.PlaneSource):
+        elif isinstance(found_source, (fdtd.PlaneSource, fdtd.ModeSource)):
             print("This is a Planesource")
             # TODO: To be finished
             source_profile = found_source.profile
@@ -538,34 +849,18 @@ class Grid:
             source_field = bd.zeros((time, shape[0], shape[1], shape[2], 3))
 
         _Epol = 'xyz'.index(found_source.polarization)
-        for q in range(time):
-            if found_source.pulse_type == "hanning":
-                t1 = int(2 * bd.pi / (found_source.frequency * found_source.pulse_length / found_source.cycle))
-                if q < t1:
-                    vect = source_profile * fdtd.waveforms.hanning(
-                        found_source.frequency, q * found_source.pulse_length, found_source.cycle
-                    )
-                else:
-                    # src = - self.grid.E[self.x, self.y, self.z, 2]
-                    vect = source_profile * 0
-            elif found_source.pulse_type == "gaussian":
-                vect = source_profile * fdtd.waveforms.pulse_oscillation(frequency=found_source.frequency,
-                                                                         t=q * found_source.grid.time_step,
-                                                                         pulselength=found_source.pulse_length,
-                                                                         offset=found_source.offset)
-            else:
-                angle = bd.asarray(2 * bd.pi * q / found_source.period + found_source.phase_shift)
-                vect = source_profile * bd.sin(angle)
-
-            if isinstance(found_source, fdtd.PlaneSource):
-                source_field[q, :, :, :, _Epol] = bd.array(vect)
-            else:
-                source_field[q, :, _Epol] = bd.array(vect)
+        # 光源的时域波形，如果仿真已运行过这些时间步，直接读取运行时预先计算的波形
+        # the waveform of the source, read from the series precomputed by the run if it covers these time steps
+        waveform = found_source.signal(np.arange(time))
+        if isinstance(found_source, (fdtd.PlaneSource, fdtd.ModeSource)):
+            source_field[..., _Epol] = bd.array(waveform[:, None, None, None] * bd.numpy(source_profile)[None])
+        else:
+            source_field[..., _Epol] = bd.array(waveform[:, None] * np.reshape(bd.numpy(source_profile), (1, -1)))
 
         # convert to world E
         source_field = conversions.simE_to_worldE(source_field)
         # Spectrum
-        if isinstance(found_source, fdtd.PlaneSource):
+        if isinstance(found_source, (fdtd.PlaneSource, fdtd.ModeSource)):
             fr = fdtd.FrequencyRoutines(self._grid, objs=source_field[:, int(shape[0] / 2), int(shape[1] / 2),
                                                          int(shape[2] / 2), _Epol])
         else:
@@ -597,7 +892,7 @@ class Grid:
             axes[0][0].set_ylabel(f"E{conversions.number_to_letter(_Epol)} (V/m)")
             axes[0][0].set_title(f"Space distribution")
             axes[0][0].legend(["Source Profile"])
-        elif isinstance(found_source, fdtd.PlaneSource):
+        elif isinstance(found_source, (fdtd.PlaneSource, fdtd.ModeSource)):
             # 选择方向
             shape = source_profile.shape
 
@@ -628,7 +923,7 @@ class Grid:
         # 右侧子图: Time Signal 图
         time = bd.numpy(time)
         source_field = bd.numpy(source_field)
-        if isinstance(found_source, fdtd.PlaneSource):
+        if isinstance(found_source, (fdtd.PlaneSource, fdtd.ModeSource)):
             axes[0][1].plot(time, source_field[:, int(shape[0] / 2), int(shape[1] / 2), int(shape[2] / 2), 0],
                             label="Ex")
             axes[0][1].plot(time, source_field[:, int(shape[0] / 2), int(shape[1] / 2), int(shape[2] / 2), 1],
@@ -681,15 +976,19 @@ class Grid:
                      zlength: int or float = 1,
                      name: str = 'detector',
                      axis: str = None,
+                     flush_interval: int = 1000,
+                     wavelengths: list = None,
                      ):
         """
         Adding detectors
-        @param detector_type: 'blockdetector' or 'linedetector'
+        @param detector_type: 'blockdetector', 'linedetector' or 'dftdetector'
         @param x_start, y_start, z_start, x_end, y_end, z_end: parameters for 'linedetector'
-        @param x, y, z: center position, parameters for 'blockdetector'
-        @param xlength, ylength, zlength: cross length, parameters for 'blockdetector'
+        @param x, y, z: center position, parameters for 'blockdetector' and 'dftdetector'
+        @param xlength, ylength, zlength: cross length, parameters for 'blockdetector' and 'dftdetector'
         @param name:
-        @param axis: "x", "y", "z", only for blockdetector
+        @param axis: "x", "y", "z", only for blockdetector and dftdetector (normal of the detector)
+        @param flush_interval: number of time steps kept in memory before they are written to the h5 file
+        @param wavelengths: 频域监视器的波长列表 wavelengths of the running Fourier transform, only for dftdetector
         @return: None
         """
 
@@ -727,9 +1026,10 @@ class Grid:
                 z_end = z + zlength
 
             self._check_parameters(x_start, x_end, y_start, y_end, z_start, z_end, name=name)
-            self._grid[x_start: x_end, y_start: y_end, z_start: z_end] = fdtd.LineDetector(name=name)
+            location = self._to_cells((slice(x_start, x_end), slice(y_start, y_end), slice(z_start, z_end)))
+            self._grid[location] = fdtd.LineDetector(name=name, flush_interval=flush_interval)
 
-        elif detector_type == 'blockdetector':
+        elif detector_type in ('blockdetector', 'dftdetector'):
 
             if not axis:
                 # Tell which dimension to draw automatically
@@ -741,21 +1041,25 @@ class Grid:
             x -= int(xlength / 2)
             y -= int(ylength / 2)
             z -= int(zlength / 2)
+            if detector_type == 'dftdetector':
+                detector = fdtd.DFTDetector(name=name, wavelengths=wavelengths, axis=axis)
+            else:
+                detector = fdtd.BlockDetector(name=name, axis=axis, flush_interval=flush_interval)
             if axis == "x":
                 self._check_parameters(x, x, y, y + ylength, z, z + zlength, name=name)
-                self._grid[x: x,
-                y: y + ylength,
-                z: z + zlength] = fdtd.BlockDetector(name=name, axis=axis)
+                self._grid[self._to_cells((slice(x, x),
+                                          slice(y, y + ylength),
+                                          slice(z, z + zlength)))] = detector
             elif axis == "y":
                 self._check_parameters(x, x + xlength, y, y, z, z + zlength, name=name)
-                self._grid[x: x + xlength,
-                y: y,
-                z: z + zlength] = fdtd.BlockDetector(name=name, axis=axis)
+                self._grid[self._to_cells((slice(x, x + xlength),
+                                          slice(y, y),
+                                          slice(z, z + zlength)))] = detector
             elif axis == "z":
                 self._check_parameters(x, x + xlength, y, y + ylength, z, z, name=name)
-                self._grid[x: x + xlength,
-                y: y + ylength,
-                z: z] = fdtd.BlockDetector(name=name, axis=axis)
+                self._grid[self._to_cells((slice(x, x + xlength),
+                                          slice(y, y + ylength),
+                                          slice(z, z)))] = detector
         else:
             raise ValueError("Invalid detector type.")
 
@@ -813,16 +1117,51 @@ class Grid:
             time=None,
             save=True,
             animate: bool = False,
-            interval=100
+            interval=100,
+            engine: str = "default",
+            processes: int = 1,
+            split: str = "z",
+            shutoff: float = None,
+            shutoff_interval: int = 100,
+            shutoff_detectors: list = None,
+            checkpoint_interval: int = None,
+            resume_from: str = None
             ):
         """
-        @param time: int for timesteps or float for seconds
+        @param time: int for timesteps or float for seconds. 设置shutoff时为最长时间 the maximum time if shutoff is set
         @param save: Bool: save the grid?
         @param animate: Bool: 是否生成动画？ ffmpeg required
         @param interval: Int: animation interval每隔多少个时间步保存一次图
+        @param engine: Str: 场更新引擎。"default"、"inplace"（复用预分配缓冲区，时间循环中不分配内存）或 "jit"（numba 编译，需要 numba）
+            Field update engine. "default", "inplace" (reuses preallocated buffers, no allocation in the time loop)
+            or "jit" (compiled with numba, numba required)
+        @param processes: Int: 并行进程数，大于1时将网格分块到多个进程中计算（仅 numpy 后端）
+            Number of processes. If larger than 1, the grid is decomposed over several processes (numpy backend only)
+        @param split: Str: 分块方向，如 "z"（分片）或 "xz"（分柱）
+            Axes along which the grid is split, e.g. "z" (slabs) or "xz" (pencils)
+        @param shutoff: Float: 场能量衰减到峰值的shutoff倍以下时提前结束仿真（如1e-5），监视器的h5文件截断到实际的时间步数。
+            None为运行全部时间
+            Stop as soon as the field energy has decayed below shutoff times its peak (e.g. 1e-5), the h5 files of the
+            detectors are truncated to the time steps run. None to always run the whole time
+        @param shutoff_interval: Int: 每隔多少个时间步检查一次场能量 number of time steps between two checks of the energy
+        @param shutoff_detectors: List: 检查这些监视器（名称）处的能量，None为整个仿真区域
+            names of the detectors at which the energy is checked, None for the whole grid
+        @param checkpoint_interval: Int: 每隔多少个时间步在folder/checkpoint.h5保存一次检查点，None为不保存
+            Save a checkpoint to folder/checkpoint.h5 every checkpoint_interval time steps, None for no checkpoints
+        @param resume_from: Str: 从检查点文件继续仿真。网格（结构、光源、监视器）须与保存检查点时相同，time仍从最初开始计算
+            Checkpoint file to continue the run from. The grid (structures, sources, detectors) must be set up as when the
+            checkpoint was saved, time still counts from the start of the original run
+        Example:
+            grid.run(checkpoint_interval=2000)
+            # 中断后，重新运行相同的脚本并 after a crash, run the same script again with
+            grid.run(checkpoint_interval=2000, resume_from=grid.folder + "/checkpoint.h5")
         """
         if time is None:
             time = self._calculate_time()
+            if shutoff is not None:
+                # 估计的时间对谐振器件可能不够，由能量衰减决定何时结束
+                # the estimate may be too short for resonant devices, the decay of the energy decides when to stop
+                time *= 10
 
         self._grid.animate = animate
 
@@ -830,7 +1169,9 @@ class Grid:
             time = self._grid._handle_time(time)
         print("The total time for FDTD simulation is %i timesteps or %f fs." % (
             time, time * self._grid.time_step * 1e15))
-        self._grid.run(total_time=time, interval=interval)
+        self._grid.run(total_time=time, interval=interval, engine=engine, processes=processes, split=split,
+                       shutoff=shutoff, shutoff_interval=shutoff_interval, shutoff_detectors=shutoff_detectors,
+                       checkpoint_interval=checkpoint_interval, resume_from=resume_from)
 
         if save:
             self.save_simulation()
@@ -917,6 +1258,8 @@ class Grid:
                                grid=None) -> None:
         """
         Calculate transmission spectrum, detector required.
+        如果两个监视器都是频域监视器（dftdetector），透射率由它们的功率谱之比给出。
+        If both detectors are DFT detectors ('dftdetector'), the transmission is the ratio of their power spectra.
 
         @param detector_name: The name of detector whose data will be calculated, can be None if there is only 1 detector in grid.
         @param source_name: The name of source whose data will be calculated, can be None if there is only 1 source in grid.
@@ -929,11 +1272,18 @@ class Grid:
         @param save_to_txt: Optional: Default to True
         @param grid: Optinal: photfdtd.Grid instance
         """
+        if grid is None:
+            grid = self
+        detectors = {detector.name: detector for detector in grid._grid.detectors}
+        if isinstance(detectors.get(detector_name_1), fdtd.DFTDetector) and \
+                isinstance(detectors.get(detector_name_2), fdtd.DFTDetector):
+            # 频域监视器：透射率为两个监视器的功率之比
+            # DFT detectors: the transmission is the ratio of the power through both detectors
+            return self._calculate_Transmission_dft(detectors[detector_name_1], detectors[detector_name_2],
+                                                    save_to_txt=save_to_txt, grid=grid)
         # Spectrum
         # TODO: Not finished yet. Not sure if the right way has been used. Or if it's not that complex?
         return
-        if grid is None:
-            grid = self
         source, _, source_spectrum = self.source_data()
         source_spectrum = abs(source_spectrum)
         # True先对坡印廷矢量傅里叶变换再积分
@@ -1031,6 +1381,30 @@ class Grid:
                        delimiter='\t',
                        header='Wavelength (um)\tTransmission', comments='')
 
+    def _calculate_Transmission_dft(self, detector_1, detector_2, save_to_txt=True, grid=None):
+        """
+        Transmission spectrum from two DFT detectors (see fdtd.DFTDetector)
+        @param detector_1: the input detector
+        @param detector_2: the output detector
+        @return: wavelengths [m], transmission
+        """
+        if list(detector_1.wavelengths) != list(detector_2.wavelengths):
+            raise ValueError("Both DFT detectors should monitor the same wavelengths")
+        wavelengths = np.array(detector_1.wavelengths)
+        Transmission = np.abs(detector_2.flux()) / np.abs(detector_1.flux())
+
+        plt.plot(wavelengths * 1e6, Transmission)
+        plt.xlabel('wavelength (um)')
+        plt.ylabel('Normalized transmission')
+        plt.title("Transmission")
+        plt.savefig(os.path.join(grid.folder, f"Transmission_{detector_1.name}_{detector_2.name}.png"))
+        plt.close()
+
+        if save_to_txt:
+            np.savetxt('%s/Transmission.txt' % grid.folder, np.column_stack((wavelengths * 1e6, Transmission)),
+                       fmt='%f', delimiter='\t', header='Wavelength (um)\tTransmission', comments='')
+        return wavelengths, Transmission
+
     def calculate_Transmission_old(self,
                                    detector_name_1: str = None,
                                    detector_name_2: str = None,
@@ -65,7 +65,7 @@ class IntercoreCoupling:
                 print(f"纤芯{self.m}的模式 {i+1} 和 纤芯{self.n}的模式 {j+1} 之间的耦合系数 (k{self.m}{self.n}): {coupling}")
 
     @staticmethod
-    def calculate_modes(foldername, fiber, background_index, neigs):
+    def calculate_modes(foldername, fiber, background_index, neigs, cache=None):
         grid = Grid(
             grid_xlength=125e-6, grid_ylength=125e-6, grid_zlength=1, grid_spacing=500e-9,
             permittivity=background_index ** 2, foldername=foldername
@@ -80,7 +80,8 @@ class IntercoreCoupling:
 
         data = solve.calculate_mode(
             lam=1550e-9, neff=1.4504, neigs=neigs, x_boundary_low="pml", y_boundary_low="pml",
-            x_boundary_high="pml", y_boundary_high="pml", background_index=background_index
+            x_boundary_high="pml", y_boundary_high="pml", background_index=background_index,
+            cache=cache
         )
         Solve.draw_mode(filepath=solve.filepath, data=data, content="real_part",number=50)
 
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+# 缓存格式版本，模式求解或保存格式改变时递增，使旧的缓存失效
+CACHE_VERSION = 1
+
+
+class ModeCache:
+    """
+    模式求解结果的磁盘缓存。键是截面折射率分布、网格间距、波长、边界设置和neigs等的哈希，值是calculate_mode返回的字典，
+    以Solve.save_mode的npz格式保存，可以用Solve.read_mode读取。超过容量上限时删除最久未使用的结果（LRU）。
+    On-disk cache of mode solutions. The key is a hash of the refractive index of the cross-section, the grid spacings,
+    the wavelength, the boundary settings, neigs etc., the value is the dict returned by Solve.calculate_mode, stored
+    in the npz format of Solve.save_mode (readable by Solve.read_mode). The least recently used results are evicted
+    when the cache exceeds its size cap.
+    """
+
+    def __init__(self,
+                 folder: str = None,
+                 max_size: int = 1024 ** 3):
+        """
+        @param folder: 缓存文件夹，默认为环境变量PHOTFDTD_MODE_CACHE或~/.cache/photfdtd/modes
+        @param max_size: 缓存容量上限（字节）
+        """
+        if folder is None:
+            folder = os.environ.get("PHOTFDTD_MODE_CACHE",
+                                    os.path.join(os.path.expanduser("~"), ".cache", "photfdtd", "modes"))
+        self.folder = folder
+        self.max_size = max_size
+        os.makedirs(self.folder, exist_ok=True)
+
+    @staticmethod
+    def key(n, **settings) -> str:
+        """
+        计算缓存键
+        @param n: 截面折射率分布
+        @param settings: 其余影响求解结果的参数，如lam, neff, neigs, 边界类型与厚度
+        @return: 十六进制哈希字符串
+        """
+        n = np.ascontiguousarray(n)
+        h = hashlib.sha256()
+        h.update(("v%i %s %s" % (CACHE_VERSION, n.dtype.str, n.shape)).encode())
+        h.update(n.tobytes())
+        for name in sorted(settings):
+            value = settings[name]
+            if isinstance(value, (float, np.floating)):
+                value = float(value).hex()
+            h.update(("%s=%r;" % (name, value)).encode())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, key + ".npz")
+
+    def get(self, key: str):
+        """
+        读取缓存的模式，不存在时返回None
+        """
+        filepath = self._path(key)
+        try:
+            readings = np.load(filepath, allow_pickle=True)
+            data = {}
+            for name in readings.files:
+                value = readings[name]
+                # np.savez把标量保存为0维数组
+                data[name] = value.item() if value.ndim == 0 else value
+            readings.close()
+        except (OSError, ValueError, EOFError):
+            return None
+        # 更新访问时间，用于LRU
+        try:
+            os.utime(filepath)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, dic: dict):
+        """
+        保存模式（先写入临时文件再重命名，多个脚本同时使用缓存也是安全的），然后按容量上限清理
+        """
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.folder)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **dic)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        删除最久未使用的结果直到缓存大小不超过max_size
+        """
+        entries = []
+        for name in os.listdir(self.folder):
+            if not name.endswith(".npz"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.folder, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(entry[1] for entry in entries)
+        for mtime, size, name in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        """
+        清空缓存
+        """
+        for name in os.listdir(self.folder):
+            if name.endswith(".npz"):
+                os.remove(os.path.join(self.folder, name))
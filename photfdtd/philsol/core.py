@@ -25,9 +25,68 @@ def calculate_s(vect, k0=None, n=1, sigmaE_max=None):
     return 1 - 1j * sigmaE / (omega * constants.eps0 * n ** 2)
 
 
+def eigen_operators(n, dx, dy):
+    """
+    与波长无关的部分：有限差分算子和介电常数对角阵，可在多个波长之间复用
+    The wavelength independent part of eigen_build: the finite difference operators and the permittivity
+    diagonals. They can be reused for several wavelengths, see eigen_build(operators=...).
+    @param n: 折射率
+    @param dx: x方向单位长度（um）
+    @param dy: y方向单位长度（um）
+    @return: dict
+    """
+    # lets find out size of grid and construct some finite difference operators
+    # It's important to transpose nx and ny
+    nx, ny, dummy = np.shape(n)
+    print('Assembling matrix for {} grid points...\n'.format(nx * ny))
+
+    # construct finite difference operators single row of FD grid
+    # Ax_temp = ( - bd.eye(nx, k = 0) + bd.eye(nx, k = 1) ) / dx
+    # Ax = sps.block_diag([Ax_temp for i in range(ny)], format='csr')
+    Ax = (- sps.eye(nx * ny, k=0, format="csr") + sps.eye(nx * ny, k=1, format="csr")) / dx
+    Ay = (- sps.eye(nx * ny, k=0, format="csr") + sps.eye(nx * ny, k=nx, format="csr")) / dy
+
+    # We then build relative permitivity tensors, flattened with x running fastest (Fortran order)
+    # (in double precision, Solve passes the index as float16)
+    epsx = n[:, :, 0].ravel(order='F').astype(np.float64) ** 2
+    epsy = n[:, :, 1].ravel(order='F').astype(np.float64) ** 2
+    epszi = 1. / n[:, :, 2].ravel(order='F').astype(np.float64) ** 2
+    # 把eps展成了一维数组，再用spdiags把它们放在对角线上
+
+    epsx = sps.spdiags(epsx, 0, nx * ny, nx * ny, format='csr')
+    epsy = sps.spdiags(epsy, 0, nx * ny, nx * ny, format='csr')
+    epszi = sps.spdiags(epszi, 0, nx * ny, nx * ny, format='csr')
+
+    return {'nx': nx, 'ny': ny, 'Ax': Ax, 'Ay': Ay, 'epsx': epsx, 'epsy': epsy, 'epszi': epszi}
+
+
+def _k0_terms(operators, dtype):
+    """
+    没有pml时 P = k0^2 * T2 + T0 + T_2 / k0^2，三项都与波长无关，缓存在operators中
+    Without pml, P = k0^2 * T2 + T0 + T_2 / k0^2 with wavelength independent terms, which are cached in
+    the operators.
+    """
+    key = ('terms', np.dtype(dtype).str)
+    if key not in operators:
+        Ax, Ay = operators['Ax'].astype(dtype), operators['Ay'].astype(dtype)
+        Cx, Cy = - Ax.transpose(), - Ay.transpose()
+        epsx, epsy, epszi = operators['epsx'], operators['epsy'], operators['epszi']
+        AezCx, AezCy = Ax * epszi * Cx, Ax * epszi * Cy
+        BezCx, BezCy = Ay * epszi * Cx, Ay * epszi * Cy
+        CxAx, CxAy, CyAx, CyAy = Cx * Ax, Cx * Ay, Cy * Ax, Cy * Ay
+        # Pxx, Pxy, Pyx and Pyy of eigen_build expanded in powers of k0
+        T2 = sps.block_diag([epsx, epsy])
+        T0 = sps.bmat([[CyAy + AezCx * epsx, AezCy * epsy - CyAx],
+                       [BezCx * epsx - CxAy, CxAx + BezCy * epsy]])
+        T_2 = sps.bmat([[AezCx * CyAy - AezCy * CxAy, AezCy * CxAx - AezCx * CyAx],
+                        [BezCx * CyAy - BezCy * CxAy, BezCy * CxAx - BezCx * CyAx]])
+        operators[key] = (T2.tocsr().astype(dtype), T0.tocsr(), T_2.tocsr())
+    return operators[key]
+
+
 def eigen_build(k0, n, dx, dy, x_boundary_low=None, y_boundary_low=None, x_thickness_low=0, y_thickness_low=0,
                 x_boundary_high=None, y_boundary_high=None, x_thickness_high=0, y_thickness_high=0,
-                background_index=1):
+                background_index=1, operators=None):
     """
 
     @param k0: 波矢（单位um）
@@ -37,6 +96,8 @@ def eigen_build(k0, n, dx, dy, x_boundary_low=None, y_boundary_low=None, x_thick
     @param x_boundary: x边界条件 str = "zero", "pml"
     @param y_boundary: y边界条件
     @param thickness: 边界厚度
+    @param operators: Optional: eigen_operators(n, dx, dy)的结果，扫描波长时复用
+        result of eigen_operators(n, dx, dy), reused when sweeping the wavelength
     @return:
     """
     # TODO: 周期边界条件、对称边界条件
@@ -50,18 +111,12 @@ def eigen_build(k0, n, dx, dy, x_boundary_low=None, y_boundary_low=None, x_thick
     y_boundary_low, y_boundary_high = y_thickness_low, y_thickness_high, y_boundary_low, y_boundary_high, \
                                       x_thickness_low, x_thickness_high, x_boundary_low, x_boundary_high
 
-    # lets find out size of grid and construct some finite difference operators
-    # These can take different forms depending on the user inputed boundarys
-    # These operators also need boundaries
-    # It's important to transpose nx and ny
-    nx, ny, dummy = np.shape(n)
-    print('Assembling matrix for {} grid points...\n'.format(nx * ny))
-
-    # construct finite difference operators single row of FD grid
-    # Ax_temp = ( - bd.eye(nx, k = 0) + bd.eye(nx, k = 1) ) / dx
-    # Ax = sps.block_diag([Ax_temp for i in range(ny)], format='csr')
-    Ax = (- sps.eye(nx * ny, k=0, format="csr") + sps.eye(nx * ny, k=1, format="csr")) / dx
-    Ay = (- sps.eye(nx * ny, k=0, format="csr") + sps.eye(nx * ny, k=nx, format="csr")) / dy
+    # The finite difference operators and the permittivity do not depend on the wavelength
+    if operators is None:
+        operators = eigen_operators(n, dx, dy)
+    nx, ny = operators['nx'], operators['ny']
+    Ax = operators['Ax']
+    Ay = operators['Ay']
     # if x_boundary_low or x_boundary_high == 'periodic':
     #     pass
     #     # Ux_temp[nx - 1, 0] = 1. / dx
@@ -78,48 +133,59 @@ def eigen_build(k0, n, dx, dy, x_boundary_low=None, y_boundary_low=None, x_thick
     # sps.block_diag：从提供的矩阵构建对角稀疏矩阵。 即将矩阵一个接一个放在对角线上，与spdiags不一样
     # 这是为了将非方阵转为方阵
 
+    if "pml" not in (x_boundary_low, x_boundary_high, y_boundary_low, y_boundary_high):
+        # Without pml only the powers of k0 change between wavelengths
+        dtype = "complex" if (x_boundary_low or x_boundary_high or y_boundary_low or y_boundary_high) else Ax.dtype
+        T2, T0, T_2 = _k0_terms(operators, dtype)
+        Ax, Ay = Ax.astype(dtype), Ay.astype(dtype)
+        P = k0 ** 2 * T2 + T0 + T_2 / k0 ** 2
+        return P, {'epsx': operators['epsx'], 'epsy': operators['epsy'], 'epszi': operators['epszi'],
+                   'ux': Ax, 'uy': Ay, 'vx': - Ax.transpose(), 'vy': - Ay.transpose()}
+
     if x_boundary_low or x_boundary_high or y_boundary_low or y_boundary_high == "pml":
         Ax = Ax.astype("complex")
         Ay = Ay.astype("complex")
 
         Cx = -Ax.transpose()
         Cy = -Ay.transpose()
+        # 每一行除以其所在位置的拉伸因子s，等价于左乘对角阵diags(1 / s)
+        # every row is divided by the stretch factor s at its position, i.e. a left product with diags(1 / s)
+        sA = np.ones((nx, ny), dtype=complex)  # rows of Ax, indexed by (x, y) of the row
+        sC = np.ones((nx, ny), dtype=complex)  # rows of Cx
+        tA = np.ones((nx, ny), dtype=complex)  # rows of Ay
+        tC = np.ones((nx, ny), dtype=complex)  # rows of Cy
+        # 厚度超过截面尺寸时(如 ny=1 的一维截面)，只保留实际存在的那几行的剖面
+        # a pml thicker than the cross-section (e.g. ny=1) only scales the rows that exist
         # 处理x_boundary
         if x_boundary_low == "pml":
             s = calculate_s(vect=np.arange(x_thickness_low - 0.5, -0.5, -1.0) * dx, k0=k0, n=background_index)
             s_for_C = calculate_s(vect=np.arange(x_thickness_low, 0, -1.0) * dx, k0=k0, n=background_index)
-            for i in range(ny):
-                Ax[nx * i: nx * i + x_thickness_low, :] = Ax[nx * i: nx * i + x_thickness_low, :] / s[:, np.newaxis]
-                Cx[nx * i: nx * i + x_thickness_low, :] = Cx[nx * i: nx * i + x_thickness_low, :] / s_for_C[:,
-                                                                                                    np.newaxis]
+            sA[:x_thickness_low] *= s[:nx, np.newaxis]
+            sC[:x_thickness_low] *= s_for_C[:nx, np.newaxis]
 
         if x_boundary_high == "pml":
             s = calculate_s(vect=np.arange(x_thickness_high - 0.5, -0.5, -1.0) * dx, k0=k0, n=background_index)
             s_for_C = calculate_s(vect=np.arange(x_thickness_high, 0, -1.0) * dx, k0=k0, n=background_index)
-            s_flip = np.flip(s)
-            s_for_C_flip = np.flip(s_for_C)
-            for i in range(ny):
-                Ax[nx * (i + 1) - x_thickness_high: nx * (i + 1), :] = Ax[nx * (i + 1) - x_thickness_high: nx * (i + 1),
-                                                                       :] / s_flip[:, np.newaxis]
-                Cx[nx * (i + 1) - x_thickness_high: nx * (i + 1), :] = Cx[nx * (i + 1) - x_thickness_high: nx * (i + 1),
-                                                                       :] / s_for_C_flip[:, np.newaxis]
+            sA[max(nx - x_thickness_high, 0):] *= np.flip(s)[-nx:, np.newaxis]
+            sC[max(nx - x_thickness_high, 0):] *= np.flip(s_for_C)[-nx:, np.newaxis]
 
         # y_boundary
         if y_boundary_low == "pml":
             s = calculate_s(vect=np.arange(y_thickness_low - 0.5, -0.5, -1.0) * dy, k0=k0, n=background_index)
             s_for_C = calculate_s(vect=np.arange(y_thickness_low, 0, -1.0) * dy, k0=k0, n=background_index)
-            for i in range(ny):
-                if i < y_thickness_low:
-                    Ay[nx * i:nx * (i + 1), :] = Ay[nx * i:nx * (i + 1), :] / s[i]
-                    Cy[nx * i:nx * (i + 1), :] = Cy[nx * i:nx * (i + 1), :] / s_for_C[i]
+            tA[:, :y_thickness_low] *= s[np.newaxis, :ny]
+            tC[:, :y_thickness_low] *= s_for_C[np.newaxis, :ny]
 
         if y_boundary_high == "pml":
             s = calculate_s(vect=np.arange(y_thickness_high - 0.5, -0.5, -1.0) * dy, k0=k0, n=background_index)
             s_for_C = calculate_s(vect=np.arange(y_thickness_high, 0, -1.0) * dy, k0=k0, n=background_index)
-            for i in range(ny):
-                if i > ny - y_thickness_high - 1:
-                    Ay[nx * i:nx * (i + 1), :] = Ay[nx * i:nx * (i + 1), :] / s[ny - i - 1]
-                    Cy[nx * i:nx * (i + 1), :] = Cy[nx * i:nx * (i + 1), :] / s_for_C[ny - i - 1]
+            tA[:, max(ny - y_thickness_high, 0):] *= np.flip(s)[np.newaxis, -ny:]
+            tC[:, max(ny - y_thickness_high, 0):] *= np.flip(s_for_C)[np.newaxis, -ny:]
+
+        Ax = (sps.diags(1. / sA.ravel(order='F')) @ Ax).tocsr()
+        Cx = (sps.diags(1. / sC.ravel(order='F')) @ Cx).tocsr()
+        Ay = (sps.diags(1. / tA.ravel(order='F')) @ Ay).tocsr()
+        Cy = (sps.diags(1. / tC.ravel(order='F')) @ Cy).tocsr()
 
         # Bx = Ax
         # By = Ay
@@ -152,23 +218,7 @@ def eigen_build(k0, n, dx, dy, x_boundary_low=None, y_boundary_low=None, x_thick
 
     I = sps.eye(nx * ny, dtype=Ax.dtype)
 
-    # We then build relative permitivity tensors
-    epsx = np.empty(nx * ny, dtype=Ax.dtype)
-    epsy = np.empty(nx * ny, dtype=Ax.dtype)
-    epszi = np.empty(nx * ny, dtype=Ax.dtype)
-
-    count = 0
-    for j in range(0, ny):
-        for i in range(0, nx):
-            epsx[count] = n[i, j, 0] ** 2
-            epsy[count] = n[i, j, 1] ** 2
-            epszi[count] = 1. / n[i, j, 2] ** 2
-            count = count + 1
-    # 把eps展成了一维数组，再用spdiags把它们放在对角线上
-
-    epsx = sps.spdiags(epsx, 0, nx * ny, nx * ny, format='csr')
-    epsy = sps.spdiags(epsy, 0, nx * ny, nx * ny, format='csr')
-    epszi = sps.spdiags(epszi, 0, nx * ny, nx * ny, format='csr')
+    epsx, epsy, epszi = operators['epsx'], operators['epsy'], operators['epszi']
 
     # Now we need to construct the full operator matrices
     t = time.time()
@@ -0,0 +1,56 @@
+"""
+器件的光栅化：由截面的掩膜或圆盘得到三维介电常数矩阵。所有运算都是对包围盒的向量化后端运算，耗时与包围盒的大小成正比。
+Rasterization of the devices: the 3D permittivity arrays are built from masks or disks on a cross-section. Every
+operation is a vectorized backend operation over the bounding box, the setup time scales with its size.
+"""
+import photfdtd.fdtd.backend as bd
+
+
+def extrude(section, length: int, axis: str = "y"):
+    """
+    把二维截面沿一个轴拉伸为三维矩阵
+    Extrude a 2D cross-section along an axis.
+    @param section: 截面，按x, y, z中其余两个轴的顺序索引 the cross-section, indexed by the other two axes in the order x, y, z
+    @param length: 沿axis的网格数 number of cells along the axis
+    @param axis: 拉伸方向 "x", "y" or "z"
+    @return: 浮点三维矩阵 3D float array
+    """
+    i = "xyz".index(axis)
+    shape = list(section.shape)
+    shape.insert(i, length)
+    index = [slice(None)] * 2
+    index.insert(i, None)
+    volume = bd.zeros(tuple(shape))
+    volume[...] = section[tuple(index)]
+    return volume
+
+
+def fill_permittivity(mask, refractive_index: float, background_index: float):
+    """
+    掩膜内为refractive_index，掩膜外为background_index的介电常数矩阵
+    The permittivity of refractive_index inside the mask and background_index outside.
+    @param mask: 0/1浮点矩阵 float array of zeros and ones, e.g. from extrude
+    @param refractive_index: 折射率
+    @param background_index: 环境折射率
+    """
+    permittivity = bd.ones(mask.shape)
+    permittivity += mask * (refractive_index ** 2 - 1)
+    permittivity += (1 - mask) * (background_index ** 2 - 1)
+    return permittivity
+
+
+def disks(x, y, circles: list, background: float):
+    """
+    截面上的一组圆盘，重叠处取列表中靠前的圆盘的值
+    A set of disks on a cross-section, where disks overlap the one earlier in the list wins.
+    @param x: 截面第一个轴上各格点的坐标 coordinates of the cells along the first axis of the cross-section
+    @param y: 截面第二个轴上各格点的坐标 coordinates of the cells along the second axis
+    @param circles: [(xc, yc, radius, value), ...], 圆心、半径与圆盘内的值 center, radius and value of every disk
+    @param background: 圆盘以外的值 value outside the disks
+    @return: 形状为(len(x), len(y))的截面 the cross-section with shape (len(x), len(y))
+    """
+    X, Y = bd.meshgrid(x, y, indexing="ij")
+    section = bd.zeros(tuple(X.shape)) + background
+    for xc, yc, radius, value in reversed(circles):
+        section[(X - xc) ** 2 + (Y - yc) ** 2 <= radius ** 2] = value
+    return section
@@ -1,5 +1,5 @@
 from .waveguide import Waveguide
-import photfdtd.fdtd.backend as bd
+from .geometry import SineBend
 
 
 class Sbend(Waveguide):
@@ -47,65 +47,9 @@ class Sbend(Waveguide):
     def _compute_permittivity(self):
         """
         """
-        z = bd.linspace(0, self.zlength, self.zlength)
-        x = bd.linspace(0, self.xlength, self.xlength)
-        Z, X = bd.meshgrid(z, x, indexing="ij")  # indexing = 'ij'很重要
-        m = bd.zeros((self.xlength, self.ylength, self.zlength))
-
-        if self.direction == 1:
-            # direction=1, 波导方向从左下到右上
-            m1 = (
-                    X
-                    <= 0.5 * (self.xlength - self.width) * bd.sin((Z / self.zlength - 0.5) * bd.pi)
-                    + int(self.width / 2 + 0.5)
-                    + self.xlength / 2
-            )
-            # 上下翻转
-            m2 = bd.flipud(m1)
-            # 左右翻转
-            m2 = bd.fliplr(m2)
-
-            # m2 = (
-            #         X
-            #         <= 0.5 * (self.xlength - self.width) * bd.sin((Z / self.zlength - 0.5) * bd.pi)
-            #         - int(self.width / 2 + 0.5)
-            #         + self.xlength / 2
-            # )
-
-            # m2 = (
-            #     X
-            #     >= 0.5 * (self.xlength - self.width) * bd.sin((Z / self.zlength - 0.5) * bd.pi)
-            #     - self.width / 2
-            #     + self.xlength / 2
-            # )
-        elif self.direction == -1:
-            # direction=-1, 波导方向从左上到右下
-            m1 = (
-                    X
-                    <= -0.5 * (self.xlength - self.width) * bd.sin((Z / self.zlength - 0.5) * bd.pi)
-                    + int(self.width / 2 + 0.5)
-                    + self.xlength / 2
-            )
-            # 上下翻转
-            m2 = bd.flipud(m1)
-            # 左右翻转
-            m2 = bd.fliplr(m2)
-            # m2 = (
-            #     X
-            #     >= -0.5 * (self.xlength - self.width) * bd.sin((Z / self.zlength - 0.5) * bd.pi)
-            #     - self.width / 2
-            #     + self.xlength / 2
-            # )
-        else:
+        if self.direction not in (1, -1):
             raise RuntimeError("Unknown direction")
-
-        for i in range(self.zlength):
-            for j in range(self.xlength):
-                if m1[i, j] == m2[i, j]:
-                    m[j, :, i] = True
-
-        permittivity = bd.ones((self.xlength, self.ylength, self.zlength))
-        permittivity += m[:, :] * (self.refractive_index ** 2 - 1)
-        permittivity += (1 - m[:, :]) * (self.background_index ** 2 - 1)
-
-        self.permittivity = permittivity
+        # direction=1, 波导方向从左下到右上; direction=-1, 波导方向从左上到右下
+        self._geometry = SineBend(self.x, self.y, self.z, self.xlength, self.ylength, self.zlength, self.width,
+                                  self.direction, refractive_index=self.refractive_index, priority=self.priority,
+                                  name=self.name)
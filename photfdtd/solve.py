@@ -5,6 +5,7 @@ import matplotlib.pyplot as plt
 from matplotlib import cm
 from os import path
 import photfdtd.fdtd as fdtd
+from .mode_cache import ModeCache
 import os
 
 
@@ -115,7 +116,8 @@ class Solve:
                        x_boundary_high=None, y_boundary_high=None,
                        x_thickness_low: int or float = None, y_thickness_low: int or float = None,
                        x_thickness_high: int or float = None, y_thickness_high: int or float = None,
-                       background_index=None
+                       background_index=None,
+                       cache=None
                        ):
         """
         调用phisol包，计算模式
@@ -131,6 +133,9 @@ class Solve:
         @param x_thickness_high:
         @param y_thickness_high:
         @param background_index: Background refractive index, no need to set manually
+        @param cache: 模式缓存。True表示使用默认的缓存文件夹，str表示缓存文件夹，也可以是ModeCache对象。相同截面、波长和设置的
+        模式直接从缓存读取 Mode cache: True for the default cache folder, a folder path or a ModeCache. Modes of an
+        identical cross-section with identical settings are read from the cache instead of being solved again.
         @return:
         """
         if background_index is None:
@@ -140,31 +145,26 @@ class Solve:
             neff = np.max(self.n)
         self.lam = lam * 10 ** 6
         self.k = 2 * np.pi / self.lam
-        PML_width_x = lam / 4
-        PML_width_y = lam / 4
-        if x_boundary_low == "pml" and not x_thickness_low:
-            x_thickness_low = PML_width_x
-        if x_boundary_high == "pml" and not x_thickness_high:
-            x_thickness_high = PML_width_x
-        if y_boundary_low == "pml" and not y_thickness_low:
-            y_thickness_low = PML_width_y
-        if y_boundary_high == "pml" and not y_thickness_high:
-            y_thickness_high = PML_width_y
-        try:
-            if self.axis == "x":#将以m单位转为网格大小为单位，返回网格点数
-                x_thickness_low, x_thickness_high, y_thickness_low, y_thickness_high = \
-                    self.grid._handle_distance(x_thickness_low, "y"), self.grid._handle_distance(x_thickness_high, "y"), \
-                    self.grid._handle_distance(y_thickness_low, "z"), self.grid._handle_distance(y_thickness_high, "z"),
-            if self.axis == "y":
-                x_thickness_low, x_thickness_high, y_thickness_low, y_thickness_high = \
-                    self.grid._handle_distance(x_thickness_low, "x"), self.grid._handle_distance(x_thickness_high, "x"), \
-                    self.grid._handle_distance(y_thickness_low, "z"), self.grid._handle_distance(y_thickness_high, "z"),
-            if self.axis == "z":
-                x_thickness_low, x_thickness_high, y_thickness_low, y_thickness_high = \
-                    self.grid._handle_distance(x_thickness_low, "x"), self.grid._handle_distance(x_thickness_high, "x"), \
-                    self.grid._handle_distance(y_thickness_low, "y"), self.grid._handle_distance(y_thickness_high, "y"),
-        except:
-            pass
+        x_thickness_low, x_thickness_high, y_thickness_low, y_thickness_high = self._boundary_thickness(
+            lam, x_boundary_low, x_boundary_high, y_boundary_low, y_boundary_high,
+            x_thickness_low, x_thickness_high, y_thickness_low, y_thickness_high)
+
+        if cache is not None and cache is not False:
+            if not isinstance(cache, ModeCache):
+                cache = ModeCache() if cache is True else ModeCache(cache)
+            key = ModeCache.key(self.n, axis=self.axis, dx=self.dx, dy=self.dy, lam=lam, neff=neff, neigs=neigs,
+                                x_boundary_low=x_boundary_low, x_boundary_high=x_boundary_high,
+                                y_boundary_low=y_boundary_low, y_boundary_high=y_boundary_high,
+                                x_thickness_low=x_thickness_low, x_thickness_high=x_thickness_high,
+                                y_thickness_low=y_thickness_low, y_thickness_high=y_thickness_high,
+                                background_index=background_index)
+            dic = cache.get(key)
+            if dic is not None:
+                self.effective_index = dic["effective_index"]
+                self.beta = self.effective_index * 2 * np.pi / self.lam
+                print("%i modes are read from the mode cache" % dic["number_of_modes"])
+                print("neff=", self.effective_index)
+                return dic
 
         # Calculate modes
         # FIXME: 检查pml边界的四个方向是否有问题
@@ -202,6 +202,53 @@ class Solve:
         self.effective_index = self.beta * self.lam / (2 * np.pi)
         print("neff=", self.effective_index)
 
+        dic = self._mode_fields(lam, neigs, Ex_field, Ey_field, matrices)
+        if cache is not None and cache is not False:
+            cache.put(key, dic)
+
+        return dic
+
+    def _boundary_thickness(self, lam,
+                            x_boundary_low, x_boundary_high, y_boundary_low, y_boundary_high,
+                            x_thickness_low, x_thickness_high, y_thickness_low, y_thickness_high):
+        """
+        pml默认厚度为lam/4，并把以m为单位的厚度转换为网格数
+        Default pml thickness is lam/4; thicknesses in m are converted into grid points
+        @return: x_thickness_low, x_thickness_high, y_thickness_low, y_thickness_high
+        """
+        PML_width_x = lam / 4
+        PML_width_y = lam / 4
+        if x_boundary_low == "pml" and not x_thickness_low:
+            x_thickness_low = PML_width_x
+        if x_boundary_high == "pml" and not x_thickness_high:
+            x_thickness_high = PML_width_x
+        if y_boundary_low == "pml" and not y_thickness_low:
+            y_thickness_low = PML_width_y
+        if y_boundary_high == "pml" and not y_thickness_high:
+            y_thickness_high = PML_width_y
+        try:
+            if self.axis == "x":#将以m单位转为网格大小为单位，返回网格点数
+                x_thickness_low, x_thickness_high, y_thickness_low, y_thickness_high = \
+                    self.grid._handle_distance(x_thickness_low, "y"), self.grid._handle_distance(x_thickness_high, "y"), \
+                    self.grid._handle_distance(y_thickness_low, "z"), self.grid._handle_distance(y_thickness_high, "z"),
+            if self.axis == "y":
+                x_thickness_low, x_thickness_high, y_thickness_low, y_thickness_high = \
+                    self.grid._handle_distance(x_thickness_low, "x"), self.grid._handle_distance(x_thickness_high, "x"), \
+                    self.grid._handle_distance(y_thickness_low, "z"), self.grid._handle_distance(y_thickness_high, "z"),
+            if self.axis == "z":
+                x_thickness_low, x_thickness_high, y_thickness_low, y_thickness_high = \
+                    self.grid._handle_distance(x_thickness_low, "x"), self.grid._handle_distance(x_thickness_high, "x"), \
+                    self.grid._handle_distance(y_thickness_low, "y"), self.grid._handle_distance(y_thickness_high, "y"),
+        except:
+            pass
+
+        return x_thickness_low, x_thickness_high, y_thickness_low, y_thickness_high
+
+    def _mode_fields(self, lam, neigs, Ex_field, Ey_field, matrices):
+        """
+        由横向电场计算其他场分量并组成calculate_mode返回的字典
+        Reconstruct the other field components from the transverse E fields, returns the dict of calculate_mode
+        """
         # Now calculate the other fields
         Hx = np.empty((neigs, Ex_field.shape[1]), dtype=complex)
         Hy = np.empty((neigs, Ex_field.shape[1]), dtype=complex)
@@ -582,122 +629,78 @@ class Solve:
 
     def sweep(self,
               steps: int = 5,
-              lams: list = []):
-        # 在[lams[0], lams[1]]范围内计算steps个点, lam单位为um
-        lams = np.linspace(lams[0], lams[1], steps)
-
-        # phisol包在这里使用了一个函数来猜测扫描区间内折射率随波长的变化，但由于我们已经有材料库，所以应该用材料库的数据来估算。
-        # TODO：这段代码暂时没用，有时间完成它
-        # A = 2.17954368571
-        # B = bd.log(2.17954368571 / 1.75292972992) / 0.7
-        # self.n_guess = A * bd.exp(- B * (self.lam - 0.3))
-        # 暂时用下式估算（只是测试代码是否可用，在物理上没有意义！）
-
-        pass
-        # n = bd.zeros((steps, self.n.shape[0], self.n.shape[1], self.n.shape[2]))
-        # for i in range(steps):
-        #     n[i] = self.n
-        #     env_index = bd.zeros((self.n.shape[0], self.n.shape[1], self.n.shape[2]))
-        #     env_index += bd.sqrt(bd.amax(self.grid.inverse_permittivity) * bd.amax(self.grid.inverse_permeability))
-        #     # mask.shape=(self.n.shape[0], self.n.shape[1], self.n.shape[2]), 其元素为True或False
-        #     mask = n[i] != env_index
-        #     # 若折射率!=环境折射率，则减去波长/10（仅为测试）
-        #     n[i][mask] -= lams[i] / 10
-        #
-        # # 有必要计算多个模式吗？
-        # neigs = 5
-        #
-        # # 由self.Ex_fields还原calculate_mode函数中的Ex
-        # Ex = bd.array([bd.ravel(E_field) for E_field in self.Ex_fields])
-        # Ex = bd.reshape(Ex, (self.neigs, self.Ex_fields[0].shape[0] * self.Ex_fields[0].shape[1]))
-        # Ey = bd.array([bd.ravel(E_field) for E_field in self.Ey_fields])
-        # Ey = bd.reshape(Ex, (self.neigs, self.Ey_fields[0].shape[0] * self.Ey_fields[0].shape[1]))
-        #
-        # # E_in将作为E_trial输入到函数ps.solve.solve中，其作用是作为迭代的起始向量，它是(self.neigs, self.grid.xlength*self.grid.ylength)的ndarray
-        # E_in = bd.concatenate((Ex[0], Ey[0]))
-        #
-        # # Now we have a go sweeping
-        # beta_out = []
-        # Ey_plot = []
-        # Ex_plot = []
-        #
-        # # n_trial是一个规格为（steps)的一维矩阵，其值为材料在对应波长的折射率
-        # # 这句代码仅作测试，没有物理意义！
-        # n_trial = bd.amax(self.n) - lams / 10
-        #
-        # # TODO: Fix complex casting warning （这是phisol包原作者留下的TODO，看不懂什么意思）
-        # for i in range(steps):
-        #     k = 2. * bd.pi / lams[i]
-        #     P, _ = ps.eigen_build(k, n[i], self.grid.grid_spacing * 1e6, self.grid.grid_spacing * 1e6)
-        #
-        #     # TODO: Fix complex casting warning
-        #     # 为什么要计算neigs个模式
-        #     beta, Ex, Ey = ps.solve.solve(P,
-        #                                   2. * n_trial[i] * bd.pi / lams[i],
-        #                                   E_trial=E_in,
-        #                                   neigs=neigs)
-        #
-        #     Ey_plot.append(
-        #         [bd.reshape(E_vec, (self.Ex_fields[0].shape[0], self.Ex_fields[0].shape[1])) for E_vec in Ey])
-        #     Ex_plot.append(
-        #         [bd.reshape(E_vec, (self.Ex_fields[0].shape[0], self.Ex_fields[0].shape[1])) for E_vec in Ex])
-        #     beta_out.append(beta)
-        #
-        # index = 0  # Select starting mode
-        #
-        # # Ex_plot的形状：[5,10,200,50] 指steps, neigs, x, y
-        # # Initialise sweep trace arrays
-        # beta_trace = [beta_out[0][index]]
-        # Eyplottrace = [Ey_plot[0][index]]
-        # Explottrace = [Ex_plot[0][index]]
-        #
-        # E_trace = []  # New reordering method. WIP
-        #
-        # # Plot selected mode for testing
-        # # plt.figure()
-        # # xend = bd.size(x)
-        # # yend = bd.size(y)
-        # # plt.pcolor(x, y, bd.transpose(Eyplottrace[0].real), cmap=cm.jet)
-        # # plt.title("Initial selected mode")
-        # # plt.show()
-        #
-        # # Do sweep
-        # indices = []  # Create an array to log the original position of the fundamental (just used for debugging)
-        # for i in range(steps - 1):
-        #     # Takes product of all modes with all next modes the largest value should be the same mode!
-        #     # 使用了 numpy.einsum() 函数来计算两个电场 Ey_plot[i] 和 Ey_plot[i+1] 的张量积
-        #     prod_next = abs(bd.einsum('kij, lij', Ey_plot[i], Ey_plot[i + 1]))
-        #
-        #     # 将当前时刻的电场矩阵（Ey_plot[i]）与下一时刻的电场矩阵的内积（prod_next）进行乘积运算（bd.einsum('kij, kl', Ey_plot[i], prod_next)），
-        #     # 并将结果添加到电场轨迹列表 E_trace 中
-        #     E_trace.append(bd.einsum('kij, kl', Ey_plot[i], prod_next))  # New reordering method. WIP
-        #
-        #     # 找到一个多维数组prod_next中指定行index中的最大值，然后返回这个最大值在该行的列索引
-        #     # 我估计这是在找不同波长下的基模，假如想看其他模式的扫描图，就得更改代码
-        #     # TODO:完成它
-        #     index = bd.argmax(prod_next[index, :])
-        #     indices.append(index)  # Append the index, for debugging
-        #
-        #     beta_trace.append(beta_out[i + 1][index])
-        #     Eyplottrace.append(Ey_plot[i + 1][index])
-        #     Explottrace.append(Ex_plot[i + 1][index])
-        #
-        # print(indices)  # Show indices, for debugging
-        #
-        # # Now we can plot the dispersion and e field
-        # plt.figure()
-        # plt.plot(lams, bd.real(beta_trace))
-        # plt.xlabel('$/lambda / /mu m$')
-        # plt.ylabel(r'$/beta [ /mu m^{-1} ]$')
-        # plt.title("Structure dispersion")
-        # plt.savefig(fname='%s\\%s.png' % (self.filepath, 'wavelength_beta'))
-        # plt.close()
-        #
-        # # Finally plot the mode at some sweep position 'some_random_point', for testing
-        # # plt.figure()
-        # # some_random_point = -1  # Last value in sweep
-        # # xend = bd.size(x)
-        # # yend = bd.size(y)
-        # # plt.pcolor(x, y, bd.transpose(Eyplottrace[some_random_point].real), cmap=cm.inferno)
-        # # plt.title("Selected mode")
-        # plt.show()
+              lams: list = [],
+              neff: float = None,
+              neigs: int = 1,
+              x_boundary_low=None, y_boundary_low=None,
+              x_boundary_high=None, y_boundary_high=None,
+              x_thickness_low: int or float = None, y_thickness_low: int or float = None,
+              x_thickness_high: int or float = None, y_thickness_high: int or float = None,
+              background_index=None
+              ):
+        """
+        在多个波长下计算模式（色散扫描）。截面的差分算子只构建一次，每个波长只重新组装本征矩阵；上一个波长的基模作为下一次
+        求解的初始向量，上一个波长的有效折射率作为下一次求解的位移。各波长的模式按场的重叠积分排序，使同一列始终对应同一个模式。
+        Calculate modes at several wavelengths (dispersion sweep). The difference operators of the cross-section are built
+        once and only the eigen matrix is assembled per wavelength; the fundamental mode of the previous wavelength is
+        used as the start vector and its neff as the shift of the next solve. Modes are tracked across wavelengths by
+        the overlap of their fields, so that a column always refers to the same mode.
+        @param steps: 波长点数
+        @param lams: [lam_start, lam_end]（m），在其中均匀取steps个点；或长度不为2的波长列表，此时忽略steps
+        @param neff: 在neff周围计算第一个波长的模式
+        @param neigs: 每个波长计算的模式数
+        @param x_boundary_low: 同calculate_mode
+        @param background_index: Background refractive index, no need to set manually
+        @return: 字典，"lams": 波长（m），"effective_index": (波长数, neigs)的有效折射率，
+        "modes": 每个波长的模式字典，格式同calculate_mode的返回值（不丢弃耗散模）
+        """
+        from scipy.optimize import linear_sum_assignment
+
+        if len(lams) == 2:
+            lams = np.linspace(lams[0], lams[1], steps)
+        lams = np.asarray(lams, dtype=float)
+        if background_index is None:
+            background_index = self.grid.background_index
+        if neff is None:
+            neff = np.max(self.n)
+        # pml厚度按最短波长确定，使所有波长使用同一组算子
+        x_thickness_low, x_thickness_high, y_thickness_low, y_thickness_high = self._boundary_thickness(
+            np.min(lams), x_boundary_low, x_boundary_high, y_boundary_low, y_boundary_high,
+            x_thickness_low, x_thickness_high, y_thickness_low, y_thickness_high)
+
+        operators = ps.core.eigen_operators(self.n, self.dx, self.dy)
+        E_trial = None
+        previous = None
+        effective_index = np.empty((len(lams), neigs), dtype=complex)
+        modes = []
+        for i, lam in enumerate(lams):
+            self.lam = lam * 10 ** 6
+            self.k = 2 * np.pi / self.lam
+            P, matrices = ps.eigen_build(self.k, self.n, self.dx, self.dy,
+                                         x_boundary_low=x_boundary_low, y_boundary_low=y_boundary_low,
+                                         x_thickness_low=x_thickness_low,
+                                         y_thickness_low=y_thickness_low, x_boundary_high=x_boundary_high,
+                                         y_boundary_high=y_boundary_high, x_thickness_high=x_thickness_high,
+                                         y_thickness_high=y_thickness_high, background_index=background_index,
+                                         operators=operators)
+            beta, Ex_field, Ey_field = ps.solve.solve(P, 2. * np.pi * neff / self.lam, E_trial=E_trial,
+                                                      neigs=neigs)
+            fields = np.concatenate([Ex_field, Ey_field], axis=1)
+            fields /= np.linalg.norm(fields, axis=1, keepdims=True)
+            if previous is None:
+                order = np.argsort(-beta.real)
+            else:
+                # 与上一个波长的模式重叠最大者视为同一模式
+                _, order = linear_sum_assignment(-np.abs(np.conj(previous) @ fields.T))
+            beta, Ex_field, Ey_field, previous = beta[order], Ex_field[order], Ey_field[order], fields[order]
+
+            self.beta = beta
+            self.effective_index = beta * self.lam / (2 * np.pi)
+            effective_index[i] = self.effective_index
+            print("lam=%e, neff=" % lam, self.effective_index)
+            modes.append(self._mode_fields(lam, neigs, Ex_field, Ey_field, matrices))
+
+            E_trial = previous[0]
+            neff = self.effective_index[0].real
+
+        return {"lams": lams, "effective_index": effective_index, "modes": modes}
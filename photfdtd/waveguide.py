@@ -2,6 +2,7 @@
 from copy import copy
 import photfdtd.fdtd as fdtd
 import photfdtd.fdtd.backend as bd
+from .geometry import Box
 
 
 # from .grid import Grid
@@ -20,6 +21,15 @@ class Waveguide:
     priority: the priority of the waveguide( high index indicates high priority)
     """
 
+    # 由解析形状（photfdtd.geometry）描述的器件不在构造时生成介电常数矩阵，Grid.add_object直接光栅化_geometry；
+    # permittivity与priority_matrix在第一次读取时才由形状生成
+    # Waveguides described by an analytic shape (photfdtd.geometry) do not build a permittivity array on construction,
+    # Grid.add_object rasterizes _geometry directly; permittivity and priority_matrix are generated from the shape on
+    # first access
+    _geometry = None
+    _permittivity = None
+    _priority_matrix = None
+
     def __init__(
             self,
             xlength: int or float = 200,
@@ -82,27 +92,104 @@ class Waveguide:
         self._set_objects()
         self._compute_priority()
 
-    def _compute_permittivity(self):
-        """计算介电常数矩阵"""
-        permittivity = bd.zeros((self.xlength, self.ylength, self.zlength))
-        permittivity += self.refractive_index ** 2
+    @property
+    def permittivity(self):
+        """介电常数矩阵 the permittivity array"""
+        if self._permittivity is None:
+            if self._geometry is None:
+                raise AttributeError("'%s' object has no attribute 'permittivity'" % type(self).__name__)
+            self._permittivity = self._geometry.permittivity(self.background_index)
+        return self._permittivity
+
+    @permittivity.setter
+    def permittivity(self, permittivity):
+        # 直接给出的矩阵取代解析形状 an array given explicitly replaces the analytic shape
+        self._permittivity = permittivity
+        self._geometry = None
 
-        self.permittivity = permittivity
+    @property
+    def priority_matrix(self):
+        """优先级矩阵 the priority matrix"""
+        if self._priority_matrix is None:
+            if self._geometry is None:
+                raise AttributeError("'%s' object has no attribute 'priority_matrix'" % type(self).__name__)
+            self._priority_matrix = (self.permittivity == self.refractive_index ** 2) * self.priority
+        return self._priority_matrix
+
+    @priority_matrix.setter
+    def priority_matrix(self, priority_matrix):
+        self._priority_matrix = priority_matrix
+
+    def _compute_permittivity(self):
+        """计算介电常数矩阵（矩形波导由解析形状描述）compute the permittivity (a box described analytically)"""
+        self._geometry = Box(self.x, self.y, self.z, self.xlength, self.ylength, self.zlength,
+                             refractive_index=self.refractive_index, priority=self.priority, name=self.name)
 
     def _compute_priority(self):
         # TODO: there is something wrong with these codes, if the core of fiber has a n equals to the background n, error would occur,
         # I don't know how to handle it right now, but this can be solved by setting the n a little larger (0.00001) than background n. - Tao Jia
 
-        # the priority matrix of the waveguide
-        if hasattr(self, "permittivity"):
+        # the priority matrix of the waveguide. 解析形状的优先级矩阵在读取时才生成
+        # the priority matrices of analytic shapes are generated on access
+        if self._geometry is None and hasattr(self, "permittivity"):
             self.priority_matrix = (self.permittivity == self.refractive_index ** 2) * self.priority
         for obj in self._internal_objects:
-            if hasattr(obj, "permittivity"):
+            if getattr(obj, "_geometry", None) is None and hasattr(obj, "permittivity"):
                 obj.priority_matrix = (obj.permittivity == obj.refractive_index ** 2) * obj.priority
 
     def _set_objects(self):
         self._internal_objects = [self]
 
+    def rotate_Y(self, angle: float = None, center: list = None, angle_unit: bool = True):
+        """
+        绕平行于y轴的轴旋转器件，只支持由解析形状描述的器件（Waveguide、Taper、Sbend、Arc、Circle）
+        Rotate the waveguide about an axis parallel to the y axis. Only waveguides described by an analytic shape
+        (Waveguide, Taper, Sbend, Arc, Circle) can be rotated, the rotated shape is rasterized from its description.
+        @param angle: 旋转角，旋转矩阵为[[cos, 0, -sin], [0, 1, 0], [sin, 0, cos]]
+                      angle of rotation, the rotation matrix is [[cos, 0, -sin], [0, 1, 0], [sin, 0, cos]]
+        @param center: 旋转轴经过的点[x, y, z]（仿真区域坐标），默认为器件中心
+                       a point [x, y, z] on the rotation axis (simulation region coordinates), the center by default
+        @param angle_unit: bool, default to True. False if using radian unit
+        """
+        if not angle:
+            return
+        if self._geometry is None:
+            raise NotImplementedError("%s is given by a permittivity array and can not be rotated" % self.name)
+        if angle_unit:
+            angle = bd.radians(angle)
+        if center is None:
+            center = [self.x_center, self.y_center, self.z_center]
+        center_x = self.grid._handle_unit([center[0]], grid_spacing=self.grid._grid.grid_spacing_x)[0]
+        center_z = self.grid._handle_unit([center[2]], grid_spacing=self.grid._grid.grid_spacing_z)[0]
+
+        self._geometry.rotate_y(float(angle), (center_x, center_z))
+        (self.x, self.y, self.z), stop = self._geometry.bounds
+        self.xlength, self.ylength, self.zlength = stop[0] - self.x, stop[1] - self.y, stop[2] - self.z
+        # 中心随旋转移动 the center moves with the rotation
+        dx, dz = self.x_center - center_x, self.z_center - center_z
+        self.x_center = int(round(center_x + bd.cos(angle) * dx - bd.sin(angle) * dz))
+        self.z_center = int(round(center_z + bd.sin(angle) * dx + bd.cos(angle) * dz))
+        self._permittivity = self._priority_matrix = None
+
+    def move(self, x: int or float = 0, y: int or float = 0, z: int or float = 0):
+        """
+        平移器件及其各部分。器件已在网格中时使用Grid.move_object，它只重新计算受影响的网格
+        Move the waveguide and its parts. Use Grid.move_object for a waveguide in the grid, which only recomputes the
+        cells concerned.
+        @param x, y, z: 沿各轴的平移量，SI单位(m)（float）或网格数（int）
+                        the displacement along each axis, SI unit (m) if float or grid_spacing unit if int
+        """
+        dx = self.grid._handle_unit([x], grid_spacing=self.grid._grid.grid_spacing_x)[0]
+        dy = self.grid._handle_unit([y], grid_spacing=self.grid._grid.grid_spacing_y)[0]
+        dz = self.grid._handle_unit([z], grid_spacing=self.grid._grid.grid_spacing_z)[0]
+        parts = [self] + [obj for obj in self._internal_objects if obj != 0 and obj is not self]
+        for obj in parts:
+            obj.x, obj.y, obj.z = obj.x + dx, obj.y + dy, obj.z + dz
+            if hasattr(obj, "x_center"):
+                obj.x_center, obj.y_center, obj.z_center = obj.x_center + dx, obj.y_center + dy, obj.z_center + dz
+            if getattr(obj, "_geometry", None) is not None:
+                obj._geometry.translate(dx, dy, dz)
+
 
     """为了测试torch暂时注释"""
     # @staticmethod
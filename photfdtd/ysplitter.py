@@ -1,6 +1,6 @@
 from .waveguide import Waveguide
 from . import sbend
-import photfdtd.fdtd.backend as bd
+from .geometry import Trapezoid
 
 
 class Taper(Waveguide):
@@ -47,48 +47,10 @@ class Taper(Waveguide):
         super().__init__(xlength, ylength, zlength, x, y, z, width, name, refractive_index, grid=grid, priority=priority)
 
     def _compute_permittivity(self):
-
-        z = bd.linspace(0, self.zlength, self.zlength)
-        x = bd.linspace(0, self.xlength, self.xlength)
-        Z, X = bd.meshgrid(z, x, indexing="ij")
-
-        m = bd.zeros((self.xlength, self.ylength, self.zlength))
-
-        if self.direction:
-            # 开口向z正方向
-            for i in range(self.zlength):
-                for j in range(self.xlength):
-                    if (
-                            Z[i, j] * (self.width / 2 - self.xlength / 2) / self.zlength
-                            + self.xlength / 2
-                            - self.width / 2
-                            <= X[i, j]
-                            <= Z[i, j] * (-self.width / 2 + self.xlength / 2) / self.zlength
-                            + self.xlength / 2
-                            + self.width / 2
-                    ):
-                        m[j, :, i] = True
-
-        if not self.direction:
-            # 开口向z负方向
-            for i in range(self.zlength):
-                for j in range(self.xlength):
-                    if (
-                            Z[self.zlength - i - 1, j] * (self.width / 2 - self.xlength / 2) / self.zlength
-                            + self.xlength / 2
-                            - self.width / 2
-                            <= X[i, j]
-                            <= Z[self.zlength - i - 1, j] * (-self.width / 2 + self.xlength / 2) / self.zlength
-                            + self.xlength / 2
-                            + self.width / 2
-                    ):
-                        m[j, :, i] = True
-
-        permittivity = bd.ones((self.xlength, self.ylength, self.zlength))
-        permittivity += m * (self.refractive_index ** 2 - 1)
-        permittivity += (1 - m) * (self.background_index ** 2 - 1)
-
-        self.permittivity = permittivity
+        # 两条斜边之间的梯形，沿y拉伸 the trapezoid between the slanted edges, extruded along y
+        self._geometry = Trapezoid(self.x, self.y, self.z, self.xlength, self.ylength, self.zlength, self.width,
+                                   self.direction, refractive_index=self.refractive_index, priority=self.priority,
+                                   name=self.name)
 
 
 class Ysplitter(Waveguide):